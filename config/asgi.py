@@ -0,0 +1,15 @@
+"""
+ASGI config for the portal project.
+
+Serve with any ASGI server, e.g. ``uvicorn config.asgi:application``.
+The async API views then run on the event loop instead of tying up a
+worker thread per request.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+application = get_asgi_application()
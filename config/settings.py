@@ -29,10 +29,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'portal.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'portal.middleware.DepartmentDatabaseMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,6 +58,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 # Database
 DATABASES = {
@@ -65,6 +68,19 @@ DATABASES = {
     }
 }
 
+# Per-department databases (portal.sharding): when enabled, each
+# department's records, history and live feed live in their own SQLite
+# file under directory, created on first use; db.sqlite3 keeps users,
+# departments and tabs. Split an existing database with
+# `manage.py split_departments`. Links from records to tabs and users are
+# database constraints only in tables migrated while this is off
+# (portal.models.CatalogForeignKey).
+PORTAL_SHARDING = {
+    'enabled': False,
+    'directory': BASE_DIR / 'shards',
+}
+DATABASE_ROUTERS = ['portal.sharding.DepartmentRouter']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -92,6 +108,19 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'portal' / 'static']
 
+# collectstatic writes content-hashed names plus .gz/.br variants, which
+# portal.middleware.StaticFilesMiddleware serves with immutable caching.
+# Only with DEBUG = False: in DEBUG, {% static %} links the plain names
+# and runserver serves them from STATICFILES_DIRS
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'portal.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -114,3 +143,48 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
+
+# Admission control for heavy endpoints (portal.throttle), counted in
+# process memory: every limit applies per worker process, so the effective
+# limits multiply by the number of workers
+# concurrency: requests in flight across all users
+# user_concurrency: requests in flight per user
+# rate_per_minute / burst: per-user token bucket
+PORTAL_THROTTLE = {
+    'import': {'concurrency': 2, 'user_concurrency': 1, 'rate_per_minute': 6, 'burst': 3},
+    'fetch': {'concurrency': 16, 'user_concurrency': 4, 'rate_per_minute': 120, 'burst': 20},
+    'bulk': {'concurrency': 2, 'user_concurrency': 1, 'rate_per_minute': 12, 'burst': 4},
+    'upload': {'concurrency': 8, 'user_concurrency': 2, 'rate_per_minute': 300, 'burst': 30},
+}
+
+# Compressed storage of long Record.data text values (portal.compression).
+# Compressed values are always readable; enabled only controls new writes.
+# Run `manage.py compress_records` to train dictionaries and convert rows.
+PORTAL_RECORD_COMPRESSION = {
+    'enabled': False,
+    'min_length': 256,  # Shortest string value worth compressing
+    'level': 6,  # zlib level
+}
+
+# Change history of Record.data (portal.history): one undo entry per change
+# holding only the changed keys, with a full snapshot every
+# snapshot_interval entries per record to bound point-in-time reads.
+# `manage.py compact_history` merges old entries.
+PORTAL_HISTORY = {
+    'enabled': True,
+    'snapshot_interval': 20,
+}
+
+# Resumable chunked uploads (portal.uploads): partial files live in
+# directory until finalized; chunk_size caps one PUT and max_size a file.
+# A user has at most user_sessions uploads in progress, declaring at most
+# user_bytes in all. `manage.py clean_uploads` removes uploads idle for
+# expire_hours.
+PORTAL_UPLOADS = {
+    'directory': BASE_DIR / 'uploads',
+    'chunk_size': 4 * 1024 * 1024,
+    'max_size': 1024 * 1024 * 1024,
+    'expire_hours': 24,
+    'user_sessions': 4,
+    'user_bytes': 2 * 1024 * 1024 * 1024,
+}
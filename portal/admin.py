@@ -18,14 +18,14 @@ class UserAdmin(admin.ModelAdmin):
 
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
-    list_display = ('name', 'created_by', 'created_at')
+    list_display = ('name', 'record_count', 'last_modified', 'created_by', 'created_at')
     search_fields = ('name', 'description')
     ordering = ('name',)
 
 
 @admin.register(Tab)
 class TabAdmin(admin.ModelAdmin):
-    list_display = ('name', 'department', 'created_by', 'created_at')
+    list_display = ('name', 'department', 'record_count', 'last_modified', 'created_by', 'created_at')
     list_filter = ('department', 'created_at')
     search_fields = ('name', 'department__name')
 
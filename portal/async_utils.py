@@ -0,0 +1,48 @@
+"""
+Async helpers for the portal's API views.
+
+Django 4.2 ships the async ORM but its auth decorators and shortcuts are
+still sync-only, so the async API views use these equivalents instead.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponseNotAllowed
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """Async counterpart of django.shortcuts.get_object_or_404 for querysets."""
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+def async_login_required(view_func):
+    """
+    Async version of @login_required.
+
+    request.user is a lazy object that hits the session and user tables on
+    first access, so it is resolved once in a worker thread; after that the
+    view can read it freely from the event loop.
+    """
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+def async_require_http_methods(request_method_list):
+    """Async version of @require_http_methods."""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            if request.method not in request_method_list:
+                return HttpResponseNotAllowed(request_method_list)
+            return await view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,227 @@
+"""
+Tab-wide column operations on Record.data: rename, drop, fill and cast.
+
+Each operation rewrites one key across a tab with set-based UPDATE
+statements built from the database's JSON functions (the JSONEdit
+expressions in portal.jsonsql), COLUMN_BATCH_SIZE records per statement,
+so a schema change on a large tab costs a few hundred statements instead
+of one round trip per record. Each runs in a single transaction and
+publishes one 'import' event, which makes open grids reload. Undo
+entries (portal.history) are written per chunk from the rows read
+before and after each statement.
+
+On positional tabs (portal.positional) the key dictionary is the column
+metadata: a rename only changes the dictionary entry, and a drop replaces
+it with null and clears the stored values. Rows that keep the key by
+name, in the overflow map, are rewritten like rows of any other tab.
+
+Keys containing "__" cannot be addressed, as with json_filter().
+"""
+from django.db.models import Q
+from django.utils import timezone
+
+from . import events, history, sharding
+from .jsonsql import JSONCastable, JSONCastValue, JSONRemoveKey, JSONRenameKey, JSONSetValue
+from .models import Record, Tab
+from .positional import ROW_KEY, key_path, set_tab_keys
+
+# Records rewritten per UPDATE ... WHERE id IN (...) statement
+COLUMN_BATCH_SIZE = 500
+
+OPERATIONS = ('rename', 'drop', 'fill', 'cast')
+
+
+def _position(column, row_keys):
+    """Index of a column in a positional row's array (after the tab id), or None."""
+    positional, _ = key_path(column, row_keys)
+    return None if positional is None else row_keys.index(column) + 1
+
+
+def _has_key(column, row_keys):
+    """Condition: a record has the column, by name or by position."""
+    condition = Q(data__has_key=column)
+    position = _position(column, row_keys)
+    if position is not None:
+        condition |= Q(**{f'data__{ROW_KEY}__{position}__isnull': False})
+    return condition
+
+
+def _rewrite(tab, condition, expression, user, now, track=True):
+    """
+    Apply expression to the data of the tab's records matching condition.
+
+    track=False skips the undo entries, for rewrites that records read
+    the same after. Returns the number of records changed.
+    """
+    records = Record.objects.filter(tab=tab).filter(condition).order_by()
+    ids = list(records.values_list('id', flat=True))
+    track = track and history.is_enabled()
+    changed = 0
+    for start in range(0, len(ids), COLUMN_BATCH_SIZE):
+        chunk = ids[start:start + COLUMN_BATCH_SIZE]
+        if track:
+            before = dict(records.filter(id__in=chunk).values_list('id', 'data'))
+        changed += records.filter(id__in=chunk).update(data=expression, updated_by=user, updated_at=now)
+        if track:
+            after = Record.objects.filter(id__in=chunk).values_list('id', 'data')
+            history.record_changes(
+                tab.id, ((record_id, before.get(record_id), data) for record_id, data in after), user, now,
+            )
+    return changed
+
+
+def _track_positional(tab, position, change, user, now):
+    """
+    Write undo entries for a dictionary edit that changes the column at a position.
+
+    Runs before the edit: change(data) gives each affected record's data after it.
+    """
+    if not history.is_enabled():
+        return
+    records = Record.objects.filter(tab=tab, **{f'data__{ROW_KEY}__{position}__isnull': False}).order_by()
+    ids = list(records.values_list('id', flat=True))
+    for start in range(0, len(ids), COLUMN_BATCH_SIZE):
+        chunk = ids[start:start + COLUMN_BATCH_SIZE]
+        rows = records.filter(id__in=chunk).values_list('id', 'data')
+        history.record_changes(tab.id, ((record_id, data, change(data)) for record_id, data in rows), user, now)
+
+
+def _set_row_keys(tab, change):
+    """Apply change(list) to the tab's key dictionary under a row lock."""
+    row_keys = list(Tab.objects.select_for_update().values_list('row_keys', flat=True).get(id=tab.id))
+    change(row_keys)
+    Tab.objects.filter(id=tab.id).update(row_keys=row_keys)
+    tab.row_keys = row_keys
+    set_tab_keys(tab.id, row_keys)
+
+
+def _validate_column(name):
+    if not isinstance(name, str) or not name or name == ROW_KEY or '__' in name:
+        raise ValueError(f"Invalid column name {name!r}")
+
+
+def rename_column(tab, column, new_name, user=None):
+    """
+    Rename a column in every record of a tab.
+
+    Raises ValueError if new_name is invalid or already used by a record.
+    Returns the number of records that have the column.
+    """
+    _validate_column(column)
+    _validate_column(new_name)
+    if new_name == column:
+        raise ValueError('New column name is the same as the old one')
+
+    with sharding.atomic(tab.department_id):
+        tab.row_keys = Tab.objects.values_list('row_keys', flat=True).get(id=tab.id)
+        taken = Record.objects.filter(tab=tab).filter(_has_key(new_name, tab.row_keys)).exists()
+        if taken or (tab.row_keys and new_name in tab.row_keys):
+            raise ValueError(f"Column '{new_name}' already exists")
+
+        now = timezone.now()
+        count = Record.objects.filter(tab=tab).filter(_has_key(column, tab.row_keys)).count()
+        position = _position(column, tab.row_keys)
+        if position is not None:
+            def rename(row_keys):
+                row_keys[position - 1] = new_name
+            _track_positional(
+                tab, position,
+                lambda data: {(new_name if key == column else key): value for key, value in data.items()},
+                user, now,
+            )
+            _set_row_keys(tab, rename)
+            # Positional values now read under the new name; mark them changed
+            positional = Record.objects.filter(tab=tab, **{f'data__{ROW_KEY}__{position}__isnull': False})
+            positional.update(updated_by=user, updated_at=now)
+        _rewrite(tab, Q(data__has_key=column), JSONRenameKey('data', column, new_name), user, now)
+        _changed(tab, 'rename', column, count, to=new_name)
+    return count
+
+
+def drop_column(tab, column, user=None):
+    """Remove a column from every record of a tab; returns the number of records changed."""
+    _validate_column(column)
+    with sharding.atomic(tab.department_id):
+        tab.row_keys = Tab.objects.values_list('row_keys', flat=True).get(id=tab.id)
+        now = timezone.now()
+        count = 0
+        position = _position(column, tab.row_keys)
+        if position is not None:
+            def drop(row_keys):
+                row_keys[position - 1] = None
+            _track_positional(
+                tab, position, lambda data: {key: value for key, value in data.items() if key != column},
+                user, now,
+            )
+            _set_row_keys(tab, drop)
+            # The position stays (later values keep their places); free its value
+            count += _rewrite(
+                tab, Q(**{f'data__{ROW_KEY}__{position}__isnull': False}),
+                JSONSetValue('data', ROW_KEY, None, index=position), user, now, track=False,
+            )
+        count += _rewrite(tab, Q(data__has_key=column), JSONRemoveKey('data', column), user, now)
+        _changed(tab, 'drop', column, count)
+    return count
+
+
+def fill_column(tab, column, value, user=None):
+    """
+    Set a column to value in every record where it is missing or null.
+
+    Returns the number of records changed.
+    """
+    _validate_column(column)
+    with sharding.atomic(tab.department_id):
+        tab.row_keys = Tab.objects.values_list('row_keys', flat=True).get(id=tab.id)
+        now = timezone.now()
+        count = 0
+        position = _position(column, tab.row_keys)
+        # Missing or null by name...
+        by_name = ~Q(data__has_key=column) | Q(**{f'data__{column}': None})
+        if position is not None:
+            # ...and not held by position; rows past their array's end keep
+            # new keys by name (portal.positional)
+            by_name &= Q(**{f'data__{ROW_KEY}__{position}__isnull': True})
+            count += _rewrite(
+                tab, Q(**{f'data__{ROW_KEY}__{position}': None}),
+                JSONSetValue('data', ROW_KEY, value, index=position), user, now,
+            )
+        count += _rewrite(tab, by_name, JSONSetValue('data', column, value), user, now)
+        _changed(tab, 'fill', column, count, value=value)
+    return count
+
+
+def cast_column(tab, column, to, user=None):
+    """
+    Convert a column's values to 'text' or 'number' (see JSONCastValue).
+
+    Values that do not convert cleanly are left as they are. Returns the
+    number of records changed.
+    """
+    _validate_column(column)
+    if to not in JSONCastValue.TYPES:
+        raise ValueError(f"Unknown type '{to}' (expected one of {', '.join(JSONCastValue.TYPES)})")
+    with sharding.atomic(tab.department_id):
+        tab.row_keys = Tab.objects.values_list('row_keys', flat=True).get(id=tab.id)
+        now = timezone.now()
+        count = 0
+        position = _position(column, tab.row_keys)
+        if position is not None:
+            count += _rewrite(
+                tab, JSONCastable('data', ROW_KEY, to, index=position),
+                JSONCastValue('data', ROW_KEY, to, index=position), user, now,
+            )
+        count += _rewrite(tab, JSONCastable('data', column, to), JSONCastValue('data', column, to), user, now)
+        _changed(tab, 'cast', column, count, to=to)
+    return count
+
+
+def _changed(tab, operation, column, count, **details):
+    """Bump the tab's last_modified and tell open grids to reload."""
+    tab.record_changed()
+    events.publish(tab.id, 'import', payload={
+        'operation': operation,
+        'column': column,
+        'count': count,
+        **details,
+    })
@@ -0,0 +1,190 @@
+"""
+Transparent compression of long text values in Record.data.
+
+Record.data stays a JSON object with its keys and short values untouched,
+so the database-side filters and projections in portal.jsonsql keep
+working. Only string values of at least min_length characters are
+replaced by a compressed token:
+
+    "\\x00z:<dictionary id>:<base85 raw-deflate bytes>"
+
+Each tab can have a shared zlib dictionary (CompressionDictionary) trained
+from its own text by `manage.py compress_records`; repeated words and
+phrases across rows then cost a few bits each. Dictionary id 0 means no
+dictionary.
+
+CompressedJSONField compresses on save (when PORTAL_RECORD_COMPRESSION is
+enabled) and always decompresses on load, so views and ORM code only ever
+see plain values. bulk_update() and QuerySet.update() store values as
+given; compress_records picks those rows up on its next run.
+
+Compressed values cannot be matched by SQL text lookups such as
+icontains, so keep compression for tabs whose long columns are read
+rather than searched.
+"""
+import base64
+import re
+import threading
+import zlib
+from collections import Counter
+
+from django.conf import settings
+from django.db import models
+
+# Prefix of a compressed value; NUL never appears in imported cell text
+TOKEN_PREFIX = '\x00z:'
+
+# zlib keeps at most the last 32 KB of a dictionary
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+DEFAULT_MIN_LENGTH = 256
+DEFAULT_LEVEL = 6
+
+# dictionary id -> bytes, and tab id -> (dictionary id, bytes)
+_dictionaries = {}
+_tab_dictionaries = {}
+_cache_lock = threading.Lock()
+
+
+def _config():
+    return getattr(settings, 'PORTAL_RECORD_COMPRESSION', None) or {}
+
+
+def is_enabled():
+    return bool(_config().get('enabled'))
+
+
+def min_length():
+    """Shortest string value that is compressed."""
+    return _config().get('min_length', DEFAULT_MIN_LENGTH)
+
+
+def _dictionary(dictionary_id):
+    """Dictionary bytes by id, cached for the life of the process."""
+    if not dictionary_id:
+        return b''
+    with _cache_lock:
+        data = _dictionaries.get(dictionary_id)
+    if data is None:
+        from .models import CompressionDictionary
+        data = bytes(CompressionDictionary.objects.values_list('data', flat=True).get(id=dictionary_id))
+        with _cache_lock:
+            _dictionaries[dictionary_id] = data
+    return data
+
+
+def tab_dictionary(tab_id):
+    """(dictionary id, bytes) used for new writes to a tab; (0, b'') for none."""
+    if tab_id is None:
+        return 0, b''
+    with _cache_lock:
+        if tab_id in _tab_dictionaries:
+            return _tab_dictionaries[tab_id]
+    from .models import CompressionDictionary
+    latest = (
+        CompressionDictionary.objects.filter(tab_id=tab_id)
+        .order_by('-id')
+        .values_list('id', 'data')
+        .first()
+    )
+    entry = (latest[0], bytes(latest[1])) if latest else (0, b'')
+    with _cache_lock:
+        _tab_dictionaries[tab_id] = entry
+        if latest:
+            _dictionaries[entry[0]] = entry[1]
+    return entry
+
+
+def set_tab_dictionary(tab_id, dictionary_id, data):
+    """Make this process write new values for a tab with the given dictionary."""
+    with _cache_lock:
+        _dictionaries[dictionary_id] = data
+        _tab_dictionaries[tab_id] = (dictionary_id, data)
+
+
+def compress_value(value, dictionary_id=0, dictionary=b'', level=None):
+    """Compress one string if it is long enough and actually gets shorter."""
+    if not isinstance(value, str) or value.startswith(TOKEN_PREFIX):
+        return value
+    if len(value) < min_length():
+        return value
+    if level is None:
+        level = _config().get('level', DEFAULT_LEVEL)
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    packed = compressor.compress(value.encode()) + compressor.flush()
+    token = f'{TOKEN_PREFIX}{dictionary_id}:{base64.b85encode(packed).decode()}'
+    return token if len(token) < len(value) else value
+
+
+def decompress_value(value):
+    """Return the original string for a compressed token; anything else as-is."""
+    if not isinstance(value, str) or not value.startswith(TOKEN_PREFIX):
+        return value
+    dictionary_id, _, packed = value[len(TOKEN_PREFIX):].partition(':')
+    dictionary = _dictionary(int(dictionary_id))
+    if dictionary:
+        decompressor = zlib.decompressobj(-15, zdict=dictionary)
+    else:
+        decompressor = zlib.decompressobj(-15)
+    raw = decompressor.decompress(base64.b85decode(packed)) + decompressor.flush()
+    return raw.decode()
+
+
+def compress_data(data, dictionary_id=0, dictionary=b''):
+    """Compress the long top-level string values of a record's data."""
+    if not isinstance(data, dict):
+        return compress_value(data, dictionary_id, dictionary)
+    return {key: compress_value(value, dictionary_id, dictionary) for key, value in data.items()}
+
+
+def decompress_data(data):
+    """Undo compress_data(); plain data is returned unchanged."""
+    if isinstance(data, dict):
+        if any(isinstance(value, str) and value.startswith(TOKEN_PREFIX) for value in data.values()):
+            return {key: decompress_value(value) for key, value in data.items()}
+        return data
+    return decompress_value(data)
+
+
+def train_dictionary(texts):
+    """
+    Build a zlib dictionary from sample text values.
+
+    Words and the punctuation after them are ranked by how many bytes they
+    would save (count x length). zlib matches best against the end of the
+    dictionary, so the most valuable tokens go last.
+    """
+    counts = Counter()
+    for text in texts:
+        counts.update(re.findall(r'\w+\W*', text))
+    ranked = sorted(
+        (token for token, count in counts.items() if count > 1),
+        key=lambda token: counts[token] * len(token),
+        reverse=True,
+    )
+    chosen = []
+    size = 0
+    for token in ranked:
+        encoded = token.encode()
+        if size + len(encoded) > MAX_DICTIONARY_SIZE:
+            break
+        chosen.append(encoded)
+        size += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+class CompressedJSONField(models.JSONField):
+    """JSONField that stores long string values compressed (see module docstring)."""
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_data(super().from_db_value(value, expression, connection))
+
+    def pre_save(self, model_instance, add):
+        value = super().pre_save(model_instance, add)
+        if value is None or not is_enabled():
+            return value
+        dictionary_id, dictionary = tab_dictionary(getattr(model_instance, 'tab_id', None))
+        return compress_data(value, dictionary_id, dictionary)
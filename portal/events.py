@@ -0,0 +1,241 @@
+"""
+Live change feed for tabs, delivered to open grids over Server-Sent Events.
+
+Mutation views and the import path call publish()/apublish() to append a
+RecordEvent row inside their transaction. Once it commits, any stream held
+open by this process is woken immediately; streams in other worker
+processes pick the event up on their next keepalive tick, which costs one
+indexed query per connection rather than clients re-downloading the tab.
+
+The log keeps the newest EVENT_RETENTION events per tab. A client that
+reconnects with a Last-Event-ID that is no longer in its tab's log is
+sent a "reset" event and should reload the tab.
+"""
+import asyncio
+import json
+import threading
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import RecordEvent
+
+# Events kept per tab for Last-Event-ID resume
+EVENT_RETENTION = 1000
+
+# Prune a tab's log at its first event and then once every this many
+# events published for it by this process
+EVENT_PRUNE_INTERVAL = 50
+
+# Seconds between keepalive comments (and cross-process catch-up queries)
+KEEPALIVE_SECONDS = 15
+
+# Milliseconds the browser waits before reconnecting a dropped stream
+RECONNECT_MILLISECONDS = 3000
+
+# Maximum events read from the log per query
+EVENT_BATCH_SIZE = 500
+
+# tab_id -> set of wakeup callbacks for streams open in this process
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+
+# tab_id -> events published by this process, for pruning
+_published = Counter()
+
+
+def _subscribe(tab_id, callback):
+    with _subscribers_lock:
+        _subscribers.setdefault(tab_id, set()).add(callback)
+
+
+def _unsubscribe(tab_id, callback):
+    with _subscribers_lock:
+        callbacks = _subscribers.get(tab_id)
+        if callbacks:
+            callbacks.discard(callback)
+            if not callbacks:
+                del _subscribers[tab_id]
+
+
+def _notify(tab_id):
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(tab_id, ()))
+    for callback in callbacks:
+        callback()
+
+
+def _due_for_pruning(tab_id):
+    with _subscribers_lock:
+        _published[tab_id] += 1
+        return _published[tab_id] % EVENT_PRUNE_INTERVAL == 1
+
+
+def _prune(tab_id):
+    """Drop events beyond the retention window for a tab."""
+    cutoff = (
+        RecordEvent.objects.filter(tab_id=tab_id)
+        .order_by('-id')
+        .values_list('id', flat=True)[EVENT_RETENTION:EVENT_RETENTION + 1]
+    )
+    cutoff = list(cutoff)
+    if cutoff:
+        RecordEvent.objects.filter(tab_id=tab_id, id__lte=cutoff[0]).delete()
+
+
+def publish(tab_id, action, record_id=None, payload=None):
+    """
+    Append an event to a tab's change feed.
+
+    Parameters:
+        tab_id: ID of the tab the change belongs to
+        action: 'create', 'update', 'delete' or 'import'
+        record_id: ID of the affected record (None for imports)
+        payload: JSON-serializable event data (e.g. the full row)
+
+    Returns:
+        RecordEvent: The stored event
+    """
+    event = RecordEvent.objects.create(
+        tab_id=tab_id,
+        action=action,
+        record_id=record_id,
+        payload=payload or {},
+    )
+    if _due_for_pruning(tab_id):
+        _prune(tab_id)
+    transaction.on_commit(lambda: _notify(tab_id), using=event._state.db)
+    return event
+
+
+async def apublish(tab_id, action, record_id=None, payload=None):
+    """Async version of publish() for the async API views."""
+    event = await RecordEvent.objects.acreate(
+        tab_id=tab_id,
+        action=action,
+        record_id=record_id,
+        payload=payload or {},
+    )
+    if _due_for_pruning(tab_id):
+        await sync_to_async(_prune)(tab_id)
+    # Autocommit: the row is already visible to other streams
+    _notify(tab_id)
+    return event
+
+
+def record_row(record):
+    """Event payload for a record, shaped like a row of api_fetch_records."""
+    row = {'id': record.id}
+    if isinstance(record.data, dict):
+        row.update(record.data)
+    else:
+        row['data'] = record.data
+    return row
+
+
+def _format_event(event_id, action, payload):
+    data = json.dumps(payload, cls=DjangoJSONEncoder)
+    return f'id: {event_id}\nevent: {action}\ndata: {data}\n\n'
+
+
+def _read_events(tab_id, last_event_id):
+    """
+    Fetch the next batch of events after last_event_id (0 for none).
+
+    Returns (events, reset): reset is True when last_event_id is no longer
+    in the tab's log, so the client may have missed changes. One query:
+    the batch starts at last_event_id itself, which shows it is still
+    there (pruning drops a tab's oldest events first).
+    """
+    batch = list(
+        RecordEvent.objects.filter(tab_id=tab_id, id__gte=last_event_id)
+        .order_by('id')
+        .values_list('id', 'action', 'payload')[:EVENT_BATCH_SIZE + 1]
+    )
+    if not last_event_id:
+        return batch[:EVENT_BATCH_SIZE], False
+    if not batch or batch[0][0] != last_event_id:
+        return [], True
+    return batch[1:], False
+
+
+def _latest_event_id(tab_id):
+    latest = (
+        RecordEvent.objects.filter(tab_id=tab_id)
+        .order_by('-id')
+        .values_list('id', flat=True)
+        .first()
+    )
+    return latest or 0
+
+
+def _drain(tab_id, last_event_id):
+    """Read every pending event; returns (chunks, new_last_event_id)."""
+    chunks = []
+    while True:
+        batch, reset = _read_events(tab_id, last_event_id)
+        if reset:
+            last_event_id = _latest_event_id(tab_id)
+            chunks.append(_format_event(last_event_id, 'reset', {}))
+            return chunks, last_event_id
+        for event_id, action, payload in batch:
+            chunks.append(_format_event(event_id, action, payload))
+            last_event_id = event_id
+        if len(batch) < EVENT_BATCH_SIZE:
+            return chunks, last_event_id
+
+
+async def astream(tab_id, last_event_id=None):
+    """
+    Async SSE generator for a tab, used when served through config.asgi.
+
+    A fresh connection (no Last-Event-ID) starts at the current end of the
+    log; a reconnect replays everything after the given id.
+    """
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+
+    def callback():
+        loop.call_soon_threadsafe(wakeup.set)
+
+    _subscribe(tab_id, callback)
+    try:
+        if last_event_id is None:
+            last_event_id = await sync_to_async(_latest_event_id)(tab_id)
+        yield f'retry: {RECONNECT_MILLISECONDS}\n\n'
+        while True:
+            wakeup.clear()
+            chunks, last_event_id = await sync_to_async(_drain)(tab_id, last_event_id)
+            for chunk in chunks:
+                yield chunk
+            try:
+                await asyncio.wait_for(wakeup.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+    finally:
+        _unsubscribe(tab_id, callback)
+
+
+def stream(tab_id, last_event_id=None):
+    """
+    Blocking SSE generator for a tab, used under WSGI (e.g. runserver).
+
+    Holds one server thread for as long as the client stays connected.
+    """
+    wakeup = threading.Event()
+    _subscribe(tab_id, wakeup.set)
+    try:
+        if last_event_id is None:
+            last_event_id = _latest_event_id(tab_id)
+        yield f'retry: {RECONNECT_MILLISECONDS}\n\n'
+        while True:
+            wakeup.clear()
+            chunks, last_event_id = _drain(tab_id, last_event_id)
+            for chunk in chunks:
+                yield chunk
+            if not wakeup.wait(KEEPALIVE_SECONDS):
+                yield ': keepalive\n\n'
+    finally:
+        _unsubscribe(tab_id, wakeup.set)
@@ -0,0 +1,301 @@
+"""
+Change history of Record.data, stored as compact undo entries.
+
+Each change to a record writes one RecordHistory entry holding only what
+the change touched: the previous values of the keys it set or removed,
+and the names of the keys it added. Creating a record writes nothing
+(before its created_at it did not exist); deleting one stores its whole
+data, as the row itself is gone.
+
+The entries step back in time from a record's current data, so its state
+at any moment is rebuilt by undoing, newest first, the entries made after
+that moment. Every snapshot_interval-th entry of a record stores the
+whole previous data instead (a snapshot), so a rebuild starts from the
+first snapshot after the moment and undoes fewer than snapshot_interval
+entries, however long the history.
+
+Writers pass whole batches (record_changes, record_deletes), which cost
+two queries for the snapshot bookkeeping plus one executemany() INSERT
+per HISTORY_BATCH_SIZE entries.
+`manage.py compact_history` merges old entries.
+"""
+import heapq
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Max
+from django.utils import timezone
+
+from . import compression
+from .models import Record, RecordHistory
+
+DEFAULT_SNAPSHOT_INTERVAL = 20
+
+# Entries per INSERT, and record ids per IN (...) lookup
+HISTORY_BATCH_SIZE = 500
+
+
+def _config():
+    return getattr(settings, 'PORTAL_HISTORY', None) or {}
+
+
+def is_enabled():
+    return bool(_config().get('enabled', True))
+
+
+def snapshot_interval():
+    return max(_config().get('snapshot_interval', DEFAULT_SNAPSHOT_INTERVAL), 1)
+
+
+def diff(old, new):
+    """
+    Undo information for a change: (previous values, added keys).
+
+    previous maps each key the change set or removed to its old value.
+    Values of different JSON types (1 and true, 1 and 1.0) count as
+    different. Returns None if either side is not an object.
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return None
+    previous = {
+        key: value for key, value in old.items()
+        if key not in new or type(new[key]) is not type(value) or new[key] != value
+    }
+    added = [key for key in new if key not in old]
+    return previous, added
+
+
+def undo(data, entry):
+    """A record's data before the change an entry records, given the data after it."""
+    if entry.kind != RecordHistory.UPDATE:
+        return dict(entry.previous)
+    data = dict(data)
+    for key in entry.added:
+        data.pop(key, None)
+    data.update(entry.previous)
+    return data
+
+
+def _depths(record_ids):
+    """record id -> depth of its latest entry, for records that have one."""
+    depths = {}
+    for start in range(0, len(record_ids), HISTORY_BATCH_SIZE):
+        chunk = record_ids[start:start + HISTORY_BATCH_SIZE]
+        latest = (
+            RecordHistory.objects.filter(record_id__in=chunk)
+            .order_by()
+            .values('record_id')
+            .annotate(latest=Max('id'))
+            .values_list('latest', flat=True)
+        )
+        depths.update(
+            RecordHistory.objects.filter(id__in=list(latest)).values_list('record_id', 'depth')
+        )
+    return depths
+
+
+def _insert(tab_id, rows, user, when):
+    """
+    INSERT entries given as (record id, kind, previous, added, depth, record created_at).
+
+    Bypasses bulk_create(): building and preparing a model instance per
+    entry cost several times the statements whose changes they record.
+    Values are prepared by the model's own fields, so the stored form is
+    the same (long previous values compressed, see portal.compression).
+    """
+    connection = connections[router.db_for_write(RecordHistory)]
+    fields = [RecordHistory._meta.get_field(name) for name in (
+        'tab', 'record_id', 'kind', 'previous', 'added', 'depth', 'record_created_at', 'changed_by', 'changed_at',
+    )]
+    previous_field, added_field, created_field = fields[3], fields[4], fields[6]
+    shared = (
+        fields[0].get_db_prep_save(tab_id, connection),
+        fields[7].get_db_prep_save(user.pk if user is not None else None, connection),
+        fields[8].get_db_prep_save(when, connection),
+    )
+    dictionary = compression.tab_dictionary(tab_id) if compression.is_enabled() else None
+    adapt_json = connection.ops.adapt_json_value
+
+    params = []
+    for record_id, kind, previous, added, depth, created_at in rows:
+        if dictionary is not None:
+            previous = compression.compress_data(previous, *dictionary)
+        params.append((
+            shared[0], record_id, kind,
+            adapt_json(previous, previous_field.encoder),
+            adapt_json(added, added_field.encoder),
+            depth,
+            created_field.get_db_prep_save(created_at, connection),
+            shared[1], shared[2],
+        ))
+
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(RecordHistory._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(params), HISTORY_BATCH_SIZE):
+            cursor.executemany(sql, params[start:start + HISTORY_BATCH_SIZE])
+
+
+def record_changes(tab_id, changes, user=None, when=None):
+    """
+    Store undo entries for a batch of updates to a tab's records.
+
+    changes is an iterable of (record id, old data, new data); records
+    whose data did not change are skipped. Returns the number of entries.
+    """
+    if not is_enabled():
+        return 0
+    changes = [change for change in changes if change[1] != change[2]]
+    if not changes:
+        return 0
+    when = when or timezone.now()
+    interval = snapshot_interval()
+    depths = _depths([record_id for record_id, _, _ in changes])
+
+    rows = []
+    for record_id, old, new in changes:
+        depth = depths.get(record_id, 0) + 1
+        undo_info = diff(old, new)
+        if undo_info is None or depth >= interval:
+            depth = 0
+            rows.append((record_id, RecordHistory.SNAPSHOT, old if isinstance(old, dict) else {}, [], depth, None))
+        else:
+            previous, added = undo_info
+            if not previous and not added:
+                continue
+            rows.append((record_id, RecordHistory.UPDATE, previous, added, depth, None))
+        depths[record_id] = depth
+    _insert(tab_id, rows, user, when)
+    return len(rows)
+
+
+def record_deletes(tab_id, records, user=None, when=None):
+    """
+    Store the data of records about to be deleted.
+
+    records is an iterable of (record id, data, created_at).
+    """
+    if not is_enabled():
+        return 0
+    when = when or timezone.now()
+    rows = [
+        (record_id, RecordHistory.DELETE, data if isinstance(data, dict) else {}, [], 0, created_at)
+        for record_id, data, created_at in records
+    ]
+    _insert(tab_id, rows, user, when)
+    return len(rows)
+
+
+async def arecord_changes(tab_id, changes, user=None, when=None):
+    """Async version of record_changes() for the async API views."""
+    return await sync_to_async(record_changes)(tab_id, changes, user, when)
+
+
+async def arecord_deletes(tab_id, records, user=None, when=None):
+    """Async version of record_deletes() for the async API views."""
+    return await sync_to_async(record_deletes)(tab_id, records, user, when)
+
+
+def _rewind(data, entries):
+    """
+    Undo entries (a record's entries after some moment, oldest first) from data.
+
+    Only entries before the first snapshot or delete are undone: that one
+    already holds the whole data as of its own time.
+    """
+    for index, entry in enumerate(entries):
+        if entry.kind != RecordHistory.UPDATE:
+            data, entries = dict(entry.previous), entries[:index]
+            break
+    for entry in reversed(entries):
+        data = undo(data, entry)
+    return data
+
+
+def record_at(record_id, when):
+    """A record's data at a moment, or None if it did not exist then."""
+    record = Record.objects.filter(id=record_id).values_list('data', 'created_at').first()
+    if record is not None:
+        data, created_at = record
+    else:
+        deletion = RecordHistory.objects.filter(record_id=record_id, kind=RecordHistory.DELETE).last()
+        if deletion is None or deletion.changed_at <= when:
+            return None
+        data, created_at = deletion.previous, deletion.record_created_at
+    if created_at is None or created_at > when:
+        return None
+
+    entries = []
+    for entry in RecordHistory.objects.filter(record_id=record_id, changed_at__gt=when).iterator():
+        entries.append(entry)
+        if entry.kind != RecordHistory.UPDATE:
+            break
+    return _rewind(data, entries)
+
+
+def tab_at(tab, when):
+    """
+    Yield (record id, data) for each record of a tab as it was at a moment.
+
+    Records are yielded in id order, including ones deleted since.
+    """
+    # Each record's entries after the moment, up to its first snapshot
+    pending = {}
+    full = set()
+    entries = (
+        RecordHistory.objects.filter(tab=tab, changed_at__gt=when)
+        .order_by('record_id', 'id')
+        .iterator(chunk_size=2000)
+    )
+    for entry in entries:
+        if entry.record_id in full:
+            continue
+        pending.setdefault(entry.record_id, []).append(entry)
+        if entry.kind != RecordHistory.UPDATE:
+            full.add(entry.record_id)
+
+    current = (
+        (record_id, _rewind(data, pending.get(record_id, [])))
+        for record_id, data in (
+            Record.objects.filter(tab=tab, created_at__lte=when)
+            .order_by('id')
+            .values_list('id', 'data')
+            .iterator(chunk_size=2000)
+        )
+    )
+    deleted_ids = (
+        RecordHistory.objects.filter(
+            tab=tab, kind=RecordHistory.DELETE, changed_at__gt=when, record_created_at__lte=when,
+        )
+        .order_by('record_id')
+        .values_list('record_id', flat=True)
+    )
+    deleted = (
+        # The first full entry after the moment holds the data to start from
+        (record_id, _rewind({}, pending[record_id]))
+        for record_id in deleted_ids.iterator()
+    )
+    yield from heapq.merge(current, deleted, key=lambda row: row[0])
+
+
+def merge(entries):
+    """
+    Combine consecutive update entries of one record (oldest first) into one.
+
+    Undoing the result equals undoing each entry, newest first.
+    """
+    previous = {}
+    added = set()
+    for entry in reversed(entries):
+        for key in entry.added:
+            added.add(key)
+            previous.pop(key, None)
+        for key, value in entry.previous.items():
+            previous[key] = value
+            added.discard(key)
+    return previous, sorted(added)
@@ -0,0 +1,289 @@
+"""
+Database-side JSON expressions for Record.data.
+
+Django's KeyTransform decodes extracted values on SQLite with json.loads,
+which turns a stored string such as "123" into the number 123. These
+expressions keep the work in SQL but return well-formed JSON text, so
+values come back with the same types they were stored with.
+
+The JSONEdit expressions return an edited copy of the column, for
+set-based UPDATEs such as the column operations in portal.columns.
+"""
+import json
+
+from django.db.models import BooleanField, F, Func, JSONField, Q
+
+from .compression import CompressedJSONField
+from .positional import key_path
+
+# Operators accepted in JSON filter predicates ("Key__op": value)
+FILTER_OPERATORS = ('exact', 'iexact', 'icontains', 'istartswith', 'gt', 'gte', 'lt', 'lte', 'in', 'isnull')
+
+
+# Strings that cast_column() converts to numbers
+NUMBER_PATTERN = r'^-?[0-9]+(\.[0-9]+)?$'
+
+
+def json_path(key, index=None):
+    """
+    JSON path for a top-level key, quoted so dots and spaces are literal.
+
+    index selects an element of the key's array value.
+    """
+    path = '$.' + json.dumps(key)
+    return path if index is None else f'{path}[{index}]'
+
+
+def _pg_path(key, index=None):
+    """PostgreSQL text[] path for the same location as json_path()."""
+    return [key] if index is None else [key, str(index)]
+
+
+def _sqlite_extract(connection):
+    """SQL extracting a JSON value as JSON text, so true stays true rather than json_extract's 1."""
+    if connection.Database.sqlite_version_info >= (3, 38):
+        return '{column} -> %s'
+    return 'JSON_EXTRACT({column}, %s)'
+
+
+class JSONProject(Func):
+    """
+    Build a JSON object holding only the given top-level keys of a JSONField.
+
+    JSONProject('data', ['Name', 'S.No']) selects {"Name": ..., "S.No": ...}
+    straight from the database, so the rest of the row is never read into
+    Python. Keys missing from a row come back as null, and compressed
+    values (portal.compression) are expanded on load.
+    """
+
+    output_field = CompressedJSONField()
+
+    def __init__(self, field, keys, **extra):
+        self.keys = list(keys)
+        super().__init__(F(field), **extra)
+
+    def _build(self, compiler, connection, function, extract):
+        column_sql, column_params = compiler.compile(self.source_expressions[0])
+        parts = []
+        params = []
+        for key in self.keys:
+            parts.append('%s, ' + extract.format(column=column_sql))
+            params.extend([key, *column_params, json_path(key)])
+        return f'{function}({", ".join(parts)})', params
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # MySQL / MariaDB
+        return self._build(compiler, connection, 'JSON_OBJECT', 'JSON_EXTRACT({column}, %s)')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self._build(compiler, connection, 'JSON_OBJECT', _sqlite_extract(connection))
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        column_sql, column_params = compiler.compile(self.source_expressions[0])
+        parts = []
+        params = []
+        for key in self.keys:
+            parts.append(f'%s::text, {column_sql} -> %s')
+            params.extend([key, *column_params, key])
+        return f'JSONB_BUILD_OBJECT({", ".join(parts)})', params
+
+
+def json_filter(predicates, field='data', row_keys=None):
+    """
+    Build a Q object from JSON key/value predicates on a JSONField.
+
+    predicates maps a key, optionally suffixed with an operator, to a value:
+        {"Name": "Alice Johnson"}          exact match
+        {"Name__icontains": "alice"}       case-insensitive substring
+        {"Age__gte": 30, "Status": "Active"}
+    Every predicate must match. Values keep their JSON types, so 5 and "5"
+    are different. Raises ValueError for malformed predicates.
+    
+    Pass a positional tab's row_keys (portal.positional) to match keys
+    stored by position as well as by name.
+    """
+    if not isinstance(predicates, dict) or not predicates:
+        raise ValueError('Filter must be a non-empty JSON object')
+
+    query = Q()
+    for name, value in predicates.items():
+        key, _, operator = name.rpartition('__')
+        if not key or operator not in FILTER_OPERATORS:
+            key, operator = name, 'exact'
+        if operator in ('iexact', 'icontains', 'istartswith') and not isinstance(value, str):
+            raise ValueError(f"'{name}' needs a string value")
+        if operator == 'in' and not isinstance(value, list):
+            raise ValueError(f"'{name}' needs a list value")
+        positional, plain = key_path(key, row_keys, field)
+        condition = Q(**{f'{plain}__{operator}': value})
+        if positional:
+            other = Q(**{f'{positional}__{operator}': value})
+            # A row keeps a key in one place, so it is missing only if
+            # missing from both
+            if operator == 'isnull' and value:
+                condition &= other
+            else:
+                condition |= other
+        query &= condition
+    return query
+
+
+class JSONEdit(Func):
+    """
+    Base for expressions that return an edited copy of a JSONField.
+
+    Subclasses write each backend's SQL with {column} standing for the
+    field, which a plain column reference compiles without params.
+    """
+
+    output_field = JSONField()
+
+    def __init__(self, field, **extra):
+        super().__init__(F(field), **extra)
+
+    def _sql(self, compiler, sql, params):
+        column_sql, _ = compiler.compile(self.source_expressions[0])
+        return sql.format(column=column_sql), params
+
+
+class JSONRenameKey(JSONEdit):
+    """Move a top-level key's value to a new key name."""
+
+    def __init__(self, field, old, new, **extra):
+        self.old, self.new = old, new
+        super().__init__(field, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        old = json_path(self.old)
+        sql = 'JSON_REMOVE(JSON_SET({column}, %s, JSON_EXTRACT({column}, %s)), %s)'
+        return self._sql(compiler, sql, [json_path(self.new), old, old])
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        old = json_path(self.old)
+        extract = _sqlite_extract(connection)
+        sql = f'JSON_REMOVE(JSON_SET({{column}}, %s, {extract}), %s)'
+        return self._sql(compiler, sql, [json_path(self.new), old, old])
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        sql = '(({column} - %s) || JSONB_BUILD_OBJECT(%s::text, {column} -> %s))'
+        return self._sql(compiler, sql, [self.old, self.new, self.old])
+
+
+class JSONRemoveKey(JSONEdit):
+    """Remove a top-level key."""
+
+    def __init__(self, field, key, **extra):
+        self.key = key
+        super().__init__(field, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return self._sql(compiler, 'JSON_REMOVE({column}, %s)', [json_path(self.key)])
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self._sql(compiler, '({column} - %s)', [self.key])
+
+
+class JSONSetValue(JSONEdit):
+    """Set a top-level key, or an element of its array value, to a JSON value."""
+
+    def __init__(self, field, key, value, index=None, **extra):
+        self.key, self.value, self.index = key, value, index
+        super().__init__(field, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql = 'JSON_SET({column}, %s, CAST(%s AS JSON))'
+        return self._sql(compiler, sql, [json_path(self.key, self.index), json.dumps(self.value)])
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        sql = 'JSON_SET({column}, %s, JSON(%s))'
+        return self._sql(compiler, sql, [json_path(self.key, self.index), json.dumps(self.value)])
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        sql = 'JSONB_SET({column}, %s::text[], %s::jsonb)'
+        return self._sql(compiler, sql, [_pg_path(self.key, self.index), json.dumps(self.value)])
+
+
+class JSONCastValue(JSONEdit):
+    """
+    Convert the value at a key (or array element) to 'text' or 'number'.
+
+    'text' turns numbers and booleans into their string form; 'number'
+    turns strings matching NUMBER_PATTERN into numbers. Apply it to rows
+    matching JSONCastable with the same arguments: other values, such as
+    free text or compressed strings, would not convert cleanly.
+    """
+
+    TYPES = ('text', 'number')
+
+    def __init__(self, field, key, to, index=None, **extra):
+        if to not in self.TYPES:
+            raise ValueError(f"Unknown type '{to}' (expected one of {', '.join(self.TYPES)})")
+        self.key, self.to, self.index = key, to, index
+        super().__init__(field, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        path = json_path(self.key, self.index)
+        if self.to == 'text':
+            value = 'JSON_UNQUOTE(JSON_EXTRACT({column}, %s))'
+        else:
+            value = '(JSON_UNQUOTE(JSON_EXTRACT({column}, %s)) + 0)'
+        return self._sql(compiler, f'JSON_SET({{column}}, %s, {value})', [path, path])
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        path = json_path(self.key, self.index)
+        if self.to == 'text':
+            value = (
+                "CASE JSON_TYPE({column}, %s) WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' "
+                "ELSE CAST(JSON_EXTRACT({column}, %s) AS TEXT) END"
+            )
+        else:
+            value = (
+                "CASE WHEN INSTR(JSON_EXTRACT({column}, %s), '.') "
+                "THEN CAST(JSON_EXTRACT({column}, %s) AS REAL) "
+                "ELSE CAST(JSON_EXTRACT({column}, %s) AS INTEGER) END"
+            )
+        params = [path] * (1 + value.count('%s'))
+        return self._sql(compiler, f'JSON_SET({{column}}, %s, {value})', params)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        path = _pg_path(self.key, self.index)
+        if self.to == 'text':
+            value = 'TO_JSONB({column} #>> %s::text[])'
+        else:
+            value = 'TO_JSONB(({column} #>> %s::text[])::numeric)'
+        return self._sql(compiler, f'JSONB_SET({{column}}, %s::text[], {value})', [path, path])
+
+
+class JSONCastable(JSONCastValue):
+    """Condition: the value at a key (or array element) can be cast by JSONCastValue."""
+
+    output_field = BooleanField()
+    conditional = True
+
+    def as_sql(self, compiler, connection, **extra_context):
+        path = json_path(self.key, self.index)
+        if self.to == 'text':
+            sql = "JSON_TYPE(JSON_EXTRACT({column}, %s)) IN ('INTEGER', 'DOUBLE', 'DECIMAL', 'BOOLEAN')"
+            return self._sql(compiler, sql, [path])
+        sql = (
+            "(JSON_TYPE(JSON_EXTRACT({column}, %s)) = 'STRING' "
+            "AND JSON_UNQUOTE(JSON_EXTRACT({column}, %s)) REGEXP %s)"
+        )
+        return self._sql(compiler, sql, [path, path, NUMBER_PATTERN])
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        path = json_path(self.key, self.index)
+        if self.to == 'text':
+            sql = "JSON_TYPE({column}, %s) IN ('integer', 'real', 'true', 'false')"
+            return self._sql(compiler, sql, [path])
+        # Django registers REGEXP on its SQLite connections
+        sql = "(JSON_TYPE({column}, %s) = 'text' AND JSON_EXTRACT({column}, %s) REGEXP %s)"
+        return self._sql(compiler, sql, [path, path, NUMBER_PATTERN])
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        path = _pg_path(self.key, self.index)
+        if self.to == 'text':
+            sql = "JSONB_TYPEOF({column} #> %s::text[]) IN ('number', 'boolean')"
+            return self._sql(compiler, sql, [path])
+        sql = "(JSONB_TYPEOF({column} #> %s::text[]) = 'string' AND ({column} #>> %s::text[]) ~ %s)"
+        return self._sql(compiler, sql, [path, path, NUMBER_PATTERN])
@@ -0,0 +1,49 @@
+"""
+Management command to remove abandoned chunked uploads
+Usage: python manage.py clean_uploads [--older-than HOURS]
+
+Deletes upload sessions (portal.uploads) that have received nothing for
+PORTAL_UPLOADS['expire_hours'] (or --older-than hours), with their
+partial files, and any file in the upload directory that no session
+owns. Schedule it daily, e.g. from cron.
+"""
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from portal import uploads
+from portal.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads that were never finalized'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=None,
+                            help='Hours without a chunk before an upload counts as abandoned '
+                                 '(default: PORTAL_UPLOADS expire_hours)')
+
+    def handle(self, *args, **options):
+        hours = options['older_than'] if options['older_than'] is not None else uploads.expire_hours()
+        cutoff = timezone.now() - timedelta(hours=hours)
+        self.stdout.write(self.style.WARNING(f'⏳ Removing uploads idle for {hours:g} hours...'))
+
+        stale = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+        for session in stale:
+            uploads.discard(session)
+
+        # Files left behind by sessions deleted some other way
+        orphans = 0
+        directory = uploads.directory()
+        if directory.is_dir():
+            live = {f'{session_id}.part' for session_id in UploadSession.objects.values_list('id', flat=True)}
+            for path in directory.glob('*.part'):
+                if path.name not in live and path.stat().st_mtime < cutoff.timestamp():
+                    os.remove(path)
+                    orphans += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Removed {len(stale)} abandoned uploads and {orphans} orphaned files'
+        ))
@@ -0,0 +1,102 @@
+"""
+Management command to merge old record history entries
+Usage: python manage.py compact_history [--older-than 30] [--batch-size 500]
+
+Entries older than --older-than days are merged per record and per day:
+each run of consecutive update entries of a record on the same day
+becomes one entry with the combined undo information (see
+portal.history.merge). Point-in-time reads of those days then resolve to
+the state at the start of the run. Snapshots and deletes are kept, so
+rebuilds stay bounded.
+
+With PORTAL_SHARDING each department's database is compacted in turn.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from portal import sharding
+from portal.history import merge
+from portal.models import RecordHistory
+
+
+class Command(BaseCommand):
+    help = 'Merge record history entries older than a cutoff, one entry per record and day'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30,
+                            help='Only merge entries older than this many days')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Records compacted per transaction')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        self.stdout.write(self.style.WARNING(f'⏳ Compacting history before {cutoff:%Y-%m-%d %H:%M}...'))
+
+        record_total = merged_total = removed_total = 0
+        for department_id in sharding.department_ids():
+            with sharding.use(department_id):
+                records, merged, removed = self._compact(cutoff, options['batch_size'])
+            record_total += records
+            merged_total += merged
+            removed_total += removed
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Merged {merged_total + removed_total} entries of {record_total} records into {merged_total}'
+        ))
+
+    def _compact(self, cutoff, batch_size):
+        """Merge the current database's old entries; returns (records, entries kept, entries removed)."""
+        old_entries = RecordHistory.objects.filter(changed_at__lt=cutoff)
+        # Records with at least two old update entries, the only ones that can merge
+        record_ids = list(
+            old_entries.filter(kind=RecordHistory.UPDATE)
+            .order_by()
+            .values('record_id')
+            .annotate(entries=Count('id'))
+            .filter(entries__gt=1)
+            .values_list('record_id', flat=True)
+        )
+
+        merged_total = removed_total = 0
+        for start in range(0, len(record_ids), batch_size):
+            chunk = record_ids[start:start + batch_size]
+            entries = old_entries.filter(record_id__in=chunk).order_by('record_id', 'id')
+            merged, removed = [], []
+            run = []
+            for entry in entries:
+                if run and not self._continues(run[-1], entry):
+                    self._close(run, merged, removed)
+                    run = []
+                if entry.kind == RecordHistory.UPDATE:
+                    run.append(entry)
+            self._close(run, merged, removed)
+
+            with sharding.atomic():
+                RecordHistory.objects.bulk_update(merged, ['previous', 'added'])
+                for offset in range(0, len(removed), 500):
+                    RecordHistory.objects.filter(id__in=removed[offset:offset + 500]).delete()
+            merged_total += len(merged)
+            removed_total += len(removed)
+        return len(record_ids), merged_total, removed_total
+
+    @staticmethod
+    def _continues(last, entry):
+        """Whether entry extends a run of update entries ending with last."""
+        return (
+            entry.kind == RecordHistory.UPDATE
+            and entry.record_id == last.record_id
+            and timezone.localdate(entry.changed_at) == timezone.localdate(last.changed_at)
+        )
+
+    @staticmethod
+    def _close(run, merged, removed):
+        """Queue a run's merge: its newest entry takes the combined undo information."""
+        if len(run) < 2:
+            return
+        newest = run[-1]
+        newest.previous, newest.added = merge(run)
+        merged.append(newest)
+        removed.extend(entry.id for entry in run[:-1])
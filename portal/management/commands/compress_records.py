@@ -0,0 +1,132 @@
+"""
+Management command to compress (or expand) long Record.data text values
+Usage: python manage.py compress_records [--tab ID] [--decompress] [--batch-size 500] [--pause 0.05] [--vacuum]
+
+For each tab, trains a shared zlib dictionary from a sample of its long
+text values, then rewrites the records in small id-ordered batches, each
+in its own short transaction, so the app keeps serving while it runs. See
+portal.compression for the storage format.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+from portal.compression import (
+    compress_data, decompress_data, is_enabled, min_length, set_tab_dictionary, train_dictionary,
+)
+from portal import sharding
+from portal.models import CompressionDictionary, Record, Tab
+from portal.positional import pack, unpack
+
+# Most recent records sampled to train a tab's dictionary
+TRAINING_SAMPLE_ROWS = 2000
+
+
+class Command(BaseCommand):
+    help = 'Compress long Record.data values with per-tab dictionaries (or expand them with --decompress)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tab', type=int, help='Only convert this tab (default: all tabs)')
+        parser.add_argument('--decompress', action='store_true', help='Store every value uncompressed again')
+        parser.add_argument('--batch-size', type=int, default=500, help='Records rewritten per transaction')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches, leaving room for other writers')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM afterwards so SQLite returns the freed pages to the OS')
+
+    def handle(self, *args, **options):
+        tabs = Tab.objects.order_by('id')
+        if options['tab']:
+            tabs = tabs.filter(id=options['tab'])
+            if not tabs.exists():
+                raise CommandError(f'Tab {options["tab"]} does not exist')
+        if not options['decompress'] and not is_enabled():
+            self.stdout.write(self.style.WARNING(
+                '⚠️  PORTAL_RECORD_COMPRESSION is disabled: existing rows are compressed, '
+                'new writes will not be'
+            ))
+
+        total_before = total_after = 0
+        for tab in tabs:
+            with sharding.use(tab.department_id):
+                before, after, rewritten = self._convert(tab, options)
+            total_before += before
+            total_after += after
+            if rewritten:
+                self.stdout.write(
+                    f'{tab}: rewrote {rewritten} records, {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB'
+                )
+
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('⏳ Vacuuming database...'))
+            for alias in sharding.databases():
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('VACUUM')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Record data {total_before / 2**20:.1f} MB -> {total_after / 2**20:.1f} MB'
+        ))
+
+    def _convert(self, tab, options):
+        """Rewrite one tab's records; returns (bytes before, bytes after, rows rewritten)."""
+        dictionary_id, dictionary = 0, b''
+        if not options['decompress']:
+            dictionary_id, dictionary = self._train(tab)
+        # Key dictionary read once per tab, not by pack() for every row;
+        # [] keeps non-positional tabs from being looked up again
+        tab.refresh_from_db(fields=['row_keys'])
+        keys = tab.row_keys or []
+
+        before = after = rewritten = 0
+        last_id = 0
+        while True:
+            # Raw JSON text, so the stored size and form can be compared
+            rows = list(
+                Record.objects.filter(tab=tab, id__gt=last_id)
+                .order_by('id')
+                .values_list('id', Cast('data', TextField()))[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            changed = []
+            for record_id, raw in rows:
+                data = decompress_data(unpack(json.loads(raw)))
+                if not options['decompress']:
+                    data = compress_data(data, dictionary_id, dictionary)
+                data = pack(data, tab.id, keys)
+                stored = json.dumps(data)
+                before += len(raw)
+                after += len(stored)
+                if stored != raw:
+                    changed.append(Record(id=record_id, data=data))
+
+            if changed:
+                # bulk_update stores values as given and leaves updated_at alone:
+                # the records' content has not changed
+                with sharding.atomic():
+                    Record.objects.bulk_update(changed, ['data'])
+                rewritten += len(changed)
+                time.sleep(options['pause'])
+        return before, after, rewritten
+
+    def _train(self, tab):
+        """Train and store a dictionary from the tab's recent long values."""
+        shortest = min_length()
+        texts = []
+        sample = Record.objects.filter(tab=tab).order_by('-id').values_list('data', flat=True)
+        for data in sample[:TRAINING_SAMPLE_ROWS]:
+            values = data.values() if isinstance(data, dict) else [data]
+            texts.extend(value for value in values if isinstance(value, str) and len(value) >= shortest)
+
+        dictionary = train_dictionary(texts)
+        if not dictionary:
+            return 0, b''
+        stored = CompressionDictionary.objects.create(tab=tab, data=dictionary)
+        set_tab_dictionary(tab.id, stored.id, dictionary)
+        return stored.id, dictionary
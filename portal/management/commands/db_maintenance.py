@@ -0,0 +1,153 @@
+"""
+Management command to keep the SQLite database compact and its statistics fresh
+Usage: python manage.py db_maintenance [--vacuum-pages 2000] [--max-seconds 60] [--pause 0.05]
+                                       [--analysis-limit 1000] [--checkpoint PASSIVE] [--skip-check]
+
+Runs, in order:
+
+1. ANALYZE, sampling at most --analysis-limit rows per index (0 reads
+   them all), then PRAGMA optimize, so the query planner sees the sizes
+   left by large imports and tab deletions
+2. PRAGMA incremental_vacuum in steps of --vacuum-pages pages, each its
+   own short write transaction with a --pause between them, until no
+   free pages remain or --max-seconds have passed; the next run picks up
+   where this one stopped. Needs auto_vacuum=INCREMENTAL (migration 0011)
+3. A WAL checkpoint, if the database is in WAL mode (PASSIVE by default,
+   which never waits on readers or writers)
+4. PRAGMA quick_check; problems are listed and the command fails
+
+With PORTAL_SHARDING every department's database is maintained after
+the catalog, one at a time.
+
+No step holds a lock for longer than one short statement except ANALYZE
+and quick_check, whose cost the limits above bound, so it is safe to run
+from cron while the site is live. Other requests waiting on a step retry
+for the connection's busy timeout; a vacuum step that cannot get the
+lock ends the vacuum for this run instead of failing it.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from portal import sharding
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_MODES = {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}
+
+
+class Command(BaseCommand):
+    help = 'ANALYZE, incrementally vacuum, checkpoint and quick_check the SQLite database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vacuum-pages', type=int, default=2000,
+                            help='Free pages returned to the filesystem per vacuum step')
+        parser.add_argument('--max-seconds', type=float, default=60,
+                            help='Stop vacuuming after this many seconds')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between vacuum steps, letting other writers in')
+        parser.add_argument('--analysis-limit', type=int, default=1000,
+                            help='Rows ANALYZE samples per index (0: all rows)')
+        parser.add_argument('--checkpoint', default='PASSIVE', choices=('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'),
+                            help='WAL checkpoint mode')
+        parser.add_argument('--skip-check', action='store_true', help='Skip PRAGMA quick_check')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('db_maintenance maintains SQLite databases; '
+                               f'the default database is {connection.vendor}')
+
+        started = time.monotonic()
+        reclaimed = 0
+        problems = []
+        for alias in sharding.databases():
+            freed, found = self._maintain(connections[alias], options)
+            reclaimed += freed
+            problems.extend(found)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Reclaimed {reclaimed / 2**20:.1f} MB in {time.monotonic() - started:.1f}s'
+        ))
+        if problems:
+            for problem in problems:
+                self.stderr.write(problem)
+            raise CommandError(f'quick_check found {len(problems)} problems')
+
+    def _maintain(self, database, options):
+        """Run every step on one database; returns (bytes reclaimed, quick_check problems)."""
+        self.connection = database
+        with database.cursor() as cursor:
+            self.cursor = cursor
+            page_size = self._pragma('page_size')
+            pages_before = self._pragma('page_count')
+            self.stdout.write(self.style.WARNING(
+                f'⏳ Maintaining {database.settings_dict["NAME"]} '
+                f'({pages_before * page_size / 2**20:.1f} MB, {self._pragma("freelist_count")} free pages)...'
+            ))
+
+            self._step('analyze', self._analyze, options)
+            self._step('incremental vacuum', self._vacuum, options)
+            self._step('checkpoint', self._checkpoint, options)
+            self.problems = []
+            if not options['skip_check']:
+                self._step('quick_check', self._quick_check, options)
+
+            pages_after = self._pragma('page_count')
+
+        self.stdout.write(
+            f'size: {pages_before * page_size / 2**20:.1f} MB -> {pages_after * page_size / 2**20:.1f} MB'
+        )
+        return (pages_before - pages_after) * page_size, self.problems
+
+    def _pragma(self, name):
+        self.cursor.execute(f'PRAGMA {name}')
+        return self.cursor.fetchone()[0]
+
+    def _step(self, name, method, options):
+        """Run one maintenance step and report its summary and how long it took."""
+        started = time.monotonic()
+        summary = method(options)
+        self.stdout.write(f'{name}: {summary} ({time.monotonic() - started:.2f}s)')
+
+    def _analyze(self, options):
+        self.cursor.execute(f'PRAGMA analysis_limit = {max(options["analysis_limit"], 0)}')
+        self.cursor.execute('ANALYZE')
+        self.cursor.execute('PRAGMA optimize')
+        return 'statistics updated'
+
+    def _vacuum(self, options):
+        mode = self._pragma('auto_vacuum')
+        if mode != 2:
+            return (f'skipped, auto_vacuum is {AUTO_VACUUM_MODES.get(mode, mode)} '
+                    '(run migrate to switch it to INCREMENTAL)')
+        deadline = time.monotonic() + options['max_seconds']
+        free_before = free = self._pragma('freelist_count')
+        stopped = ''
+        try:
+            while free:
+                if time.monotonic() >= deadline:
+                    stopped = f' (stopped after {options["max_seconds"]:g}s)'
+                    break
+                # sqlite3's execute() steps a statement once, and incremental_vacuum
+                # frees one page per step; executescript() runs it to the end
+                with self.connection.wrap_database_errors:
+                    self.cursor.executescript(f'PRAGMA incremental_vacuum({options["vacuum_pages"]});')
+                free = self._pragma('freelist_count')
+                time.sleep(options['pause'])
+        except OperationalError as e:
+            stopped = f' (stopped: {e})'
+        return f'freed {free_before - free} pages' + (f', {free} left' if free else '') + stopped
+
+    def _checkpoint(self, options):
+        journal_mode = self._pragma('journal_mode')
+        if journal_mode.lower() != 'wal':
+            return f'skipped, journal mode is {journal_mode}'
+        self.cursor.execute(f'PRAGMA wal_checkpoint({options["checkpoint"]})')
+        busy, log_pages, checkpointed = self.cursor.fetchone()
+        return f'{checkpointed} of {log_pages} WAL pages written back' + (' (busy)' if busy else '')
+
+    def _quick_check(self, options):
+        self.cursor.execute('PRAGMA quick_check')
+        rows = [row[0] for row in self.cursor.fetchall()]
+        self.problems = [] if rows == ['ok'] else rows
+        return f'{len(self.problems)} problems' if self.problems else 'ok'
@@ -0,0 +1,186 @@
+"""
+Management command to import a department written by export_department
+Usage: python manage.py import_department <file.jsonl.gz> [--name NEW_NAME] [--keep-ids] [--batch-size 2000]
+
+Reads the file line by line, so memory use does not grow with it, and
+creates the department, its tabs and their records. By default every
+object gets a new id and each record is attached to its tab's new id,
+so a department can be brought in next to existing data (or twice,
+under different --name values). --keep-ids keeps the exported ids
+instead, e.g. to restore into an empty database. With PORTAL_SHARDING
+the records go to the new department's database, and kept record ids
+must lie in its range (an export of the same department id).
+
+Users are matched by username; unknown ones are left empty. Records are
+inserted --batch-size at a time with one executemany() each
+(portal.utils.insert_records), keeping their timestamps. Everything
+runs in one transaction and is checked against the file's end line, so
+a truncated or failed import leaves nothing behind, not even the new
+department's database file. The new tabs store
+records as plain objects; run pack_records to store them positionally.
+"""
+import gzip
+import json
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, connections, transaction
+
+from portal import sharding
+from portal.models import Department, Record, Tab, User
+from portal.utils import insert_records
+
+from .export_department import FORMAT, VERSION
+
+
+def _moment(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+class Command(BaseCommand):
+    help = 'Import a department from a gzip-compressed JSON Lines export'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File written by export_department')
+        parser.add_argument('--name', help='Name for the imported department (default: the exported name)')
+        parser.add_argument('--keep-ids', action='store_true',
+                            help='Keep the exported ids instead of assigning new ones')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Records inserted per statement')
+
+    def handle(self, *args, **options):
+        self.user_ids = dict(User.objects.values_list('username', 'id'))
+        self.options = options
+        self.stdout.write(self.style.WARNING(f'⏳ Importing {options["path"]}...'))
+
+        try:
+            with gzip.open(options['path'], 'rt', encoding='utf-8') as lines, \
+                    transaction.atomic(), ExitStack() as self.department_scope:
+                department, tabs, counts = self._import(lines)
+        except IntegrityError as e:
+            raise CommandError(f'Import failed, nothing was imported: {e}')
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            raise CommandError(f'Invalid or truncated export file, nothing was imported: {e!r}')
+
+        for old_id, tab in tabs.items():
+            self.stdout.write(f'{tab.name}: {counts[old_id]} records')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Imported {department.name} with {len(tabs)} tabs and {sum(counts.values())} records'
+        ))
+
+    def _import(self, lines):
+        """Create everything in the file; returns (department, exported tab id -> Tab, tab id -> count)."""
+        keep_ids = self.options['keep_ids']
+        batch_size = self.options['batch_size']
+        department = None
+        tab_items = {}
+        tabs = {}
+        counts = {}
+        batch = []
+        end = None
+
+        for number, line in enumerate(lines, 1):
+            item = json.loads(line)
+            kind = item['type']
+            if number == 1:
+                if kind != 'header' or item.get('format') != FORMAT or item.get('version') != VERSION:
+                    raise CommandError(f'Not a {FORMAT} version {VERSION} export')
+            elif end is not None:
+                raise CommandError(f'Line {number}: data after the end line')
+            elif kind == 'department':
+                department = self._create_department(item)
+                if sharding.is_enabled() and not sharding.database_path(department.id).exists():
+                    # Unwound last, once its connection is done with
+                    self.department_scope.push(self._discard_on_failure(department.id))
+                # Its records' database (the catalog unless sharding), in the same all-or-nothing import
+                self.database = self.department_scope.enter_context(sharding.use(department.id))
+                self.department_scope.enter_context(transaction.atomic(using=self.database))
+            elif kind == 'tab':
+                if department is None:
+                    raise CommandError(f'Line {number}: tab before the department')
+                tabs[item['id']] = self._create_tab(item, department)
+                tab_items[item['id']] = item
+                counts[item['id']] = 0
+            elif kind == 'record':
+                tab = tabs.get(item['tab'])
+                if tab is None:
+                    raise CommandError(f"Line {number}: record of unknown tab {item['tab']}")
+                if keep_ids and sharding.is_enabled() and sharding.department_of_record(item['id']) != department.id:
+                    raise CommandError(f"Line {number}: record id {item['id']} is outside {department.name}'s range")
+                row = (
+                    tab.id, item['data'],
+                    _moment(item['created_at']), self.user_ids.get(item['created_by']),
+                    _moment(item['updated_at']), self.user_ids.get(item['updated_by']),
+                )
+                batch.append((item['id'],) + row if keep_ids else row)
+                counts[item['tab']] += 1
+                if len(batch) >= batch_size:
+                    insert_records(batch, with_ids=keep_ids)
+                    batch = []
+            elif kind == 'end':
+                end = item
+        if batch:
+            insert_records(batch, with_ids=keep_ids)
+
+        if department is None:
+            raise CommandError('The file holds no department')
+        if end is None:
+            raise CommandError('The file ends early (no end line); nothing was imported')
+        if (end['tabs'], end['records']) != (len(tabs), sum(counts.values())):
+            raise CommandError(
+                f"The file lists {end['tabs']} tabs and {end['records']} records but holds "
+                f"{len(tabs)} and {sum(counts.values())}; nothing was imported"
+            )
+
+        # The exported counters, now that the records are in
+        for old_id, tab in tabs.items():
+            Tab.objects.filter(id=tab.id).update(
+                record_count=counts[old_id], last_modified=_moment(tab_items[old_id]['last_modified']),
+            )
+        Department.objects.filter(id=department.id).update(
+            record_count=sum(counts.values()), last_modified=self._department_modified,
+        )
+        if keep_ids:
+            # Explicit ids leave PostgreSQL sequences behind; no-op on SQLite
+            for database, models in ((connection, [Department, Tab]), (connections[self.database], [Record])):
+                with database.cursor() as cursor:
+                    for statement in database.ops.sequence_reset_sql(no_style(), models):
+                        cursor.execute(statement)
+        return department, tabs, counts
+
+    @staticmethod
+    def _discard_on_failure(department_id):
+        """Exit callback deleting the department's new database if the import fails."""
+        def exit_callback(exc_type, exc, traceback):
+            if exc_type is not None:
+                sharding.discard(department_id)
+        return exit_callback
+
+    def _create_department(self, item):
+        name = self.options['name'] or item['name']
+        if Department.objects.filter(name=name).exists():
+            raise CommandError(f"Department '{name}' already exists; choose another with --name")
+        fields = {
+            'name': name, 'description': item.get('description', ''),
+            'created_by_id': self.user_ids.get(item.get('created_by')),
+        }
+        if self.options['keep_ids']:
+            fields['id'] = item['id']
+        department = Department.objects.create(**fields)
+        # created_at is auto_now_add: set the exported value afterwards
+        Department.objects.filter(id=department.id).update(created_at=_moment(item['created_at']))
+        self._department_modified = _moment(item.get('last_modified'))
+        return department
+
+    def _create_tab(self, item, department):
+        fields = {
+            'department': department, 'name': item['name'], 'description': item.get('description', ''),
+            'created_by_id': self.user_ids.get(item.get('created_by')),
+        }
+        if self.options['keep_ids']:
+            fields['id'] = item['id']
+        tab = Tab.objects.create(**fields)
+        Tab.objects.filter(id=tab.id).update(created_at=_moment(item['created_at']))
+        return tab
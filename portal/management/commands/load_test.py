@@ -0,0 +1,334 @@
+"""
+Management command to load test the portal with concurrent scripted users
+Usage: python manage.py load_test [--users 200] [--duration 60] [--records 2000]
+
+Starts config.wsgi.application on a local threaded server (the same server
+class runserver uses) and drives it from an asyncio HTTP client. Every
+virtual user logs in through /login/ with its own account, then loops over
+a role-weighted mix of dashboard loads, tab fetches, cell edits and Excel
+imports until the time is up.
+
+Runs against the configured database: the load test department, tab,
+records and loadtest_* users are created up front and deleted afterwards,
+together with the run's edit history and events, unless --keep is given.
+"""
+import asyncio
+import io
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+from config.wsgi import application
+from portal import sharding
+from portal.models import Department, Record, RecordEvent, RecordHistory, Tab
+
+User = get_user_model()
+
+# Usernames are loadtest_<role>_<n>; all share one password (hashed once)
+USERNAME_PREFIX = 'loadtest_'
+PASSWORD = 'LoadTest123!'
+
+# Share of virtual users per role
+ROLE_MIX = (('director', 1), ('scientist', 2), ('staff', 3))
+
+# Weighted actions per role; staff can only view
+ACTION_MIX = {
+    'director': (('dashboard', 2), ('fetch_tab', 4), ('edit_cell', 3), ('import', 0.25)),
+    'scientist': (('dashboard', 2), ('fetch_tab', 4), ('edit_cell', 3), ('import', 0.25)),
+    'staff': (('dashboard', 3), ('fetch_tab', 6)),
+}
+
+# Rows in each uploaded workbook
+IMPORT_ROWS = 20
+
+PERCENTILES = (50, 95, 99)
+
+
+class LoadTestServer(ThreadedWSGIServer):
+    # runserver's backlog of 10 would refuse connections long before the
+    # app itself saturates
+    request_queue_size = 1024
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpClient:
+    """Minimal cookie-keeping HTTP/1.1 client on asyncio streams."""
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies = {}
+
+    async def request(self, method, path, body=b'', headers=None):
+        """Send one request on a fresh connection; returns (status, body)."""
+        return await asyncio.wait_for(self._request(method, path, body, headers or {}), self.timeout)
+
+    async def _request(self, method, path, body, headers):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            lines = [
+                f'{method} {path} HTTP/1.1',
+                f'Host: {self.host}:{self.port}',
+                'Connection: close',
+                'Accept-Encoding: identity',
+                f'Content-Length: {len(body)}',
+            ]
+            if self.cookies:
+                lines.append('Cookie: ' + '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+            if 'csrftoken' in self.cookies and method != 'GET':
+                lines.append(f'X-CSRFToken: {self.cookies["csrftoken"]}')
+            lines.extend(f'{name}: {value}' for name, value in headers.items())
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+
+        head, _, content = response.partition(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            if name.lower() == 'set-cookie':
+                cookie = SimpleCookie(value.strip())
+                for key, morsel in cookie.items():
+                    self.cookies[key] = morsel.value
+        return int(status_line.split()[1]), content
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def _workbook():
+    """A small .xlsx upload shaped like the seeded tab."""
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['S.No', 'Name', 'Email', 'Score'])
+    for n in range(1, IMPORT_ROWS + 1):
+        sheet.append([n, f'Imported {n}', f'imported{n}@example.com', n % 100])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Drive the app over HTTP with concurrent director/scientist/staff users and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Concurrent virtual users (default: 200)')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds of mixed traffic (default: 60)')
+        parser.add_argument('--records', type=int, default=2000, help='Records seeded into the tab (default: 2000)')
+        parser.add_argument('--think-ms', type=int, default=500, help='Mean pause between a user\'s requests')
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds before a request counts as failed')
+        parser.add_argument('--port', type=int, default=0, help='Port to listen on (default: any free port)')
+        parser.add_argument('--seed', type=int, help='Random seed, to replay the same request mix')
+        parser.add_argument('--max-error-rate', type=float,
+                            help='Fail when more than this percentage of requests error')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded users and data')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        random.seed(options['seed'])
+
+        self.stdout.write(self.style.WARNING('⏳ Seeding load test data...'))
+        department, users = self._seed(options['users'], options['records'])
+        tab = department.tabs.get()
+        self.record_ids = list(tab.records.values_list('id', flat=True))
+        self.workbook = _workbook()
+        self.tab = tab
+
+        server = LoadTestServer(('127.0.0.1', options['port']), QuietRequestHandler)
+        server.set_app(application)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        port = server.server_address[1]
+
+        try:
+            self.stdout.write(f'Serving on 127.0.0.1:{port}, {len(users)} users, {options["duration"]:.0f}s')
+            login_elapsed, elapsed = asyncio.run(self._run(port, users, options))
+        finally:
+            server.shutdown()
+            server.server_close()
+            if not options['keep']:
+                self._clean_up(department)
+
+        self._report(login_elapsed, elapsed, options.get('max_error_rate'))
+
+    @staticmethod
+    def _clean_up(department):
+        """Delete everything the run created, including edit history and events."""
+        department_id = department.id
+        tab_ids = list(department.tabs.values_list('id', flat=True))
+        # A department database does not cascade from the catalog
+        with sharding.atomic(department_id):
+            for model in (Record, RecordHistory, RecordEvent):
+                model.objects.filter(tab_id__in=tab_ids).delete()
+        department.delete()
+        if sharding.is_enabled():
+            sharding.discard(department_id)
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def _seed(self, user_count, record_count):
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError('loadtest_* users already exist; delete them or rerun without --keep')
+
+        run = uuid.uuid4().hex[:8]
+        password = make_password(PASSWORD)
+        total_weight = sum(weight for _, weight in ROLE_MIX)
+        users = []
+        for role, weight in ROLE_MIX:
+            share = max(round(user_count * weight / total_weight), 1)
+            for n in range(share):
+                users.append(User(
+                    username=f'{USERNAME_PREFIX}{role}_{n}',
+                    password=password,
+                    email=f'{role}{n}.{run}@loadtest.local',
+                    employee_id=f'LOAD-{run}-{role[:3]}-{n}',
+                    department='Load Test',
+                    role=role,
+                ))
+        User.objects.bulk_create(users[:user_count])
+
+        department = Department.objects.create(name=f'Load Test {run}')
+        tab = Tab.objects.create(department=department, name='Grid')
+        with sharding.use(department.id):
+            Record.objects.bulk_create(
+                (
+                    Record(tab=tab, data={
+                        'S.No': n,
+                        'Name': f'Person {n}',
+                        'Email': f'person{n}@example.com',
+                        'Score': n % 100,
+                    })
+                    for n in range(1, record_count + 1)
+                ),
+                batch_size=1000,
+            )
+        tab.record_changed(record_count)
+        return department, [(user.username, user.role) for user in users[:user_count]]
+
+    async def _run(self, port, users, options):
+        self.samples = defaultdict(list)
+        clients = [HttpClient('127.0.0.1', port, options['timeout']) for _ in users]
+
+        # Every user signs in before the clock starts, so the PBKDF2 burst
+        # is reported on its own rather than skewing the mixed traffic
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self._login(client, username) for client, (username, _) in zip(clients, users)
+        ))
+        login_elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.WARNING('⏳ Running mixed traffic...'))
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        think = options['think_ms'] / 1000
+        await asyncio.gather(*(
+            self._user_loop(client, role, deadline, think)
+            for client, (_, role) in zip(clients, users)
+        ))
+        return login_elapsed, time.perf_counter() - started
+
+    async def _timed(self, endpoint, client, method, path, body=b'', headers=None):
+        started = time.perf_counter()
+        try:
+            status, _ = await client.request(method, path, body, headers)
+        except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+            status = 0  # Connection refused/reset, timeout or garbled response
+        self.samples[endpoint].append((time.perf_counter() - started, status))
+        return status
+
+    async def _login(self, client, username):
+        await self._timed('login', client, 'GET', '/login/')
+        form = urlencode({
+            'username': username,
+            'password': PASSWORD,
+            'csrfmiddlewaretoken': client.cookies.get('csrftoken', ''),
+        }).encode()
+        await self._timed('login', client, 'POST', '/login/', form, {
+            'Content-Type': 'application/x-www-form-urlencoded',
+        })
+
+    async def _user_loop(self, client, role, deadline, think):
+        actions, weights = zip(*ACTION_MIX[role])
+        # Stagger the first request so users do not move in lockstep
+        await asyncio.sleep(random.uniform(0, think))
+        while time.perf_counter() < deadline:
+            action = random.choices(actions, weights)[0]
+            await getattr(self, f'_{action}')(client)
+            await asyncio.sleep(random.uniform(0, 2 * think))
+
+    async def _dashboard(self, client):
+        await self._timed('dashboard', client, 'GET', '/dashboard/')
+
+    async def _fetch_tab(self, client):
+        await self._timed('fetch_tab', client, 'GET', f'/api/tab/{self.tab.id}/records/')
+
+    async def _edit_cell(self, client):
+        record_id = random.choice(self.record_ids)
+        body = json.dumps({'column': 'Score', 'value': random.randint(0, 99)}).encode()
+        await self._timed('edit_cell', client, 'POST', f'/record/{record_id}/update-cell/', body, {
+            'Content-Type': 'application/json',
+        })
+
+    async def _import(self, client):
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\n'
+            'Content-Disposition: form-data; name="file"; filename="load_test.xlsx"\r\n'
+            'Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n'
+        ).encode() + self.workbook + f'\r\n--{boundary}--\r\n'.encode()
+        await self._timed('import', client, 'POST', f'/tab/{self.tab.id}/import-excel/', body, {
+            'Content-Type': f'multipart/form-data; boundary={boundary}',
+        })
+
+    def _report(self, login_elapsed, elapsed, max_error_rate):
+        login = self.samples.pop('login', [])
+        login_failed = sum(1 for _, status in login if not 200 <= status < 400)
+        self.stdout.write(f'\nLogin phase: {len(login)} requests in {login_elapsed:.1f}s, {login_failed} failed')
+
+        header = f'{"endpoint":<12}{"requests":>10}{"req/s":>9}' + ''.join(
+            f'{f"p{p} ms":>10}' for p in PERCENTILES
+        ) + f'{"errors":>9}{"429s":>7}'
+        self.stdout.write(f'Mixed traffic: {elapsed:.1f}s\n{header}')
+
+        total = errors = 0
+        for endpoint in sorted(self.samples):
+            samples = self.samples[endpoint]
+            latencies = sorted(latency for latency, _ in samples)
+            failed = sum(1 for _, status in samples if status == 0 or (status >= 400 and status != 429))
+            throttled = sum(1 for _, status in samples if status == 429)
+            total += len(samples)
+            errors += failed
+            self.stdout.write(
+                f'{endpoint:<12}{len(samples):>10}{len(samples) / elapsed:>9.1f}'
+                + ''.join(f'{_percentile(latencies, p) * 1000:>10.0f}' for p in PERCENTILES)
+                + f'{failed / len(samples):>9.1%}{throttled:>7}'
+            )
+
+        error_rate = errors / total * 100 if total else 0
+        self.stdout.write(f'{"total":<12}{total:>10}{total / elapsed:>9.1f}')
+        if max_error_rate is not None and error_rate > max_error_rate:
+            raise CommandError(f'Error rate {error_rate:.1f}% exceeds {max_error_rate}%')
+        self.stdout.write(self.style.SUCCESS(f'✅ Load test finished, {error_rate:.1f}% errors'))
@@ -0,0 +1,134 @@
+"""
+Management command to store tabs' records positionally
+Usage: python manage.py pack_records [--tab ID] [--min-share 0.1] [--batch-size 1000] [--pause 0.05] [--vacuum]
+
+For each tab, counts how many records carry each key, appends the keys
+found in at least --min-share of them to the tab's key dictionary
+(Tab.row_keys) and rewrites the records in id-ordered batches, each in
+its own short transaction. Rarer keys stay in each row's overflow map.
+Running it again picks up keys that have become common since. A tab
+with records saved before "" was reserved, holding what looks like a
+packed row there, is skipped with a warning. See portal.positional for
+the storage format.
+"""
+import json
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+from portal import sharding
+from portal.models import Record, Tab
+from portal.positional import add_keys, is_packed, pack, set_tab_keys, unpack
+
+
+class Command(BaseCommand):
+    help = 'Convert records to positional storage with a per-tab key dictionary'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tab', type=int, help='Only convert this tab (default: all tabs)')
+        parser.add_argument('--min-share', type=float, default=0.1,
+                            help='Fraction of a tab\'s records a key must appear in to get a position')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records rewritten per transaction')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches, leaving room for other writers')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM afterwards so SQLite returns the freed pages to the OS')
+
+    def handle(self, *args, **options):
+        tabs = Tab.objects.order_by('id')
+        if options['tab']:
+            tabs = tabs.filter(id=options['tab'])
+            if not tabs.exists():
+                raise CommandError(f'Tab {options["tab"]} does not exist')
+
+        total_before = total_after = 0
+        for tab in tabs:
+            with sharding.use(tab.department_id):
+                keys = self._common_keys(tab, options['min_share'])
+                if keys is None:
+                    self.stdout.write(self.style.WARNING(
+                        f'{tab}: skipped, a record holds a list starting with a number under ""'
+                    ))
+                    continue
+                if not keys and tab.row_keys is None:
+                    continue
+                if tab.row_keys is None:
+                    Tab.objects.filter(id=tab.id).update(row_keys=[])
+                    tab.row_keys = []
+                    set_tab_keys(tab.id, [])
+                add_keys(tab, keys)
+
+                before, after, rewritten = self._rewrite(tab, options)
+                total_before += before
+                total_after += after
+                self.stdout.write(
+                    f'{tab}: {len(tab.row_keys)} keys, rewrote {rewritten} records, '
+                    f'{before / 2**20:.1f} MB -> {after / 2**20:.1f} MB'
+                )
+
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('⏳ Vacuuming database...'))
+            for alias in sharding.databases():
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('VACUUM')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Record data {total_before / 2**20:.1f} MB -> {total_after / 2**20:.1f} MB'
+        ))
+
+    @staticmethod
+    def _common_keys(tab, min_share):
+        """
+        Keys in at least min_share of the tab's records, in first-seen order.
+
+        None if the tab is not positional yet and a record's data looks like
+        a packed row: once the tab had a dictionary it would be read as one.
+        """
+        counts = Counter()
+        total = 0
+        records = Record.objects.filter(tab=tab).order_by('id').values_list('data', flat=True)
+        for data in records.iterator(chunk_size=2000):
+            if tab.row_keys is None and is_packed(data):
+                return None
+            total += 1
+            if isinstance(data, dict):
+                counts.update(data.keys())
+        return [key for key, count in counts.items() if total and count / total >= min_share]
+
+    @staticmethod
+    def _rewrite(tab, options):
+        """Pack one tab's records; returns (bytes before, bytes after, rows rewritten)."""
+        before = after = rewritten = 0
+        last_id = 0
+        while True:
+            # Raw JSON text, so the stored size and form can be compared
+            rows = list(
+                Record.objects.filter(tab=tab, id__gt=last_id)
+                .order_by('id')
+                .values_list('id', Cast('data', TextField()))[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            changed = []
+            for record_id, raw in rows:
+                # Compressed values (portal.compression) are moved as they are
+                data = pack(unpack(json.loads(raw)), tab.id, tab.row_keys)
+                stored = json.dumps(data)
+                before += len(raw)
+                after += len(stored)
+                if stored != raw:
+                    changed.append(Record(id=record_id, data=data))
+
+            if changed:
+                # bulk_update stores values as given and leaves updated_at alone
+                with sharding.atomic():
+                    Record.objects.bulk_update(changed, ['data'])
+                rewritten += len(changed)
+                time.sleep(options['pause'])
+        return before, after, rewritten
@@ -4,6 +4,7 @@ Usage: python manage.py populate_test_data
 """
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from portal import sharding
 from portal.models import Department, Tab, Record
 import json
 
@@ -98,73 +99,78 @@ class Command(BaseCommand):
             # Create test records
             self.stdout.write('Creating test records...')
             
-            # Sample records for Paid Interns
-            record1 = Record.objects.create(
-                tab=paid_interns,
-                data={
-                    'Name': 'Alice Johnson',
-                    'Email': 'alice@example.com',
-                    'Position': 'Software Engineer Intern',
-                    'Start Date': '2024-06-01',
-                    'End Date': '2024-08-31',
-                    'Status': 'Active'
-                },
-                created_by=director
-            )
+            with sharding.use(dept.id):
+                # Sample records for Paid Interns
+                record1 = Record.objects.create(
+                    tab=paid_interns,
+                    data={
+                        'Name': 'Alice Johnson',
+                        'Email': 'alice@example.com',
+                        'Position': 'Software Engineer Intern',
+                        'Start Date': '2024-06-01',
+                        'End Date': '2024-08-31',
+                        'Status': 'Active'
+                    },
+                    created_by=director
+                )
             
-            record2 = Record.objects.create(
-                tab=paid_interns,
-                data={
-                    'Name': 'Charlie Brown',
-                    'Email': 'charlie@example.com',
-                    'Position': 'Data Science Intern',
-                    'Start Date': '2024-07-01',
-                    'End Date': '2024-09-30',
-                    'Status': 'Active'
-                },
-                created_by=scientist
-            )
+                record2 = Record.objects.create(
+                    tab=paid_interns,
+                    data={
+                        'Name': 'Charlie Brown',
+                        'Email': 'charlie@example.com',
+                        'Position': 'Data Science Intern',
+                        'Start Date': '2024-07-01',
+                        'End Date': '2024-09-30',
+                        'Status': 'Active'
+                    },
+                    created_by=scientist
+                )
             
-            # Sample records for Unpaid Interns
-            record3 = Record.objects.create(
-                tab=unpaid_interns,
-                data={
-                    'Name': 'Diana Martinez',
-                    'Email': 'diana@example.com',
-                    'Position': 'Research Assistant',
-                    'Start Date': '2024-05-15',
-                    'End Date': '2024-10-15',
-                    'Status': 'Active'
-                },
-                created_by=scientist
-            )
+                # Sample records for Unpaid Interns
+                record3 = Record.objects.create(
+                    tab=unpaid_interns,
+                    data={
+                        'Name': 'Diana Martinez',
+                        'Email': 'diana@example.com',
+                        'Position': 'Research Assistant',
+                        'Start Date': '2024-05-15',
+                        'End Date': '2024-10-15',
+                        'Status': 'Active'
+                    },
+                    created_by=scientist
+                )
             
-            # Sample records for Publishing
-            record4 = Record.objects.create(
-                tab=publishing,
-                data={
-                    'Title': 'Machine Learning in Healthcare',
-                    'Authors': 'Jane Scientist, John Director',
-                    'Journal': 'Nature Research',
-                    'Publication Date': '2024-01-15',
-                    'DOI': '10.1234/example.doi',
-                    'Status': 'Published'
-                },
-                created_by=scientist
-            )
+                # Sample records for Publishing
+                record4 = Record.objects.create(
+                    tab=publishing,
+                    data={
+                        'Title': 'Machine Learning in Healthcare',
+                        'Authors': 'Jane Scientist, John Director',
+                        'Journal': 'Nature Research',
+                        'Publication Date': '2024-01-15',
+                        'DOI': '10.1234/example.doi',
+                        'Status': 'Published'
+                    },
+                    created_by=scientist
+                )
             
-            record5 = Record.objects.create(
-                tab=publishing,
-                data={
-                    'Title': 'Advances in Data Processing',
-                    'Authors': 'Jane Scientist',
-                    'Journal': 'IEEE Transactions',
-                    'Publication Date': '2024-03-20',
-                    'DOI': '10.5678/example.doi',
-                    'Status': 'Published'
-                },
-                created_by=scientist
-            )
+                record5 = Record.objects.create(
+                    tab=publishing,
+                    data={
+                        'Title': 'Advances in Data Processing',
+                        'Authors': 'Jane Scientist',
+                        'Journal': 'IEEE Transactions',
+                        'Publication Date': '2024-03-20',
+                        'DOI': '10.5678/example.doi',
+                        'Status': 'Published'
+                    },
+                    created_by=scientist
+                )
+            
+            # Record.objects.create() leaves the tab/department counters alone
+            for tab, count in ((paid_interns, 2), (unpaid_interns, 1), (publishing, 2)):
+                tab.record_changed(count)
             
             self.stdout.write(self.style.SUCCESS('✅ Records created'))
 
@@ -0,0 +1,35 @@
+"""
+Management command to finish deleting tabs
+Usage: python manage.py purge_deleted_tabs [--batch-size 2000]
+
+delete_tab hides a tab at once and purges its records on a background
+thread. If the server stops before that thread finishes, the tab stays
+hidden with some of its records left; this command deletes what is left.
+"""
+from django.core.management.base import BaseCommand
+
+from portal.models import Tab
+from portal.utils import PURGE_BATCH_SIZE, purge_tab
+
+
+class Command(BaseCommand):
+    help = 'Delete tabs (and their records) left marked as deleting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE,
+                            help='Records removed per DELETE statement')
+
+    def handle(self, *args, **options):
+        tab_ids = list(Tab.all_objects.filter(deleting=True).order_by('id').values_list('id', flat=True))
+        if not tab_ids:
+            self.stdout.write(self.style.SUCCESS('✅ No tabs waiting to be deleted'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'⏳ Purging {len(tab_ids)} deleted tabs...'))
+        total = 0
+        for tab_id in tab_ids:
+            deleted = purge_tab(tab_id, batch_size=options['batch_size'])
+            total += deleted
+            self.stdout.write(f'Tab {tab_id}: deleted {deleted} records')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Purged {len(tab_ids)} tabs and {total} records'))
@@ -0,0 +1,63 @@
+"""
+Management command to rebuild the denormalized record counters
+Usage: python manage.py recount_records
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+from portal import sharding
+from portal.models import Department, Tab, Record
+
+
+class Command(BaseCommand):
+    help = 'Recount Tab/Department record_count and last_modified from the records table'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('⏳ Recounting records...'))
+
+        with transaction.atomic():
+            # One GROUP BY over records instead of a COUNT(*) per tab (one
+            # per department's database with PORTAL_SHARDING)
+            stats = {}
+            for department_id in sharding.department_ids():
+                with sharding.use(department_id):
+                    stats.update(
+                        (row['tab_id'], (row['count'], row['latest']))
+                        for row in Record.objects.order_by().values('tab_id').annotate(
+                            count=Count('id'), latest=Max('updated_at')
+                        )
+                    )
+
+            tabs = list(Tab.objects.select_for_update().only(
+                'id', 'department_id', 'record_count', 'last_modified'
+            ))
+            changed_tabs = []
+            department_totals = {}
+            for tab in tabs:
+                count, latest = stats.get(tab.id, (0, None))
+                # Deletes leave no updated_at behind, so keep a newer stored stamp
+                if tab.last_modified and (latest is None or tab.last_modified > latest):
+                    latest = tab.last_modified
+                if (tab.record_count, tab.last_modified) != (count, latest):
+                    tab.record_count, tab.last_modified = count, latest
+                    changed_tabs.append(tab)
+                total, newest = department_totals.get(tab.department_id, (0, None))
+                if latest and (newest is None or latest > newest):
+                    newest = latest
+                department_totals[tab.department_id] = (total + count, newest)
+            Tab.objects.bulk_update(changed_tabs, ['record_count', 'last_modified'])
+
+            changed_departments = []
+            for department in Department.objects.select_for_update().only(
+                'id', 'record_count', 'last_modified'
+            ):
+                count, latest = department_totals.get(department.id, (0, None))
+                if (department.record_count, department.last_modified) != (count, latest):
+                    department.record_count, department.last_modified = count, latest
+                    changed_departments.append(department)
+            Department.objects.bulk_update(changed_departments, ['record_count', 'last_modified'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Recounted {len(tabs)} tabs: fixed {len(changed_tabs)} tabs '
+            f'and {len(changed_departments)} departments'
+        ))
@@ -0,0 +1,126 @@
+"""
+Management command to move records into per-department databases
+Usage: python manage.py split_departments [--batch-size 5000] [--vacuum]
+
+Run with PORTAL_SHARDING enabled, after migrate, with the site stopped.
+Migrates every department's database (creating missing ones), then for
+each department copies its tabs' records and their history out of the
+catalog into the department's database and deletes them from the
+catalog. Rows are copied --batch-size at a time as stored (packed or
+compressed data stays so). Record ids move into the department's range:
+the department's first id plus the old id, and history entries follow
+their records. The live feed (RecordEvent) is not copied; clients pick
+up from the department's own events.
+
+Each department is copied in one transaction on both databases, and a
+department with no rows left in the catalog is skipped, so an
+interrupted run can simply be started again. Running it again after an
+upgrade only migrates the department databases. --vacuum rewrites the
+catalog afterwards to return the freed space at once; otherwise
+db_maintenance returns it over its next runs.
+"""
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from portal import sharding
+from portal.models import Department, Record, RecordEvent, RecordHistory, Tab
+
+
+class Command(BaseCommand):
+    help = "Move each department's records from the catalog into its own database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows copied per statement')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM the catalog afterwards')
+
+    def handle(self, *args, **options):
+        if not sharding.is_enabled():
+            raise CommandError("PORTAL_SHARDING['enabled'] is off; enable it before splitting")
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+
+        self.stdout.write(self.style.WARNING('⏳ Migrating department databases...'))
+        aliases = set(sharding.databases())
+        for department_id in sharding.department_ids():
+            alias = sharding.database(department_id)
+            if alias in aliases:
+                # Existing files may predate the latest migrations
+                call_command('migrate', database=alias, interactive=False, verbosity=0)
+
+        records_total = 0
+        for department in Department.objects.order_by('id'):
+            tab_ids = list(Tab.all_objects.filter(department=department).values_list('id', flat=True))
+            if not any(
+                model.objects.using(DEFAULT_DB_ALIAS).filter(tab_id__in=tab_ids).exists()
+                for model in (Record, RecordHistory, RecordEvent)
+            ):
+                continue
+            self.stdout.write(self.style.WARNING(f'⏳ Splitting {department.name}...'))
+            records, entries = self._split(department, tab_ids)
+            self.stdout.write(f'{department.name}: {records} records, {entries} history entries')
+            records_total += records
+
+        if options['vacuum']:
+            self.stdout.write(self.style.WARNING('⏳ Vacuuming the catalog...'))
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Moved {records_total} records in {time.monotonic() - started:.1f}s'
+        ))
+
+    def _split(self, department, tab_ids):
+        """Copy one department's rows and delete them from the catalog; returns (records, history entries)."""
+        with sharding.use(department.id) as alias, transaction.atomic(), transaction.atomic(using=alias):
+            shard = connections[alias]
+            offset = self._first_id(shard, department.id)
+            records = entries = 0
+            for tab_id in tab_ids:
+                records += self._copy(shard, Record, tab_id, 'id', offset)
+                entries += self._copy(shard, RecordHistory, tab_id, 'record_id', offset)
+
+            copied = Record.objects.using(alias).filter(tab_id__in=tab_ids, id__gt=offset).count()
+            if copied != records:
+                raise CommandError(
+                    f'{department.name}: copied {records} records but found {copied}; nothing was moved'
+                )
+
+            with connection.cursor() as cursor:
+                for model in (Record, RecordHistory, RecordEvent):
+                    table = connection.ops.quote_name(model._meta.db_table)
+                    for tab_id in tab_ids:
+                        cursor.execute(f'DELETE FROM {table} WHERE tab_id = %s', [tab_id])
+        return records, entries
+
+    @staticmethod
+    def _first_id(shard, department_id):
+        """Number to add to the catalog's record ids: past any record the department already has."""
+        with shard.cursor() as cursor:
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [Record._meta.db_table])
+            row = cursor.fetchone()
+        return max(row[0] if row else 0, department_id * sharding.ID_SPAN)
+
+    def _copy(self, shard, model, tab_id, shifted, offset):
+        """Copy a tab's rows of model as stored, adding offset to the shifted column; returns the row count."""
+        columns = [field.column for field in model._meta.concrete_fields]
+        position = columns.index(shifted)
+        column_list = ', '.join(connection.ops.quote_name(column) for column in columns)
+        table = connection.ops.quote_name(model._meta.db_table)
+        insert = (
+            f'INSERT INTO {table} ({column_list}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})'
+        )
+
+        copied = 0
+        with connection.cursor() as source, shard.cursor() as target:
+            source.execute(f'SELECT {column_list} FROM {table} WHERE tab_id = %s ORDER BY id', [tab_id])
+            while rows := source.fetchmany(self.batch_size):
+                rows = [row[:position] + (row[position] + offset,) + row[position + 1:] for row in rows]
+                target.executemany(insert, rows)
+                copied += len(rows)
+        return copied
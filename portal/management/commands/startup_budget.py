@@ -0,0 +1,85 @@
+"""
+Management command to check cold-start time against a budget
+Usage: python manage.py startup_budget [--budget-ms 1500] [--runs 3]
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Wall-clock budget for a cold `manage.py check`, in milliseconds
+DEFAULT_BUDGET_MS = 1500
+
+# Modules that must only load on the import code path (see portal.utils)
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'xlrd')
+
+# "import time:       562 |     166221 | django.core.management"
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Measure cold start (python -X importtime manage.py check) and fail over budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget-ms', type=int, default=DEFAULT_BUDGET_MS,
+            help=f'Maximum wall time for a cold start (default: {DEFAULT_BUDGET_MS})',
+        )
+        parser.add_argument(
+            '--runs', type=int, default=3,
+            help='Cold starts to measure; the fastest one is compared to the budget',
+        )
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Number of slowest top-level imports to report',
+        )
+
+    def handle(self, *args, **options):
+        runs = []
+        for _ in range(max(options['runs'], 1)):
+            runs.append(self._cold_start())
+        elapsed_ms, imports = min(runs, key=lambda run: run[0])
+
+        # Top-level entries carry the cumulative time of everything below them
+        top_level = [(name, cumulative) for name, cumulative, depth in imports if depth == 0]
+        import_ms = sum(cumulative for _, cumulative in top_level) / 1000
+        loaded = {name for name, _, _ in imports}
+        heavy = sorted(name for name in loaded if name in HEAVY_MODULES)
+
+        self.stdout.write(f'Cold start (best of {len(runs)}): {elapsed_ms:.0f} ms')
+        self.stdout.write(f'Module imports: {import_ms:.0f} ms across {len(loaded)} modules')
+        self.stdout.write('Slowest top-level imports:')
+        for name, cumulative in sorted(top_level, key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+        failures = []
+        if elapsed_ms > options['budget_ms']:
+            failures.append(f'cold start {elapsed_ms:.0f} ms exceeds budget of {options["budget_ms"]} ms')
+        if heavy:
+            failures.append(f'heavy modules imported at startup: {", ".join(heavy)}')
+        if failures:
+            raise CommandError('; '.join(failures))
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Within budget ({options["budget_ms"]} ms)'))
+
+    def _cold_start(self):
+        """Run `manage.py check` in a fresh interpreter; return (ms, imports)."""
+        command = [sys.executable, '-X', 'importtime', str(settings.BASE_DIR / 'manage.py'), 'check']
+        started = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True, env=os.environ.copy())
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if result.returncode != 0:
+            raise CommandError(f'manage.py check failed:\n{result.stdout}{result.stderr}')
+
+        imports = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                _, cumulative, indent, name = match.groups()
+                imports.append((name, int(cumulative), len(indent) // 2))
+        return elapsed_ms, imports
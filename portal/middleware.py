@@ -0,0 +1,176 @@
+"""
+Middleware for the portal application.
+"""
+import mimetypes
+import os
+import posixpath
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import sharding
+from .models import Department, UploadSession
+
+# One year: content-hashed names never change content
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Plain names (e.g. style.css) can change on the next deploy
+MUTABLE_CACHE_CONTROL = 'public, max-age=300'
+
+
+class StaticFilesMiddleware(MiddlewareMixin):
+    """
+    Serve collected static files straight from STATIC_ROOT.
+
+    Lets the offline deployments run without a separate web server in front:
+    - Picks the precompressed .br or .gz variant written by collectstatic
+      (portal.storage) according to the client's Accept-Encoding
+    - Sends immutable far-future caching for content-hashed file names
+    - Answers If-Modified-Since revalidation with 304
+
+    Requests for files that are not in STATIC_ROOT fall through untouched,
+    so runserver's DEBUG static handling keeps working before collectstatic.
+
+    Only takes effect with DEBUG off: with DEBUG on (the shipped run.bat /
+    run.ps1 setup), {% static %} emits plain names and runserver serves
+    /static/ itself before any middleware runs.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.static_prefix = settings.STATIC_URL
+        if not self.static_prefix.startswith('/'):
+            self.static_prefix = '/' + self.static_prefix
+        self.static_root = str(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        self.hashed_names = self._load_hashed_names()
+
+    @staticmethod
+    def _load_hashed_names():
+        """Set of hashed file names from the collectstatic manifest."""
+        return set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def process_request(self, request):
+        if not self.static_root or request.method not in ('GET', 'HEAD'):
+            return None
+        if not request.path.startswith(self.static_prefix):
+            return None
+
+        name = posixpath.normpath(unquote(request.path[len(self.static_prefix):])).lstrip('/')
+        try:
+            path = safe_join(self.static_root, name)
+        except ValueError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            response = HttpResponseNotModified()
+            response['Cache-Control'] = self._cache_control(name)
+            return response
+
+        serve_path, encoding = self._pick_variant(request, path)
+        content_type, _ = mimetypes.guess_type(path)
+        response = FileResponse(
+            open(serve_path, 'rb'),
+            content_type=content_type or 'application/octet-stream',
+        )
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Vary'] = 'Accept-Encoding'
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = self._cache_control(name)
+        return response
+
+    def _cache_control(self, name):
+        if name in self.hashed_names:
+            return IMMUTABLE_CACHE_CONTROL
+        return MUTABLE_CACHE_CONTROL
+
+    @staticmethod
+    def _pick_variant(request, path):
+        """
+        Return (file to send, Content-Encoding) for the request.
+
+        The variant the client weights highest wins, br before gzip on a
+        tie; encodings it gives q=0, or does not list and has no * for,
+        are never sent.
+        """
+        accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        best, best_q = (path, None), 0
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            q = accepted.get(encoding, accepted.get('*', 0))
+            if q > best_q and os.path.isfile(path + suffix):
+                best, best_q = (path + suffix, encoding), q
+        return best
+
+
+def _accepted_encodings(header):
+    """Map each coding in an Accept-Encoding header to its q-value (RFC 9110, 12.5.3)."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+class DepartmentDatabaseMiddleware(MiddlewareMixin):
+    """
+    Make the department a request is about current for portal.sharding.
+
+    The department comes from the view's URL arguments: department_id
+    itself, tab_id through the tab, record_id from the id (see
+    sharding.department_of_record) and upload_id through the upload's tab.
+    Requests about no existing department run with none, so record reads
+    find nothing and record writes fail loudly.
+
+    Only installed while PORTAL_SHARDING is enabled.
+    """
+
+    def __init__(self, get_response):
+        if not sharding.is_enabled():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        # Department ids known to exist
+        self.departments = set()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Set on every request: worker threads serve one request after another
+        sharding.activate(self._department(view_kwargs))
+
+    def _department(self, kwargs):
+        if 'tab_id' in kwargs:
+            return sharding.department_of_tab(kwargs['tab_id'])
+        if 'upload_id' in kwargs:
+            return (
+                UploadSession.objects.filter(id=kwargs['upload_id'])
+                .values_list('tab__department_id', flat=True).first()
+            )
+        if 'department_id' in kwargs:
+            department_id = kwargs['department_id']
+        elif 'record_id' in kwargs:
+            department_id = sharding.department_of_record(kwargs['record_id'])
+        else:
+            return None
+        if department_id not in self.departments:
+            if not Department.objects.filter(id=department_id).exists():
+                return None
+            self.departments.add(department_id)
+        return department_id
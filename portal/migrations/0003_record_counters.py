@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:27
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def populate_counters(apps, schema_editor):
+    Tab = apps.get_model("portal", "Tab")
+    Department = apps.get_model("portal", "Department")
+    Record = apps.get_model("portal", "Record")
+
+    stats = Record.objects.values("tab_id").annotate(
+        count=Count("id"), latest=Max("updated_at")
+    )
+    for row in stats.order_by():
+        Tab.objects.filter(id=row["tab_id"]).update(
+            record_count=row["count"], last_modified=row["latest"]
+        )
+
+    rollups = Tab.objects.values("department_id").annotate(
+        count=Sum("record_count"), latest=Max("last_modified")
+    )
+    for row in rollups.order_by():
+        Department.objects.filter(id=row["department_id"]).update(
+            record_count=row["count"] or 0, last_modified=row["latest"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0002_recordevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="department",
+            name="last_modified",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="department",
+            name="record_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tab",
+            name="last_modified",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="tab",
+            name="record_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0003_record_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThrottleBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=150, unique=True)),
+                ("tokens", models.FloatField()),
+                ("updated", models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ThrottleLease",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=150)),
+                ("expires", models.FloatField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["scope", "id"], name="portal_thro_scope_99d7b4_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0004_throttle"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="email",
+            field=models.EmailField(
+                blank=True, db_index=True, max_length=254, verbose_name="email address"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="record",
+            index=models.Index(
+                fields=["tab", "-created_at", "id"],
+                name="portal_reco_tab_id_2f39b9_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="record",
+            index=models.Index(
+                fields=["tab", "updated_at"], name="portal_reco_tab_id_df877c_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import portal.compression
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0005_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="record",
+            name="data",
+            field=portal.compression.CompressedJSONField(),
+        ),
+        migrations.CreateModel(
+            name="CompressionDictionary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "tab",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="compression_dictionaries",
+                        to="portal.tab",
+                    ),
+                ),
+            ],
+        ),
+    ]
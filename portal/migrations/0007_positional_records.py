@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 17:55
+
+from django.db import migrations, models
+import portal.positional
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0006_record_compression"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tab",
+            name="row_keys",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name="record",
+            name="data",
+            field=portal.positional.RecordDataField(),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0007_positional_records"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tab",
+            name="deleting",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
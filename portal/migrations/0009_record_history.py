@@ -0,0 +1,78 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import portal.compression
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0008_tab_deleting"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecordHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("record_id", models.BigIntegerField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("update", "Update"),
+                            ("snapshot", "Snapshot"),
+                            ("delete", "Delete"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("previous", portal.compression.CompressedJSONField(default=dict)),
+                ("added", models.JSONField(default=list)),
+                ("depth", models.PositiveSmallIntegerField(default=0)),
+                ("record_created_at", models.DateTimeField(blank=True, null=True)),
+                ("changed_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "changed_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "tab",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="history",
+                        to="portal.tab",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["record_id", "id"],
+                        name="portal_reco_record__beba11_idx",
+                    ),
+                    models.Index(
+                        fields=["tab", "changed_at"],
+                        name="portal_reco_tab_id_0c2e2e_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:02
+
+from django.db import migrations
+
+
+def set_auto_vacuum(mode):
+    """
+    Switch an SQLite database's auto_vacuum mode.
+
+    The mode of an existing database only changes with a full VACUUM,
+    which rewrites the file once; afterwards db_maintenance can return
+    free pages in small incremental_vacuum steps.
+    """
+
+    def apply(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != "sqlite":
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA auto_vacuum = {mode}")
+            cursor.execute("VACUUM")
+
+    return apply
+
+
+class Migration(migrations.Migration):
+    # VACUUM cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("portal", "0010_upload_session"),
+    ]
+
+    operations = [
+        migrations.RunPython(set_auto_vacuum("INCREMENTAL"), set_auto_vacuum("NONE")),
+    ]
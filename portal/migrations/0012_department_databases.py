@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import portal.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0011_incremental_auto_vacuum"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="record",
+            name="created_by",
+            field=portal.models.CatalogForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="created_records",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="record",
+            name="tab",
+            field=portal.models.CatalogForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="records",
+                to="portal.tab",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="record",
+            name="updated_by",
+            field=portal.models.CatalogForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="updated_records",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recordevent",
+            name="tab",
+            field=portal.models.CatalogForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="events",
+                to="portal.tab",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recordhistory",
+            name="changed_by",
+            field=portal.models.CatalogForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="recordhistory",
+            name="tab",
+            field=portal.models.CatalogForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="history",
+                to="portal.tab",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 20:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("portal", "0012_department_databases"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="ThrottleBucket",
+        ),
+        migrations.DeleteModel(
+            name="ThrottleLease",
+        ),
+    ]
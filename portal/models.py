@@ -1,10 +1,19 @@
 """
 Portal application models for role-based departmental data management.
 """
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 
+from .compression import CompressedJSONField
+from .positional import RecordDataField
+
 
 class User(AbstractUser):
     """Extended user model with role and department information."""
@@ -15,6 +24,8 @@ class User(AbstractUser):
         ('staff', 'Staff'),
     ]
     
+    # Indexed for the uniqueness check in SignUpForm.clean_email
+    email = models.EmailField('email address', blank=True, db_index=True)
     employee_id = models.CharField(max_length=50, unique=True)
     department = models.CharField(max_length=100)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
@@ -53,6 +64,9 @@ class Department(models.Model):
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_departments')
+    # Rollups of the department's tabs, maintained by Tab.record_changed()
+    record_count = models.PositiveIntegerField(default=0)
+    last_modified = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['name']
@@ -61,6 +75,13 @@ class Department(models.Model):
         return self.name
 
 
+class TabManager(models.Manager):
+    """Default Tab manager: tabs being deleted in the background are hidden."""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleting=False)
+
+
 class Tab(models.Model):
     """
     Tab/Module model representing a data category within a department.
@@ -71,6 +92,20 @@ class Tab(models.Model):
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_tabs')
+    # Denormalized so listings never need COUNT(*)/MAX(updated_at) per tab;
+    # `manage.py recount_records` rebuilds them from scratch
+    record_count = models.PositiveIntegerField(default=0)
+    last_modified = models.DateTimeField(null=True, blank=True)
+    # Ordered key dictionary for positional record storage (portal.positional);
+    # None stores records as plain JSON objects
+    row_keys = models.JSONField(null=True, blank=True, editable=False)
+    # Set by delete_tab; the records are purged in the background
+    # (portal.utils.purge_tab) and the tab row goes last
+    deleting = models.BooleanField(default=False, editable=False)
+    
+    objects = TabManager()
+    # Includes tabs being deleted
+    all_objects = models.Manager()
     
     class Meta:
         unique_together = ('department', 'name')
@@ -78,6 +113,58 @@ class Tab(models.Model):
     
     def __str__(self):
         return f"{self.department.name} - {self.name}"
+    
+    def _counter_updates(self, delta):
+        updates = {'last_modified': timezone.now()}
+        if delta > 0:
+            updates['record_count'] = F('record_count') + delta
+        elif delta < 0:
+            # Clamp so a drifted counter cannot trip the >= 0 constraint
+            updates['record_count'] = Greatest(F('record_count') + delta, 0)
+        return updates
+    
+    def record_changed(self, delta=0):
+        """
+        Update the tab's and its department's record counters after a write.
+        
+        delta is the change in record count (+1 create, -1 delete, +n
+        import, 0 for an edit). Uses F() expressions so concurrent writers
+        never overwrite each other's counts.
+        """
+        updates = self._counter_updates(delta)
+        Tab.objects.filter(id=self.id).update(**updates)
+        Department.objects.filter(id=self.department_id).update(**updates)
+    
+    async def arecord_changed(self, delta=0):
+        """Async version of record_changed() for the async API views."""
+        updates = self._counter_updates(delta)
+        await Tab.objects.filter(id=self.id).aupdate(**updates)
+        await Department.objects.filter(id=self.department_id).aupdate(**updates)
+
+
+class CatalogForeignKey(models.ForeignKey):
+    """
+    Link from a record, history entry or event to a catalog row (a tab or user).
+
+    A database constraint only while PORTAL_SHARDING is off: with it on the
+    catalog row lives in another database (portal.sharding), so the
+    constraint is left out and the link is kept by Django alone. Read when
+    a migration builds the table, so the setting at migrate time decides.
+    """
+    
+    @property
+    def db_constraint(self):
+        return not (getattr(settings, 'PORTAL_SHARDING', None) or {}).get('enabled')
+    
+    @db_constraint.setter
+    def db_constraint(self, value):
+        pass  # Always derived from the setting
+    
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        # Not part of the field's definition, so toggling sharding needs no migration
+        kwargs.pop('db_constraint', None)
+        return name, path, args, kwargs
 
 
 class Record(models.Model):
@@ -86,15 +173,134 @@ class Record(models.Model):
     Uses JSONField to support flexible data structure.
     """
     
-    tab = models.ForeignKey(Tab, on_delete=models.CASCADE, related_name='records')
-    data = models.JSONField()  # Flexible data storage
+    tab = CatalogForeignKey(Tab, on_delete=models.CASCADE, related_name='records')
+    # Flexible data storage; long text values may be stored compressed and
+    # rows of positional tabs by position
+    data = RecordDataField()
     created_at = models.DateTimeField(auto_now_add=True)
-    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_records')
+    created_by = CatalogForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_records')
     updated_at = models.DateTimeField(auto_now=True)
-    updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='updated_records')
+    updated_by = CatalogForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='updated_records')
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A tab's records in default order, with id as the tiebreak
+            models.Index(fields=['tab', '-created_at', 'id']),
+            # Newest change per tab (recount_records) straight from the index
+            models.Index(fields=['tab', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"Record in {self.tab.name} ({self.id})"
+
+
+class CompressionDictionary(models.Model):
+    """
+    Shared zlib dictionary for a tab's compressed Record.data values.
+    
+    Trained by `manage.py compress_records`; compressed values name the
+    dictionary they were written with, so older ones are kept.
+    """
+    
+    tab = models.ForeignKey(Tab, on_delete=models.CASCADE, related_name='compression_dictionaries')
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Dictionary {self.id} for {self.tab_id} ({len(self.data)} bytes)"
+
+
+class RecordEvent(models.Model):
+    """
+    Change-feed entry for a tab, streamed to open grids over Server-Sent Events.
+    
+    The log is bounded per tab (see portal.events) and the auto-increment id
+    doubles as the SSE event id, so clients can resume with Last-Event-ID.
+    """
+    
+    ACTION_CHOICES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+        ('import', 'Import'),
+    ]
+    
+    tab = CatalogForeignKey(Tab, on_delete=models.CASCADE, related_name='events')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    record_id = models.BigIntegerField(null=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['tab', 'id'])]
+    
+    def __str__(self):
+        return f"{self.action} in {self.tab_id} ({self.id})"
+
+
+class RecordHistory(models.Model):
+    """
+    Undo entry for one change to a record's data (see portal.history).
+    
+    record_id is a plain integer so entries outlive their record.
+    """
+    
+    UPDATE = 'update'
+    SNAPSHOT = 'snapshot'
+    DELETE = 'delete'
+    KIND_CHOICES = [
+        (UPDATE, 'Update'),
+        (SNAPSHOT, 'Snapshot'),
+        (DELETE, 'Delete'),
+    ]
+    
+    tab = CatalogForeignKey(Tab, on_delete=models.CASCADE, related_name='history')
+    record_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # update: previous values of the keys the change set or removed;
+    # snapshot/delete: the record's whole data before the change
+    previous = CompressedJSONField(default=dict)
+    # update: keys the change added
+    added = models.JSONField(default=list)
+    # Entries since the record's last snapshot, this one included
+    depth = models.PositiveSmallIntegerField(default=0)
+    # delete: when the record was created
+    record_created_at = models.DateTimeField(null=True, blank=True)
+    changed_by = CatalogForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # A record's entries, oldest first
+            models.Index(fields=['record_id', 'id']),
+            # A tab's entries after a point in time
+            models.Index(fields=['tab', 'changed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} of record {self.record_id} ({self.id})"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload of a file to import into a tab (see portal.uploads).
+    
+    The file grows on disk as chunks arrive; received is how much of it
+    is stored, which is where the next chunk must start.
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tab = models.ForeignKey(Tab, on_delete=models.CASCADE, related_name='uploads')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()  # Bytes the finished file has
+    checksum = models.CharField(max_length=64)  # SHA-256 of the finished file, hex
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
@@ -0,0 +1,244 @@
+"""
+Positional storage of Record.data for tabs with a key dictionary.
+
+A tab whose row_keys is set stores each record's values by position
+instead of repeating every column name in every row:
+
+    {"S.No": 1, "Name": "Alice", "Age": 30, "Note": "x"}   with row_keys ["S.No", "Name", "Age"]
+    -> {"": [<tab id>, 1, "Alice", 30], "Note": "x"}
+
+- "" holds the tab id followed by the values in row_keys order, up to the
+  first key the record does not have
+- keys not in row_keys (ad-hoc columns), and dictionary keys after such a
+  gap, stay as ordinary keys: the overflow map
+
+So a record has a key exactly when its position is in the array or the
+key is in the overflow map, and database lookups such as isnull mean the
+same thing for both layouts. Record data that would look like a packed
+row (a list starting with a number under "") is refused on save, and a
+stored row is only unpacked if the tab it names is positional, so other
+data under "" is never mistaken for a packed row.
+
+RecordDataField packs on save and unpacks on load, so views and ORM code
+see the same dicts as before. Keys are only ever appended to row_keys, so
+rows written with an older (shorter) dictionary, or in the object layout,
+stay valid. The column operations in portal.columns may rename an entry
+in place or replace it with null when its column is dropped; a null
+entry keeps its position but is not a key. So that no row is packed
+against a renamed or dropped position, writes read the dictionary from
+the database, once per transaction (tab_keys), as do reads inside a
+transaction; other reads use a per-process copy, which may show the old
+names for up to KEYS_CACHE_SECONDS. A key lives either in the
+positional array or at the top level of a given row, never both, which
+lets json_filter() match positional tabs by checking both places.
+
+`manage.py pack_records` builds a tab's dictionary and converts its rows.
+"""
+import threading
+import time
+
+from django.db import connections, models, transaction
+from django.db.models.fields.json import KeyTransform
+from django.db.models.functions import Coalesce
+
+from .compression import CompressedJSONField, compress_data, decompress_data, is_enabled, tab_dictionary
+
+# Key holding [tab id, value, value, ...] in a packed row
+ROW_KEY = ''
+
+# Seconds a process trusts its cached dictionary for reads outside a transaction
+KEYS_CACHE_SECONDS = 10
+
+# tab id -> (row_keys list, or None for tabs stored as plain objects; load time)
+_tab_keys = {}
+_cache_lock = threading.Lock()
+
+# Dictionaries read in this thread's current transaction: .block is the
+# innermost atomic block they were read in, .keys maps tab id -> row_keys
+_transaction_keys = threading.local()
+
+
+def _atomic_block():
+    """The innermost atomic block open in this thread (first database with one), or None."""
+    for connection in connections.all(initialized_only=True):
+        if connection.in_atomic_block:
+            return connection.atomic_blocks[-1]
+    return None
+
+
+def _read_keys(tab_id):
+    from .models import Tab
+    return Tab.all_objects.filter(id=tab_id).values_list('row_keys', flat=True).first()
+
+
+def tab_keys(tab_id, positions=0, fresh=False):
+    """
+    A tab's key dictionary (None if it is not positional).
+
+    Inside a transaction it is read from the database once, at first use,
+    and kept until the atomic block ends. Outside one, fresh=True (writes)
+    reads it now; plain reads use the per-process cache, re-read after
+    KEYS_CACHE_SECONDS or when it has fewer than the positions the caller
+    needs, as another process may have appended keys.
+    """
+    if tab_id is None:
+        return None
+    block = _atomic_block()
+    if block is not None:
+        if getattr(_transaction_keys, 'block', None) is not block:
+            _transaction_keys.block, _transaction_keys.keys = block, {}
+        if tab_id not in _transaction_keys.keys:
+            _transaction_keys.keys[tab_id] = _read_keys(tab_id)
+            _cache(tab_id, _transaction_keys.keys[tab_id])
+        return _transaction_keys.keys[tab_id]
+
+    with _cache_lock:
+        keys, loaded_at = _tab_keys.get(tab_id, ((), 0))
+    stale = (
+        fresh
+        or keys == ()
+        or time.monotonic() - loaded_at > KEYS_CACHE_SECONDS
+        or (positions and (keys is None or len(keys) < positions))
+    )
+    if stale:
+        keys = _read_keys(tab_id)
+        _cache(tab_id, keys)
+    return keys
+
+
+def _cache(tab_id, keys):
+    with _cache_lock:
+        _tab_keys[tab_id] = (keys, time.monotonic())
+
+
+def set_tab_keys(tab_id, keys):
+    """Record a dictionary this process has just written, for its cache and current transaction."""
+    _cache(tab_id, keys)
+    block = _atomic_block()
+    if block is not None and getattr(_transaction_keys, 'block', None) is block:
+        _transaction_keys.keys[tab_id] = keys
+    else:
+        # Read in an enclosing block: re-read there once this block ends
+        _transaction_keys.block = None
+
+
+def is_packed(stored):
+    """Whether stored data has the shape of a packed row (see unpack for whether it is one)."""
+    row = stored.get(ROW_KEY) if isinstance(stored, dict) else None
+    return isinstance(row, list) and bool(row) and type(row[0]) is int
+
+
+def pack(data, tab_id, keys=None):
+    """Store data positionally if its tab has a key dictionary."""
+    if keys is None:
+        keys = tab_keys(tab_id, fresh=True)
+    if not keys or not isinstance(data, dict) or is_packed(data):
+        return data
+    if ROW_KEY in data:
+        return data  # Reserved key name: keep the object layout
+
+    values = [tab_id]
+    for key in keys:
+        if key is None:
+            values.append(None)  # Dropped column: position kept, not a key
+            continue
+        if key not in data:
+            break
+        values.append(data[key])
+    packed = set(keys[:len(values) - 1])
+    stored = {ROW_KEY: values}
+    stored.update((key, value) for key, value in data.items() if key not in packed)
+    return stored
+
+
+def unpack(stored):
+    """
+    Rebuild the plain dict for a packed row; anything else is returned as-is.
+
+    Data shaped like a packed row is returned as-is unless the tab it
+    names is positional: such data could only have been saved on a tab
+    without a dictionary, before the shape was refused. Raises ValueError
+    if the dictionary has fewer keys than the row has values.
+    """
+    if not is_packed(stored):
+        return stored
+    tab_id, *values = stored[ROW_KEY]
+    keys = tab_keys(tab_id, len(values))
+    if keys is None:
+        return stored
+    if len(keys) < len(values):
+        raise ValueError(
+            f'Packed row has {len(values)} values but tab {tab_id} has only {len(keys)} keys; '
+            'its key dictionary is missing entries'
+        )
+    data = {key: value for key, value in zip(keys, values) if key is not None}
+    for key, value in stored.items():
+        if key != ROW_KEY:
+            data[key] = value
+    return data
+
+
+def add_keys(tab, keys):
+    """
+    Append keys to a positional tab's dictionary (no-op for other tabs).
+
+    Called before bulk writes with a known column set, such as imports, so
+    new columns are stored positionally rather than in the overflow map.
+    """
+    if tab.row_keys is None:
+        return
+    with transaction.atomic():
+        current = type(tab).objects.select_for_update().values_list('row_keys', flat=True).get(id=tab.id)
+        new_keys = [key for key in dict.fromkeys(keys) if key not in current and key != ROW_KEY]
+        if new_keys:
+            current = current + new_keys
+            type(tab).objects.filter(id=tab.id).update(row_keys=current)
+    tab.row_keys = current
+    set_tab_keys(tab.id, current)
+
+
+def key_path(key, row_keys, field='data'):
+    """
+    Lookup paths for a key: (positional path or None, plain path).
+
+    'data____3' is the fourth element under the "" key.
+    """
+    plain = f'{field}__{key}'
+    if row_keys and key in row_keys:
+        return f'{field}__{ROW_KEY}__{row_keys.index(key) + 1}', plain
+    return None, plain
+
+
+def key_transform(key, row_keys, field='data'):
+    """Expression for one key's value, wherever a row stores it."""
+    plain = KeyTransform(key, field)
+    if row_keys and key in row_keys:
+        position = KeyTransform(str(row_keys.index(key) + 1), KeyTransform(ROW_KEY, field))
+        return Coalesce(position, plain)
+    return plain
+
+
+def stored_form(data, tab_id):
+    """
+    Record data as RecordDataField stores it: compressed, then packed.
+
+    For bulk_update() callers, which bypass the field's pre_save().
+    Raises ValueError for data shaped like a packed row (is_packed).
+    """
+    if is_packed(data):
+        raise ValueError('The "" key is reserved: it cannot hold a list starting with a number')
+    if data is not None and is_enabled():
+        data = compress_data(data, *tab_dictionary(tab_id))
+    return pack(data, tab_id)
+
+
+class RecordDataField(CompressedJSONField):
+    """Record.data: compressed long values (portal.compression) plus positional rows."""
+
+    def from_db_value(self, value, expression, connection):
+        value = models.JSONField.from_db_value(self, value, expression, connection)
+        return decompress_data(unpack(value))
+
+    def pre_save(self, model_instance, add):
+        value = models.JSONField.pre_save(self, model_instance, add)
+        return stored_form(value, getattr(model_instance, 'tab_id', None))
@@ -0,0 +1,289 @@
+"""
+Per-department databases for record data (PORTAL_SHARDING).
+
+With one SQLite file, every department's imports and edits queue for the
+same write lock. With sharding enabled, each department's records, their
+history (RecordHistory) and their live feed (RecordEvent) live in a file
+of their own, PORTAL_SHARDING['directory'] / department_<id>.sqlite3, so
+departments write side by side. Everything else (users, departments,
+tabs and their counters, sessions, uploads) stays in the catalog, the
+'default' database. Tabs stay there because a tab id must
+lead to its department before the department's file can be opened.
+
+DepartmentRouter sends the sharded models to a department's database:
+the one of the tab or record a lookup starts from (Django passes it as
+the instance hint for related managers and saves), else the current
+department, set with use() or, for each request, by
+portal.middleware.DepartmentDatabaseMiddleware from the URL. Reads with
+no current department go to the catalog, which holds no records once
+split; writes raise NoDepartmentSelected.
+
+Record ids stay unique across departments: a department's database
+numbers its rows from department id * ID_SPAN, so a record id alone
+names its department (department_of_record).
+
+A department's database is created and migrated the first time it is
+used. `manage.py split_departments` moves the records of an existing
+single-file database into per-department files, and migrates every
+department's database after an upgrade.
+"""
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+
+from .models import Department, Record, RecordEvent, RecordHistory, Tab
+
+# Rows of a department's database are numbered from department id * ID_SPAN
+ID_SPAN = 10**12
+
+# Models stored per department (portal app, by model_name)
+SHARDED_MODELS = frozenset({'record', 'recordevent', 'recordhistory'})
+
+# Database aliases of department databases: department_<id>
+ALIAS_PREFIX = 'department_'
+
+_current = ContextVar('portal_department', default=None)
+
+# tab id -> department id; a tab never changes department
+_tab_departments = {}
+# Aliases registered in this process whose database exists
+_ready = set()
+_create_lock = threading.Lock()
+
+
+class NoDepartmentSelected(RuntimeError):
+    """A record write with no department to route it to."""
+
+
+def _config():
+    return getattr(settings, 'PORTAL_SHARDING', None) or {}
+
+
+def is_enabled():
+    return bool(_config().get('enabled'))
+
+
+def directory():
+    return Path(_config().get('directory') or Path(settings.BASE_DIR) / 'shards')
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'portal' and model._meta.model_name in SHARDED_MODELS
+
+
+def database_path(department_id):
+    return directory() / f'{ALIAS_PREFIX}{department_id}.sqlite3'
+
+
+def _register(alias, path):
+    """Add a database alias like the catalog's, stored at path."""
+    connections.settings[alias] = {
+        **connections.settings[DEFAULT_DB_ALIAS],
+        'NAME': str(path),
+        'TEST': {**connections.settings[DEFAULT_DB_ALIAS]['TEST'], 'NAME': None},
+    }
+
+
+def _unregister(alias):
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+
+
+def _create(department_id, path):
+    """
+    Create and migrate a department's database.
+
+    Built under a temporary name and linked into place, so a process that
+    loses a race to create it leaves the winner's file alone.
+    """
+    os.makedirs(path.parent, exist_ok=True)
+    alias = f'{ALIAS_PREFIX}{department_id}_new'
+    temporary = path.with_name(f'{path.name}.{uuid.uuid4().hex}.new')
+    _register(alias, temporary)
+    try:
+        with connections[alias].cursor() as cursor:
+            # Takes effect only before the first table is created
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        call_command('migrate', database=alias, interactive=False, verbosity=0)
+        with connections[alias].cursor() as cursor:
+            for model in (Record, RecordEvent, RecordHistory):
+                # Migrations that rebuild a table leave a row behind
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [model._meta.db_table])
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                    [model._meta.db_table, department_id * ID_SPAN],
+                )
+        _unregister(alias)
+        try:
+            os.link(temporary, path)
+        except FileExistsError:
+            pass
+    finally:
+        if alias in connections.settings:
+            _unregister(alias)
+        os.remove(temporary)
+
+
+def database(department_id):
+    """
+    Alias of a department's database, registered and created on first use.
+
+    The catalog's alias when sharding is disabled.
+    """
+    if not is_enabled():
+        return DEFAULT_DB_ALIAS
+    alias = f'{ALIAS_PREFIX}{department_id}'
+    if alias not in _ready:
+        with _create_lock:
+            if alias not in _ready:
+                path = database_path(department_id)
+                if not path.exists():
+                    _create(department_id, path)
+                _register(alias, path)
+                _ready.add(alias)
+    return alias
+
+
+def discard(department_id):
+    """Close and delete a department's database, e.g. one created for an import that then failed."""
+    alias = f'{ALIAS_PREFIX}{department_id}'
+    with _create_lock:
+        if alias in _ready:
+            _unregister(alias)
+            _ready.discard(alias)
+        database_path(department_id).unlink(missing_ok=True)
+
+
+def databases():
+    """Aliases of the catalog and of every department database on disk."""
+    aliases = [DEFAULT_DB_ALIAS]
+    if is_enabled() and directory().is_dir():
+        for path in sorted(directory().glob(f'{ALIAS_PREFIX}*.sqlite3')):
+            department_id = path.stem[len(ALIAS_PREFIX):]
+            if department_id.isdigit():
+                aliases.append(database(int(department_id)))
+    return aliases
+
+
+def department_ids():
+    """
+    Departments to visit one at a time for work over all records.
+
+    Every department's id when sharding; otherwise just None, as the
+    catalog holds all records.
+    """
+    if not is_enabled():
+        return [None]
+    return list(Department.objects.order_by('id').values_list('id', flat=True))
+
+
+def department_of_tab(tab_id):
+    """Department id of a tab (including tabs being deleted), or None."""
+    department_id = _tab_departments.get(tab_id)
+    if department_id is None:
+        department_id = (
+            Tab.all_objects.using(DEFAULT_DB_ALIAS).filter(id=tab_id)
+            .values_list('department_id', flat=True).first()
+        )
+        if department_id is not None:
+            _tab_departments[tab_id] = department_id
+    return department_id
+
+
+def department_of_record(record_id):
+    """Department id a record id belongs to (sharding only)."""
+    return record_id // ID_SPAN
+
+
+def activate(department_id):
+    """Make a department current for the rest of this context (None for none)."""
+    _current.set(department_id)
+
+
+@contextmanager
+def use(department_id):
+    """Make a department current for the block; yields its database alias."""
+    token = _current.set(department_id)
+    try:
+        yield database(department_id) if department_id is not None else DEFAULT_DB_ALIAS
+    finally:
+        _current.reset(token)
+
+
+def current_database():
+    """Alias record writes go to now (raises NoDepartmentSelected when sharding with none)."""
+    return router.db_for_write(Record) or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def atomic(department_id=None):
+    """
+    transaction.atomic() for record writes: over the catalog and, when
+    sharding, a department's database as well.
+
+    With department_id, that department is current for the block;
+    otherwise the current one's database is used. Its transaction commits
+    first. Catalog writes (tab and department counters) are best left to
+    the end of the block, so the catalog's write lock is held only briefly.
+    """
+    token = _current.set(department_id) if department_id is not None else None
+    try:
+        database = current_database()
+        with transaction.atomic():
+            if database == DEFAULT_DB_ALIAS:
+                yield
+            else:
+                with transaction.atomic(using=database):
+                    yield
+    finally:
+        if token is not None:
+            _current.reset(token)
+
+
+class DepartmentRouter:
+    """Route Record, RecordEvent and RecordHistory to their department's database."""
+
+    def _database(self, model, hints):
+        if not is_enabled():
+            return None
+        if not is_sharded(model):
+            # Even when the lookup starts from a record (record.tab), which
+            # Django would otherwise send to the record's database
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if isinstance(instance, Tab):
+            return database(instance.department_id)
+        if instance is not None and is_sharded(type(instance)):
+            if instance._state.db is not None:
+                return instance._state.db
+            department_id = department_of_tab(instance.tab_id)
+            if department_id is not None:
+                return database(department_id)
+        department_id = _current.get()
+        return database(department_id) if department_id is not None else None
+
+    def db_for_read(self, model, **hints):
+        return self._database(model, hints)
+
+    def db_for_write(self, model, **hints):
+        alias = self._database(model, hints)
+        if alias is None and is_sharded(model) and is_enabled():
+            raise NoDepartmentSelected(f'No department selected for a {model._meta.object_name} write')
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Catalog objects and department records refer to each other by id
+        return True if is_enabled() else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not db.startswith(ALIAS_PREFIX):
+            return None
+        return app_label == 'portal' and model_name in SHARDED_MODELS
@@ -0,0 +1,62 @@
+"""
+Static file storage for the portal.
+
+collectstatic writes content-hashed copies of every asset (style.css ->
+style.3f2a9c1b7e4d.css) plus precompressed .gz and, when the optional
+brotli package is installed, .br variants next to them. The hashed names
+never change content, so portal.middleware.StaticFilesMiddleware can serve
+them with far-future immutable cache headers.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # Optional: only .gz variants are written without it
+    brotli = None
+
+# Text formats worth compressing; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.html', '.txt', '.json', '.xml')
+
+# Files smaller than this gain nothing from a compressed variant
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz and .br variants."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        # Compress both the hashed copies and the plain names
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+                continue
+            for compressed_name in self._write_compressed(name):
+                yield name, compressed_name, True
+
+    def _write_compressed(self, name):
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return []
+
+        variants = [(name + '.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((name + '.br', brotli.compress(content)))
+
+        written = []
+        for compressed_name, compressed in variants:
+            # Only keep variants that actually save bytes
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+            written.append(compressed_name)
+        return written
@@ -0,0 +1,103 @@
+"""Column operations (portal.columns) and the key dictionaries they edit."""
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from portal import positional
+from portal.models import Department, Record, Tab
+
+User = get_user_model()
+
+
+def _user(username, role):
+    return User.objects.create_user(
+        username=username, password='pw', email=f'{username}@example.com', employee_id=username, role=role,
+    )
+
+
+def _stored(record_id):
+    """A record's data as stored, before RecordDataField unpacks it."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT data FROM {Record._meta.db_table} WHERE id = %s', [record_id])
+        return json.loads(cursor.fetchone()[0])
+
+
+class StaleKeyDictionaryTests(TransactionTestCase):
+    """Another process renames or drops a column while this one has the old dictionary cached."""
+
+    def setUp(self):
+        self.user = _user('director', 'director')
+        department = Department.objects.create(name='R&D')
+        self.tab = Tab.objects.create(department=department, name='Staff', row_keys=['S.No', 'Name', 'Note'])
+        self.record = Record.objects.create(tab=self.tab, data={'S.No': 1, 'Name': 'Alice', 'Note': 'x'})
+        # This process's cache now holds the dictionary
+        self.assertEqual(positional.tab_keys(self.tab.id), ['S.No', 'Name', 'Note'])
+
+    def _elsewhere(self, row_keys):
+        """Change the dictionary without telling this process, as another worker would."""
+        Tab.objects.filter(id=self.tab.id).update(row_keys=row_keys)
+
+    def test_write_after_drop_keeps_the_value(self):
+        self._elsewhere(['S.No', 'Name', None])
+
+        record = Record.objects.create(tab=self.tab, data={'S.No': 2, 'Name': 'Bob', 'Note': 'y'})
+
+        self.assertEqual(_stored(record.id), {'': [self.tab.id, 2, 'Bob', None], 'Note': 'y'})
+        self.assertEqual(Record.objects.get(id=record.id).data, {'S.No': 2, 'Name': 'Bob', 'Note': 'y'})
+
+    def test_update_after_rename_keeps_the_new_name(self):
+        self._elsewhere(['S.No', 'Full Name', 'Note'])
+        self.client.force_login(self.user)
+
+        response = self.client.patch(
+            f'/api/record/{self.record.id}/', json.dumps({'Age': 30}), content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Record.objects.get(id=self.record.id).data, {'S.No': 1, 'Full Name': 'Alice', 'Note': 'x', 'Age': 30},
+        )
+
+    def test_cell_update_after_rename_keeps_the_new_name(self):
+        self._elsewhere(['S.No', 'Full Name', 'Note'])
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            f'/record/{self.record.id}/update-cell/', json.dumps({'column': 'Note', 'value': 'z'}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Record.objects.get(id=self.record.id).data, {'S.No': 1, 'Full Name': 'Alice', 'Note': 'z'})
+
+
+class ColumnPermissionTests(TestCase):
+    def setUp(self):
+        department = Department.objects.create(name='R&D')
+        self.tab = Tab.objects.create(department=department, name='Staff')
+        Record.objects.create(tab=self.tab, data={'Name': 'Alice', 'Note': 'x'})
+        self.url = f'/api/tab/{self.tab.id}/columns/'
+
+    def _post(self, user, body):
+        self.client.force_login(user)
+        return self.client.post(self.url, json.dumps(body), content_type='application/json')
+
+    def test_drop_needs_delete_permission(self):
+        response = self._post(_user('scientist', 'scientist'), {'operation': 'drop', 'column': 'Note'})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Record.objects.get().data, {'Name': 'Alice', 'Note': 'x'})
+
+    def test_scientist_can_rename(self):
+        response = self._post(_user('scientist', 'scientist'), {'operation': 'rename', 'column': 'Note', 'to': 'Notes'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Record.objects.get().data, {'Name': 'Alice', 'Notes': 'x'})
+
+    def test_director_can_drop(self):
+        response = self._post(_user('director', 'director'), {'operation': 'drop', 'column': 'Note'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Record.objects.get().data, {'Name': 'Alice'})
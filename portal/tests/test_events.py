@@ -0,0 +1,61 @@
+"""Change feed (portal.events): resuming and pruning per tab."""
+from unittest import mock
+
+from django.test import TestCase
+
+from portal import events
+from portal.models import Department, RecordEvent, Tab
+
+
+class EventLogTests(TestCase):
+
+    def setUp(self):
+        events._published.clear()
+        department = Department.objects.create(name='R&D')
+        self.tab = Tab.objects.create(department=department, name='Staff')
+        self.other = Tab.objects.create(department=department, name='Notes')
+
+    def _publish(self, tab, count):
+        return [events.publish(tab.id, 'update').id for _ in range(count)]
+
+    def test_resume_is_one_query(self):
+        first, *rest = self._publish(self.tab, 3)
+
+        with self.assertNumQueries(1):
+            batch, reset = events._read_events(self.tab.id, first)
+
+        self.assertFalse(reset)
+        self.assertEqual([event_id for event_id, _, _ in batch], rest)
+
+    def test_resume_from_the_start(self):
+        ids = self._publish(self.tab, 2)
+
+        batch, reset = events._read_events(self.tab.id, 0)
+
+        self.assertFalse(reset)
+        self.assertEqual([event_id for event_id, _, _ in batch], ids)
+
+    def test_other_tabs_do_not_reset(self):
+        last = self._publish(self.tab, 1)[0]
+        self._publish(self.other, 5)
+
+        self.assertEqual(events._read_events(self.tab.id, last), ([], False))
+
+    def test_reset_once_the_last_event_is_pruned(self):
+        with mock.patch.object(events, 'EVENT_RETENTION', 2):
+            first = self._publish(self.tab, 1)[0]
+            self._publish(self.tab, 2)
+            events._prune(self.tab.id)
+
+        self.assertEqual(events._read_events(self.tab.id, first), ([], True))
+
+    @mock.patch.object(events, 'EVENT_PRUNE_INTERVAL', 3)
+    @mock.patch.object(events, 'EVENT_RETENTION', 2)
+    def test_pruning_is_per_tab(self):
+        for _ in range(4):
+            # Interleaved with another tab, as global event ids would be
+            self._publish(self.tab, 2)
+            self._publish(self.other, 1)
+
+        self.assertEqual(RecordEvent.objects.filter(tab=self.tab).count(), 3)
+        self.assertEqual(RecordEvent.objects.filter(tab=self.other).count(), 2)
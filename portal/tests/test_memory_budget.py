@@ -0,0 +1,170 @@
+"""
+Peak memory of large-tab reads and imports.
+
+Seeds a tab per size, builds a spreadsheet with the same number of rows
+and measures peak Python allocation (tracemalloc) for:
+- fetch: GET /api/tab/<id>/records/, consumed to the end
+- export: the same endpoint as a full gzip-encoded columnar download
+- import: import_excel_data() of the spreadsheet
+Fetch and export run both as under ASGI (async stream) and as under WSGI
+(sync iterator), as the view streams differently for each.
+
+Each peak is compared with a fixed allowance plus a per-row budget, so a
+change that starts holding a whole tab in memory fails here instead of
+in a production worker. The 100k-row run takes minutes, so it is
+skipped unless PORTAL_SLOW_TESTS is set:
+`PORTAL_SLOW_TESTS=1 manage.py test portal`.
+"""
+import gc
+import io
+import os
+import tracemalloc
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, tag
+
+from portal import views
+from portal.models import Department, Record, Tab
+from portal.utils import import_excel_data
+
+User = get_user_model()
+
+# (fixed bytes, bytes per row) of peak allocation allowed per operation.
+# Streaming reads peak at ~5.5 MB (one fetch chunk; ~1.5 MB under WSGI)
+# whatever the tab size; imports hold the pandas DataFrame, ~600 bytes
+# per row at 100k rows.
+MEMORY_BUDGETS = {
+    'fetch': (8 * 1024 * 1024, 16),
+    'export': (8 * 1024 * 1024, 16),
+    'fetch (WSGI)': (8 * 1024 * 1024, 16),
+    'export (WSGI)': (8 * 1024 * 1024, 16),
+    'import': (8 * 1024 * 1024, 1024),
+}
+
+# Rows used to warm up lazy imports and caches before anything is measured
+WARMUP_ROWS = 50
+
+
+def _row(n):
+    """A record shaped like a typical imported sheet row."""
+    return {
+        'S.No': n,
+        'Name': f'Person {n}',
+        'Email': f'person{n}@example.com',
+        'Department': ('Research', 'Operations', 'Management')[n % 3],
+        'Score': n % 100,
+        'Notes': f'Free-text note for row {n} with some extra words to pad it out',
+    }
+
+
+def _workbook(rows):
+    """An .xlsx upload with the given number of data rows."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    columns = [column for column in _row(0) if column != 'S.No']
+    sheet.append(columns)
+    for n in range(1, rows + 1):
+        row = _row(n)
+        sheet.append([row[column] for column in columns])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return SimpleUploadedFile(
+        'memory_budget.xlsx', buffer.getvalue(),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def _peak(operation):
+    """Run operation; returns the peak bytes allocated above the start."""
+    gc.collect()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    operation()
+    return tracemalloc.get_traced_memory()[1] - baseline
+
+
+class MemoryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='director', password='pw', employee_id='E1', role='director',
+        )
+        cls.department = Department.objects.create(name='R&D', created_by=cls.user)
+
+    def setUp(self):
+        # Load pandas/openpyxl and the view code paths before tracing
+        for operation in self._operations(WARMUP_ROWS).values():
+            operation()
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+
+    def _operations(self, rows):
+        """Seed a tab of the given size; returns the operations to measure on it."""
+        tab = Tab.objects.create(department=self.department, name=f'Read {rows}')
+        Record.objects.bulk_create((Record(tab=tab, data=_row(n)) for n in range(1, rows + 1)), batch_size=1000)
+        upload = _workbook(rows)
+        import_tab = Tab.objects.create(department=self.department, name=f'Import {rows}')
+
+        def import_rows():
+            upload.seek(0)
+            import_excel_data(upload, import_tab, self.user)
+
+        return {
+            'fetch': lambda: async_to_sync(self._download)(tab, ''),
+            'export': lambda: async_to_sync(self._download)(tab, '?format=columnar', gzip=True),
+            'fetch (WSGI)': lambda: self._download_wsgi(tab, ''),
+            'export (WSGI)': lambda: self._download_wsgi(tab, '?format=columnar', gzip=True),
+            'import': import_rows,
+        }
+
+    async def _download(self, tab, query, gzip=False):
+        """Call api_fetch_records like a client and discard the body as it streams."""
+        headers = {'Accept-Encoding': 'gzip'} if gzip else {}
+        request = AsyncRequestFactory().get(f'/api/tab/{tab.id}/records/{query}', headers=headers)
+        request.user = self.user
+        response = await views.api_fetch_records(request, tab_id=tab.id)
+        self.assertEqual(response.status_code, 200)
+        try:
+            async for chunk in response.streaming_content:
+                pass
+        finally:
+            await sync_to_async(response.close)()
+
+    def _download_wsgi(self, tab, query, gzip=False):
+        """The same through a WSGI request, which the view answers with a sync iterator."""
+        headers = {'Accept-Encoding': 'gzip'} if gzip else {}
+        request = RequestFactory().get(f'/api/tab/{tab.id}/records/{query}', headers=headers)
+        request.user = self.user
+        # As Django's WSGI handler runs an async view
+        response = async_to_sync(views.api_fetch_records)(request, tab_id=tab.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        try:
+            for chunk in response.streaming_content:
+                pass
+        finally:
+            response.close()
+
+    def _assert_within_budget(self, rows):
+        for name, operation in self._operations(rows).items():
+            with self.subTest(operation=name):
+                fixed, per_row = MEMORY_BUDGETS[name]
+                peak = _peak(operation)
+                self.assertLessEqual(
+                    peak, fixed + per_row * rows, f'{name} at {rows} rows peaked at {peak / 2**20:.1f} MB',
+                )
+
+    def test_10k_rows(self):
+        self._assert_within_budget(10000)
+
+    # The fixed allowance hides a whole 10k-row tab; 100k rows does not
+    @tag('slow')
+    @skipUnless(os.environ.get('PORTAL_SLOW_TESTS'), 'takes minutes; set PORTAL_SLOW_TESTS=1 to run')
+    def test_100k_rows(self):
+        self._assert_within_budget(100000)
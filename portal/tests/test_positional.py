@@ -0,0 +1,76 @@
+"""Positional rows (portal.positional): which stored data is unpacked, and what is refused."""
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from portal import positional
+from portal.models import Department, Record, Tab
+
+
+def _store(record_id, data):
+    """Overwrite a record's stored data, as an older release could have saved it."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {Record._meta.db_table} SET data = %s WHERE id = %s', [json.dumps(data), record_id],
+        )
+
+
+class PositionalRowTests(TestCase):
+
+    def setUp(self):
+        department = Department.objects.create(name='R&D')
+        self.plain = Tab.objects.create(department=department, name='Notes')
+        self.positional = Tab.objects.create(department=department, name='Staff', row_keys=['S.No', 'Name'])
+
+    def test_round_trip(self):
+        record = Record.objects.create(tab=self.positional, data={'S.No': 1, 'Name': 'Alice', 'Note': 'x'})
+
+        self.assertEqual(Record.objects.get(id=record.id).data, {'S.No': 1, 'Name': 'Alice', 'Note': 'x'})
+
+    def test_lookalike_on_a_plain_tab_reads_back_unchanged(self):
+        record = Record.objects.create(tab=self.plain, data={'Name': 'Alice'})
+        data = {'': [self.plain.id, 'x', 'y'], 'Name': 'Alice'}
+        _store(record.id, data)
+
+        self.assertEqual(Record.objects.get(id=record.id).data, data)
+
+    def test_lookalike_naming_a_missing_tab_reads_back_unchanged(self):
+        record = Record.objects.create(tab=self.plain, data={'Name': 'Alice'})
+        data = {'': [999999, 'x']}
+        _store(record.id, data)
+
+        self.assertEqual(Record.objects.get(id=record.id).data, data)
+
+    def test_lookalike_is_refused_on_save(self):
+        for tab in (self.plain, self.positional):
+            with self.subTest(tab=tab.name), self.assertRaisesMessage(ValueError, 'The "" key is reserved'):
+                Record.objects.create(tab=tab, data={'': [self.plain.id, 'x']})
+
+    def test_other_data_under_the_empty_key_is_kept(self):
+        for value in ('x', ['x', 1], [True, 'x'], []):
+            with self.subTest(value=value):
+                record = Record.objects.create(tab=self.positional, data={'': value, 'Name': 'Alice'})
+
+                self.assertEqual(Record.objects.get(id=record.id).data, {'': value, 'Name': 'Alice'})
+
+    def test_row_longer_than_the_dictionary_fails_clearly(self):
+        record = Record.objects.create(tab=self.positional, data={'S.No': 1, 'Name': 'Alice'})
+        _store(record.id, {'': [self.positional.id, 1, 'Alice', 'extra']})
+        positional.set_tab_keys(self.positional.id, ['S.No', 'Name'])
+
+        with self.assertRaisesMessage(ValueError, f'tab {self.positional.id} has only 2 keys'):
+            Record.objects.get(id=record.id)
+
+    def test_pack_records_skips_a_tab_with_a_lookalike(self):
+        record = Record.objects.create(tab=self.plain, data={'Name': 'Alice'})
+        data = {'': [self.plain.id, 'x'], 'Name': 'Alice'}
+        _store(record.id, data)
+
+        call_command('pack_records', tab=self.plain.id, min_share=0.0, stdout=StringIO())
+
+        self.plain.refresh_from_db()
+        self.assertIsNone(self.plain.row_keys)
+        self.assertEqual(Record.objects.get(id=record.id).data, data)
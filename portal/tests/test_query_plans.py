@@ -0,0 +1,105 @@
+"""
+Endpoint queries must be served by an index.
+
+EXPLAIN QUERY PLAN only looks at the shape of a statement, so the ids
+and values below are placeholders and no rows need to exist. Add the
+query shapes of new endpoints to endpoint_queries().
+"""
+import re
+import uuid
+from datetime import datetime, timezone
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Max, Q
+from django.db.models.fields.json import KeyTransform
+from django.test import TestCase
+
+from portal.jsonsql import JSONProject, json_filter
+from portal.models import (
+    Department, Record, RecordEvent, RecordHistory, Tab, UploadSession,
+)
+
+# "SCAN portal_record" / "SCAN TABLE portal_record" (SQLite < 3.36)
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)')
+
+# Plan steps named SCAN that are not reads of a table
+NOT_A_TABLE = ('CONSTANT', 'SUBQUERY')
+
+WHEN = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def endpoint_queries():
+    """(endpoint, query, queryset) for the query shapes each view runs."""
+    User = get_user_model()
+    upload_id = uuid.uuid4()
+    return [
+        ('signup', 'email taken?', User.objects.filter(email='user@example.com').order_by().values('id')[:1]),
+        ('signup', 'employee id taken?', User.objects.filter(employee_id='E001').order_by().values('id')[:1]),
+        ('create_department', 'name taken?', Department.objects.filter(name='Research').order_by().values('id')[:1]),
+        ('create_tab', 'name taken?', Tab.objects.filter(department_id=1, name='Interns').order_by().values('id')[:1]),
+        ('view_tab', 'records', Record.objects.filter(tab_id=1)),
+        ('api_fetch_records', 'records', Record.objects.filter(tab_id=1).only('id', 'data')),
+        ('api_fetch_records', 'fields=', Record.objects.filter(tab_id=1).only('id').annotate(
+            projected=JSONProject('data', ['Name']),
+        )),
+        ('api_fetch_records', 'at= changes', RecordHistory.objects.filter(tab_id=1, changed_at__gt=WHEN)
+            .order_by('record_id', 'id')),
+        ('api_fetch_records', 'at= records', Record.objects.filter(tab_id=1, created_at__lte=WHEN)
+            .order_by('id').values_list('id', 'data')),
+        ('api_fetch_records', 'at= deleted', RecordHistory.objects.filter(
+            tab_id=1, kind=RecordHistory.DELETE, changed_at__gt=WHEN, record_created_at__lte=WHEN,
+        ).order_by('record_id').values_list('record_id', flat=True)),
+        ('api_update_record', 'record', Record.objects.filter(id=1)),
+        ('api_update_record', 'history depth', RecordHistory.objects.filter(record_id__in=[1, 2])
+            .order_by().values('record_id').annotate(latest=Max('id')).values_list('latest', flat=True)),
+        ('api_record_history', 'tab of record', Record.objects.filter(id=1).values_list('tab_id', flat=True)[:1]),
+        ('api_record_history', 'tab of deleted record', RecordHistory.objects.filter(record_id=1)
+            .values_list('tab_id', flat=True)[:1]),
+        ('api_record_history', 'entries', RecordHistory.objects.filter(record_id=1).order_by('-id')[:100]),
+        ('api_record_history', 'at=', RecordHistory.objects.filter(record_id=1, changed_at__gt=WHEN)),
+        ('api_bulk_delete_records', 'where', Record.objects.filter(tab_id=1).filter(
+            json_filter({'Status': 'Archived'}),
+        ).order_by().values_list('id', flat=True)),
+        ('api_tab_columns', 'records with column', Record.objects.filter(tab_id=1).filter(
+            Q(data__has_key='Name') | Q(data__0__1__isnull=False),
+        ).order_by().values_list('id', flat=True)),
+        ('api_tab_columns', 'chunk', Record.objects.filter(id__in=[1, 2]).values_list('id', 'data')),
+        ('api_tab_columns', 'key dictionary', Tab.objects.filter(id=1).values_list('row_keys', flat=True)),
+        ('api_tab_events', 'replay', RecordEvent.objects.filter(tab_id=1, id__gte=7).order_by('id')[:501]),
+        ('api_tab_events', 'prune', RecordEvent.objects.filter(tab_id=1).order_by('-id').values('id')[1000:1001]),
+        ('api_tab_events', 'latest id', RecordEvent.objects.filter(tab_id=1).order_by('-id').values('id')[:1]),
+        ('api_create_upload', 'open sessions', UploadSession.objects.filter(user_id=1, updated_at__gte=WHEN)),
+        ('api_upload', 'session', UploadSession.objects.filter(id=upload_id, user_id=1)),
+        ('api_upload', 'store chunk', UploadSession.objects.filter(id=upload_id, received=0)),
+        ('api_department_query', 'tabs', Tab.objects.filter(department_id=1)),
+        ('api_department_query', 'records', Record.objects.filter(
+            json_filter({'Name__icontains': 'alice'}), tab_id__in=[1, 2],
+        ).only('id', 'tab_id', 'data')),
+        ('import_excel', 'merge keys', Record.objects.filter(tab_id=1).annotate(
+            key_value=KeyTransform('Name', 'data'),
+        ).order_by('id').values_list('key_value', 'id')),
+        ('delete_tab', 'purge chunk', Record.objects.filter(tab_id=1).values_list('id', flat=True)[:500]),
+    ]
+
+
+def query_plan(queryset):
+    """Detail column of EXPLAIN QUERY PLAN for a queryset."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@skipUnless(connection.vendor == 'sqlite', 'reads SQLite query plans')
+class QueryPlanTests(TestCase):
+    def test_endpoint_queries_use_an_index(self):
+        for endpoint, name, queryset in endpoint_queries():
+            with self.subTest(endpoint=endpoint, query=name):
+                plan = query_plan(queryset)
+                scanned = [
+                    match.group(1) for match in map(FULL_SCAN.match, plan)
+                    if match and match.group(1) not in NOT_A_TABLE
+                ]
+                self.assertEqual(scanned, [], 'full table scan:\n    ' + '\n    '.join(plan))
@@ -0,0 +1,85 @@
+"""Per-department databases (portal.sharding) and what they change in the catalog."""
+import gzip
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings
+
+from portal import sharding
+from portal.management.commands.export_department import FORMAT, VERSION
+from portal.models import Department, Record, RecordEvent, RecordHistory, Tab, User
+
+# The department line of an export
+DEPARTMENT = {'type': 'department', 'id': 7, 'name': 'R&D', 'created_at': '2026-01-01T00:00:00+00:00'}
+
+
+def _foreign_keys(database, model):
+    with database.cursor() as cursor:
+        cursor.execute(f'PRAGMA foreign_key_list({model._meta.db_table})')
+        return sorted(row[2] for row in cursor.fetchall())
+
+
+class ForeignKeyConstraintTests(TransactionTestCase):
+
+    def test_catalog_keeps_constraints_without_sharding(self):
+        tab, user = Tab._meta.db_table, User._meta.db_table
+        self.assertEqual(_foreign_keys(connection, Record), sorted([tab, user, user]))
+        self.assertEqual(_foreign_keys(connection, RecordHistory), sorted([tab, user]))
+        self.assertEqual(_foreign_keys(connection, RecordEvent), [tab])
+
+    def test_department_databases_have_none(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        department = Department.objects.create(name='R&D')
+        with override_settings(PORTAL_SHARDING={'enabled': True, 'directory': directory.name}):
+            alias = sharding.database(department.id)
+            try:
+                for model in (Record, RecordHistory, RecordEvent):
+                    with self.subTest(model=model.__name__):
+                        self.assertEqual(_foreign_keys(connections[alias], model), [])
+            finally:
+                sharding.discard(department.id)
+
+
+class ImportDepartmentTests(TransactionTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(PORTAL_SHARDING={'enabled': True, 'directory': directory.name})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _export(self, *items):
+        path = self.directory / 'export.jsonl.gz'
+        with gzip.open(path, 'wt', encoding='utf-8') as file:
+            for item in ({'type': 'header', 'format': FORMAT, 'version': VERSION},) + items:
+                file.write(json.dumps(item) + '\n')
+        return str(path)
+
+    def _department_files(self):
+        return sorted(path.name for path in self.directory.glob(f'{sharding.ALIAS_PREFIX}*'))
+
+    def test_failed_import_leaves_no_database(self):
+        path = self._export(DEPARTMENT)
+
+        with self.assertRaisesMessage(CommandError, 'ends early'):
+            call_command('import_department', path, stdout=StringIO())
+
+        self.assertFalse(Department.objects.exists())
+        self.assertEqual(self._department_files(), [])
+
+    def test_import_keeps_its_database(self):
+        path = self._export(DEPARTMENT, {'type': 'end', 'tabs': 0, 'records': 0})
+
+        call_command('import_department', path, stdout=StringIO())
+
+        department = Department.objects.get()
+        self.addCleanup(sharding.discard, department.id)
+        self.assertEqual(self._department_files(), [f'{sharding.ALIAS_PREFIX}{department.id}.sqlite3'])
@@ -0,0 +1,59 @@
+"""Precompressed static files (portal.middleware.StaticFilesMiddleware)."""
+import tempfile
+from pathlib import Path
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from portal.middleware import StaticFilesMiddleware, _accepted_encodings
+
+
+class AcceptEncodingTests(SimpleTestCase):
+
+    def test_parsing(self):
+        cases = [
+            ('', {}),
+            ('gzip, br', {'gzip': 1.0, 'br': 1.0}),
+            ('GZIP;q=0.5, br ; q=0', {'gzip': 0.5, 'br': 0.0}),
+            ('*;q=0.1, identity', {'*': 0.1, 'identity': 1.0}),
+            ('gzip;q=oops', {'gzip': 0.0}),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(_accepted_encodings(header), expected)
+
+
+class VariantTests(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        for name in ('app.js', 'app.js.gz', 'app.js.br'):
+            Path(root.name, name).write_bytes(name.encode())
+        settings = override_settings(STATIC_ROOT=root.name, STATIC_URL='/static/')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse())
+
+    def _encoding(self, accept_encoding):
+        request = RequestFactory().get('/static/app.js', HTTP_ACCEPT_ENCODING=accept_encoding)
+        response = self.middleware(request)
+        self.addCleanup(response.close)
+        return response.get('Content-Encoding'), b''.join(response.streaming_content)
+
+    def test_variant_choice(self):
+        cases = [
+            ('br, gzip', ('br', b'app.js.br')),
+            ('gzip', ('gzip', b'app.js.gz')),
+            ('br;q=0, gzip', ('gzip', b'app.js.gz')),
+            ('gzip;q=1, br;q=0.5', ('gzip', b'app.js.gz')),
+            ('br;q=0, gzip;q=0', (None, b'app.js')),
+            ('*', ('br', b'app.js.br')),
+            ('*;q=0', (None, b'app.js')),
+            # Substrings of other codings are not the coding
+            ('x-gzip-like, nobr', (None, b'app.js')),
+            ('', (None, b'app.js')),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(self._encoding(header), expected)
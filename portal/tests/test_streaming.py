@@ -0,0 +1,88 @@
+"""Streamed API bodies: sync iterators under WSGI, async ones under ASGI."""
+import gzip
+import json
+from datetime import timedelta
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from portal import throttle
+from portal.models import Department, Record, Tab
+
+User = get_user_model()
+
+
+class StreamingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='director', password='pw', employee_id='E1', role='director')
+        cls.department = Department.objects.create(name='R&D')
+        cls.tab = Tab.objects.create(department=cls.department, name='Staff')
+        cls.packed = Tab.objects.create(department=cls.department, name='Interns', row_keys=['Name'])
+        for tab in (cls.tab, cls.packed):
+            for n in range(3):
+                Record.objects.create(tab=tab, data={'Name': f'Person {n}', 'Age': 20 + n})
+
+    def setUp(self):
+        throttle._buckets.clear()
+        throttle._leases.clear()
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def _urls(self):
+        where = quote(json.dumps({'Age__gte': 21}))
+        later = quote((timezone.now() + timedelta(minutes=1)).isoformat())
+        return [
+            f'/api/tab/{self.tab.id}/records/',
+            f'/api/tab/{self.tab.id}/records/?format=columnar&fields=Name',
+            f'/api/tab/{self.packed.id}/records/?fields=Age',
+            f'/api/tab/{self.tab.id}/records/?at={later}',
+            f'/api/department/{self.department.id}/query/?where={where}',
+            f'/api/department/{self.department.id}/query/?where={where}&fields=Name',
+        ]
+
+    def test_wsgi_gets_a_sync_iterator(self):
+        for url in self._urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.is_async)
+                json.loads(response.getvalue())
+
+    async def test_asgi_gets_the_same_body(self):
+        for url in self._urls():
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertTrue(response.is_async)
+                body = b''.join([chunk async for chunk in response.streaming_content])
+
+                self.assertEqual(json.loads(body), await sync_to_async(self._wsgi_body)(url))
+
+    def _wsgi_body(self, url):
+        return json.loads(self.client.get(url).getvalue())
+
+    def test_gzip(self):
+        response = self.client.get(f'/api/tab/{self.tab.id}/records/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertFalse(response.is_async)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.getvalue()))['data']), 3)
+
+    def test_query_results(self):
+        where = quote(json.dumps({'Age__gte': 21}))
+
+        body = json.loads(self.client.get(
+            f'/api/department/{self.department.id}/query/?where={where}&fields=Name'
+        ).getvalue())
+
+        self.assertEqual(body['count'], 4)
+        self.assertEqual(body['tabs'], {str(self.tab.id): 'Staff', str(self.packed.id): 'Interns'})
+        self.assertEqual(
+            sorted(result['data']['Name'] for result in body['results']),
+            ['Person 1', 'Person 1', 'Person 2', 'Person 2'],
+        )
@@ -0,0 +1,124 @@
+"""Admission control (portal.throttle)."""
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from portal import throttle
+
+LIMITS = {
+    'rate': {'rate_per_minute': 60, 'burst': 2},
+    'slots': {'concurrency': 2, 'user_concurrency': 1},
+}
+
+
+def _request(user_id=1):
+    request = RequestFactory().get('/')
+    request.user = SimpleNamespace(id=user_id)
+    return request
+
+
+@throttle.throttle('rate')
+def rate_view(request):
+    return HttpResponse()
+
+
+@throttle.throttle('slots')
+def slots_view(request):
+    return StreamingHttpResponse(iter([b'a', b'b']))
+
+
+@throttle.throttle('slots')
+async def async_slots_view(request):
+    async def chunks():
+        yield b'a'
+    return StreamingHttpResponse(chunks())
+
+
+@throttle.throttle('slots')
+def slow_view(request):
+    # Stands in for an import that outlasts LEASE_SECONDS
+    request.during_view()
+    return HttpResponse()
+
+
+# SimpleTestCase fails any query: checks must not need the database
+@override_settings(PORTAL_THROTTLE=LIMITS)
+class ThrottleTests(SimpleTestCase):
+
+    def setUp(self):
+        throttle._buckets.clear()
+        throttle._leases.clear()
+
+    def test_rate_limit(self):
+        self.assertEqual(rate_view(_request()).status_code, 200)
+        self.assertEqual(rate_view(_request()).status_code, 200)
+
+        response = rate_view(_request())
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        # Buckets are per user
+        self.assertEqual(rate_view(_request(user_id=2)).status_code, 200)
+
+    def test_lease_held_until_close(self):
+        response = slots_view(_request())
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+        self.assertEqual(slots_view(_request()).status_code, 429)
+        # Other users share only the overall limit
+        other = slots_view(_request(user_id=2))
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(slots_view(_request(user_id=3)).status_code, 429)
+
+        response.close()
+        other.close()
+
+        self.assertEqual(slots_view(_request()).status_code, 200)
+
+    def test_async_view(self):
+        response = async_to_sync(async_slots_view)(_request())
+        self.assertEqual(async_to_sync(async_slots_view)(_request()).status_code, 429)
+
+        response.close()
+
+        self.assertEqual(async_to_sync(async_slots_view)(_request()).status_code, 200)
+
+    def test_unclosed_lease_expires(self):
+        now = 1000.0
+        with mock.patch.object(throttle.time, 'monotonic', lambda: now):
+            slots_view(_request())
+            now += throttle.LEASE_SECONDS - 1
+            self.assertEqual(slots_view(_request()).status_code, 429)
+            now += 1
+            self.assertEqual(slots_view(_request()).status_code, 200)
+
+    def test_streaming_renews_the_lease(self):
+        now = 1000.0
+        with mock.patch.object(throttle.time, 'monotonic', lambda: now):
+            content = slots_view(_request()).streaming_content
+            now += throttle.LEASE_SECONDS - 1
+            next(content)
+            now += throttle.LEASE_SECONDS - 1
+            self.assertEqual(slots_view(_request()).status_code, 429)
+
+    def test_lease_does_not_expire_while_the_view_runs(self):
+        now = 1000.0
+        statuses = []
+
+        def during_view():
+            nonlocal now
+            now += throttle.LEASE_SECONDS * 10
+            statuses.append(slots_view(_request()).status_code)
+
+        request = _request()
+        request.during_view = during_view
+        with mock.patch.object(throttle.time, 'monotonic', lambda: now):
+            slow_view(request)
+            self.assertEqual(statuses, [429])
+            # The countdown starts once the view has returned
+            now += throttle.LEASE_SECONDS - 1
+            self.assertEqual(slots_view(_request()).status_code, 429)
+            now += 1
+            self.assertEqual(slots_view(_request()).status_code, 200)
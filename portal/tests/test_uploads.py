@@ -0,0 +1,83 @@
+"""Starting resumable uploads (portal.uploads): limits per user."""
+import hashlib
+import json
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from portal import throttle
+from portal.models import Department, Tab, UploadSession
+
+User = get_user_model()
+
+CHECKSUM = hashlib.sha256(b'').hexdigest()
+
+
+class CreateUploadTests(TestCase):
+
+    def setUp(self):
+        throttle._buckets.clear()
+        throttle._leases.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PORTAL_UPLOADS={
+            'directory': directory.name, 'max_size': 1000, 'expire_hours': 24,
+            'user_sessions': 2, 'user_bytes': 1500,
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(username='director', password='pw', employee_id='E1', role='director')
+        department = Department.objects.create(name='R&D')
+        self.tab = Tab.objects.create(department=department, name='Staff')
+        self.client.force_login(self.user)
+
+    def _create(self, size=100):
+        return self.client.post(
+            f'/api/tab/{self.tab.id}/uploads/',
+            json.dumps({'filename': 'staff.xlsx', 'size': size, 'sha256': CHECKSUM}),
+            content_type='application/json',
+        )
+
+    def test_session_limit(self):
+        self.assertEqual(self._create().status_code, 201)
+        self.assertEqual(self._create().status_code, 201)
+
+        response = self._create()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Too many uploads in progress', response.json()['error'])
+        self.assertEqual(UploadSession.objects.count(), 2)
+
+    def test_size_limit(self):
+        self.assertEqual(self._create(1000).status_code, 201)
+
+        self.assertEqual(self._create(501).status_code, 429)
+        self.assertEqual(self._create(500).status_code, 201)
+
+    def test_idle_sessions_do_not_count(self):
+        self._create()
+        self._create()
+        UploadSession.objects.update(updated_at=timezone.now() - timedelta(hours=25))
+
+        self.assertEqual(self._create().status_code, 201)
+
+    def test_other_users_do_not_count(self):
+        self._create()
+        self._create()
+        other = User.objects.create_user(username='other', password='pw', employee_id='E2', role='director')
+        self.client.force_login(other)
+
+        self.assertEqual(self._create().status_code, 201)
+
+    @override_settings(PORTAL_THROTTLE={'upload': {'rate_per_minute': 60, 'burst': 1}})
+    def test_throttled(self):
+        self.assertEqual(self._create().status_code, 201)
+
+        response = self._create()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
@@ -0,0 +1,92 @@
+"""Multi-sheet workbook imports (portal.utils.import_workbook_data)."""
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TransactionTestCase
+
+from portal import workbook
+from portal.models import Department, Record, Tab
+from portal.utils import import_workbook_data
+
+User = get_user_model()
+
+
+def _workbook(sheets):
+    """An .xlsx upload with a sheet per (name, number of rows)."""
+    from openpyxl import Workbook
+
+    book = Workbook(write_only=True)
+    for name, rows in sheets:
+        sheet = book.create_sheet(name)
+        sheet.append(['Name', 'Score'])
+        for n in range(1, rows + 1):
+            sheet.append([f'Person {n}', n])
+    buffer = io.BytesIO()
+    book.save(buffer)
+    return SimpleUploadedFile('book.xlsx', buffer.getvalue())
+
+
+# Transactions are the point: TestCase would wrap everything in one
+class WorkbookImportTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='director', password='pw', employee_id='E1', role='director',
+        )
+        self.department = Department.objects.create(name='R&D', created_by=self.user)
+        self.existing = Tab.objects.create(department=self.department, name='Staff', created_by=self.user)
+
+    def test_imports_every_sheet_into_its_tab(self):
+        results = import_workbook_data(_workbook([('Staff', 3), ('Interns ', 5)]), self.department, self.user)
+
+        self.assertEqual([(tab.name, count) for tab, count in results], [('Staff', 3), ('Interns', 5)])
+        interns = Tab.objects.get(department=self.department, name='Interns')
+        self.assertEqual(Record.objects.filter(tab=self.existing).count(), 3)
+        self.assertEqual(Record.objects.filter(tab=interns).count(), 5)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.record_count, 3)
+
+    def test_sheet_names_equal_once_stripped(self):
+        upload = _workbook([('Sales', 1), ('Sales ', 1)])
+        with mock.patch.object(workbook, 'read_sheets') as read_sheets:
+            with self.assertRaisesMessage(Exception, "differ only in surrounding spaces: 'Sales'"):
+                import_workbook_data(upload, self.department, self.user)
+
+        read_sheets.assert_not_called()
+        self.assertFalse(Tab.objects.filter(name='Sales').exists())
+
+    def test_sheets_are_parsed_before_the_write_transaction(self):
+        in_transaction = []
+
+        def read_sheets(path, names, workers=None):
+            for name in names:
+                in_transaction.append(connection.in_atomic_block)
+                yield name, workbook.read_sheet(path, name)
+
+        with mock.patch.object(workbook, 'read_sheets', read_sheets):
+            import_workbook_data(_workbook([('Staff', 2), ('Interns', 2)]), self.department, self.user)
+
+        self.assertEqual(in_transaction, [False, False])
+
+    def test_failed_sheet_imports_nothing(self):
+        def read_sheets(path, names, workers=None):
+            yield names[0], workbook.read_sheet(path, names[0])
+            raise ValueError('bad sheet')
+
+        with mock.patch.object(workbook, 'read_sheets', read_sheets):
+            with self.assertRaises(Exception):
+                import_workbook_data(_workbook([('Staff', 2), ('Interns', 2)]), self.department, self.user)
+
+        self.assertFalse(Record.objects.exists())
+        self.assertFalse(Tab.objects.filter(name='Interns').exists())
+
+    def test_parallel_workers_are_spawned(self):
+        upload = _workbook([('Staff', 2), ('Interns', 2)])
+        with mock.patch.object(workbook.os, 'cpu_count', return_value=2), \
+                mock.patch.object(workbook, 'ProcessPoolExecutor', wraps=workbook.ProcessPoolExecutor) as pool:
+            import_workbook_data(upload, self.department, self.user)
+
+        self.assertEqual(pool.call_args.kwargs['mp_context'].get_start_method(), 'spawn')
+        self.assertEqual(Record.objects.count(), 4)
@@ -0,0 +1,223 @@
+"""
+Admission control and rate limiting for heavy endpoints.
+
+Each endpoint class in settings.PORTAL_THROTTLE (e.g. 'import', 'fetch')
+gets:
+- a concurrency limit across all users and one per user, held from the
+  start of the view until its (possibly streamed) response is closed
+- a per-user token bucket refilled at rate_per_minute, up to burst
+
+State lives in process memory behind a lock, so a check never touches
+the database: it cannot queue behind SQLite's write lock or fail while
+an import holds it. The limits therefore apply per worker process and
+multiply by the number of workers.
+
+A lease does not expire while its view runs, however long an import
+takes. It is released when its response is closed (response.close(),
+which WSGI and ASGI servers call once the body is sent). In case that
+never happens it expires LEASE_SECONDS after the view returned; every
+chunk of a streamed response renews it, so long downloads keep their
+slot.
+
+Over-limit requests get 429 with a Retry-After header.
+"""
+import asyncio
+import itertools
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+
+# How long a lease is honoured once its view has returned, without its
+# response being closed or streaming a chunk (seconds)
+LEASE_SECONDS = 60
+
+# Retry-After sent when a concurrency limit is full (seconds)
+CONCURRENCY_RETRY_AFTER = 5
+
+_lock = threading.Lock()
+
+# Token buckets: key -> (tokens, time.monotonic() of the last refill)
+_buckets = {}
+
+# Live leases: scope -> {lease id: expiry as time.monotonic()}
+_leases = {}
+_lease_ids = itertools.count(1)
+
+
+class Throttled(Exception):
+    """Raised when a request is over one of its limits."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def _config(endpoint_class):
+    return getattr(settings, 'PORTAL_THROTTLE', {}).get(endpoint_class)
+
+
+def _take_token(key, rate_per_minute, burst):
+    """Consume one token from a bucket, refilling it for the time elapsed. Call with _lock held."""
+    rate = rate_per_minute / 60
+    now = time.monotonic()
+    tokens, updated = _buckets.get(key, (burst, now))
+    tokens = min(tokens + (now - updated) * rate, burst)
+    if tokens < 1:
+        _buckets[key] = (tokens, now)
+        raise Throttled('Rate limit exceeded', (1 - tokens) / rate if rate else 60)
+    _buckets[key] = (tokens - 1, now)
+
+
+def _acquire_lease(scope, limit):
+    """Take a slot in scope, or raise Throttled when limit slots are in use. Call with _lock held."""
+    now = time.monotonic()
+    leases = _leases.setdefault(scope, {})
+    for lease_id in [lease_id for lease_id, expires in leases.items() if expires <= now]:
+        del leases[lease_id]
+    if len(leases) >= limit:
+        raise Throttled('Too many concurrent requests', CONCURRENCY_RETRY_AFTER)
+    lease_id = next(_lease_ids)
+    # Held for as long as the view runs; _hold_until_closed starts the clock
+    leases[lease_id] = math.inf
+    return scope, lease_id
+
+
+def _renew_leases(leases):
+    expires = time.monotonic() + LEASE_SECONDS
+    with _lock:
+        for scope, lease_id in leases:
+            if lease_id in _leases.get(scope, ()):
+                _leases[scope][lease_id] = expires
+
+
+def _release_leases(leases):
+    with _lock:
+        for scope, lease_id in leases:
+            _leases.get(scope, {}).pop(lease_id, None)
+
+
+def _admit(endpoint_class, user_id):
+    """Run every check for a request; returns the (scope, lease id) pairs to release."""
+    config = _config(endpoint_class)
+    if not config:
+        return []
+
+    scopes = [
+        (f'{endpoint_class}:user:{user_id}', config.get('user_concurrency')),
+        (endpoint_class, config.get('concurrency')),
+    ]
+    leases = []
+    with _lock:
+        try:
+            for scope, limit in scopes:
+                if limit:
+                    leases.append(_acquire_lease(scope, limit))
+            # Last, so a request turned away for concurrency keeps its token
+            if config.get('rate_per_minute'):
+                _take_token(
+                    f'{endpoint_class}:user:{user_id}',
+                    config['rate_per_minute'],
+                    config.get('burst', 1),
+                )
+        except Throttled:
+            for scope, lease_id in leases:
+                del _leases[scope][lease_id]
+            raise
+    return leases
+
+
+def _too_many_requests(error):
+    response = JsonResponse({'error': f'{error}. Please retry shortly.'}, status=429)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def _check(endpoint_class, request):
+    """Admit the request or build its 429 response: (leases, response)."""
+    try:
+        return _admit(endpoint_class, request.user.id), None
+    except Throttled as error:
+        return [], _too_many_requests(error)
+
+
+def _renewing(content, leases):
+    """Pass a streamed body through, renewing the leases at every chunk."""
+    if hasattr(content, '__aiter__'):
+        async def chunks():
+            async for chunk in content:
+                _renew_leases(leases)
+                yield chunk
+        return chunks()
+
+    def chunks():
+        for chunk in content:
+            _renew_leases(leases)
+            yield chunk
+    return chunks()
+
+
+def _hold_until_closed(response, leases):
+    """Keep the leases until the response (including a stream) is closed.
+
+    The LEASE_SECONDS countdown for an unclosed response starts here.
+    """
+    if not leases:
+        return response
+    _renew_leases(leases)
+    if response.streaming:
+        response.streaming_content = _renewing(response.streaming_content, leases)
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            _release_leases(leases)
+    response.close = close_and_release
+    return response
+
+
+def throttle(endpoint_class, methods=None):
+    """
+    Apply PORTAL_THROTTLE[endpoint_class] limits to a view.
+
+    Works on sync and async views. Place it below @login_required so the
+    user is known. methods limits throttling to some HTTP methods (e.g.
+    only the POST of a form view).
+    """
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                if methods and request.method not in methods:
+                    return await view_func(request, *args, **kwargs)
+                # In-memory checks are quick: no thread hop needed
+                leases, rejected = _check(endpoint_class, request)
+                if rejected:
+                    return rejected
+                try:
+                    response = await view_func(request, *args, **kwargs)
+                except BaseException:
+                    _release_leases(leases)
+                    raise
+                return _hold_until_closed(response, leases)
+        else:
+            @wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                if methods and request.method not in methods:
+                    return view_func(request, *args, **kwargs)
+                leases, rejected = _check(endpoint_class, request)
+                if rejected:
+                    return rejected
+                try:
+                    response = view_func(request, *args, **kwargs)
+                except BaseException:
+                    _release_leases(leases)
+                    raise
+                return _hold_until_closed(response, leases)
+        return _wrapped_view
+    return decorator
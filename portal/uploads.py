@@ -0,0 +1,214 @@
+"""
+Resumable chunked uploads of files to import into a tab.
+
+A large workbook does not fit one multipart POST (FILE_UPLOAD_MAX_MEMORY_SIZE
+and DATA_UPLOAD_MAX_MEMORY_SIZE are 5 MB), and a dropped connection would
+lose the whole transfer. Instead a client:
+
+1. creates an UploadSession with the file's name, size and SHA-256
+2. PUTs the file chunk by chunk, in order, each at the session's offset;
+   after a failure it asks for the offset and resumes from there
+3. finalizes: the whole file's checksum is verified and the file is
+   handed to the import functions in portal.utils from disk
+
+Chunks are streamed from the request into the session's file under
+PORTAL_UPLOADS['directory'], COPY_BLOCK_SIZE bytes at a time. A chunk
+may carry its own SHA-256, so a corrupted chunk is rejected before it
+counts; the final checksum catches anything else, such as two clients
+racing for the same offset with different bytes.
+`manage.py clean_uploads` removes uploads abandoned for expire_hours.
+
+A user may have at most user_sessions uploads in progress, declaring
+user_bytes in all, so abandoned sessions cannot fill the disk; those idle
+for expire_hours no longer count.
+"""
+import hashlib
+import os
+from pathlib import Path
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import UploadSession
+
+DEFAULT_CHUNK_SIZE = 4 * 2**20
+DEFAULT_MAX_SIZE = 2**30
+DEFAULT_EXPIRE_HOURS = 24
+DEFAULT_USER_SESSIONS = 4
+DEFAULT_USER_BYTES = 2 * 2**30
+
+# Bytes read from the request (or the file, when hashing) at a time
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """
+    A chunk or finalize request that cannot be accepted.
+
+    status is the HTTP status to answer with; offset, when set, is where
+    the client should resume.
+    """
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def _config():
+    return getattr(settings, 'PORTAL_UPLOADS', None) or {}
+
+
+def directory():
+    return Path(_config().get('directory') or Path(settings.BASE_DIR) / 'uploads')
+
+
+def chunk_size():
+    return _config().get('chunk_size', DEFAULT_CHUNK_SIZE)
+
+
+def max_size():
+    return _config().get('max_size', DEFAULT_MAX_SIZE)
+
+
+def expire_hours():
+    return _config().get('expire_hours', DEFAULT_EXPIRE_HOURS)
+
+
+def user_sessions():
+    return _config().get('user_sessions', DEFAULT_USER_SESSIONS)
+
+
+def user_bytes():
+    return _config().get('user_bytes', DEFAULT_USER_BYTES)
+
+
+def file_path(session):
+    """Where a session's partial file lives."""
+    return directory() / f'{session.id}.part'
+
+
+def create_session(tab, user, filename, size, checksum):
+    """
+    Start an upload: an UploadSession and its empty file.
+
+    Raises UploadError (429) if the user already has user_sessions()
+    uploads in progress, or they and this one declare over user_bytes().
+    """
+    active_since = timezone.now() - timedelta(hours=expire_hours())
+    with transaction.atomic():
+        open_sessions = UploadSession.objects.filter(user=user, updated_at__gte=active_since).aggregate(
+            count=Count('id'), size=Sum('size'),
+        )
+        if open_sessions['count'] >= user_sessions():
+            raise UploadError(
+                f'Too many uploads in progress (at most {user_sessions()}); finish or cancel one first', 429,
+            )
+        if (open_sessions['size'] or 0) + size > user_bytes():
+            raise UploadError(
+                f'Uploads in progress would exceed {user_bytes()} bytes; finish or cancel one first', 429,
+            )
+        session = UploadSession.objects.create(
+            tab=tab, user=user, filename=filename, size=size, checksum=checksum.lower(),
+        )
+    os.makedirs(directory(), exist_ok=True)
+    file_path(session).touch()
+    return session
+
+
+def write_chunk(session, offset, stream, length, chunk_checksum=None):
+    """
+    Store length bytes read from stream at offset; returns the new offset.
+
+    Raises UploadError: 409 if offset is not where the session stands
+    (including when another request stored this chunk first), 413 if the
+    chunk is longer than chunk_size(), 400 if it runs past the file's size,
+    arrives short or does not match chunk_checksum.
+    """
+    if offset != session.received:
+        raise UploadError(f'Expected the chunk at offset {session.received}', 409, session.received)
+    if length > chunk_size():
+        raise UploadError(f'Chunks are limited to {chunk_size()} bytes', 413, offset)
+    if offset + length > session.size:
+        raise UploadError(f'Chunk runs past the declared size of {session.size} bytes', 400, offset)
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(file_path(session), 'r+b') as file:
+        file.seek(offset)
+        while written < length:
+            block = stream.read(min(COPY_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            digest.update(block)
+            file.write(block)
+            written += len(block)
+        error = None
+        if written != length:
+            error = f'Chunk ended after {written} of {length} bytes'
+        elif chunk_checksum and digest.hexdigest() != chunk_checksum.lower():
+            error = 'Chunk checksum mismatch'
+        if error:
+            file.truncate(offset)
+            raise UploadError(error, 400, offset)
+
+    # Counts only if no other request moved the session on meanwhile
+    stored = UploadSession.objects.filter(id=session.id, received=offset).update(
+        received=offset + length, updated_at=timezone.now(),
+    )
+    if not stored:
+        session.refresh_from_db(fields=['received'])
+        raise UploadError(f'Expected the chunk at offset {session.received}', 409, session.received)
+    session.received = offset + length
+    return session.received
+
+
+def file_checksum(path):
+    """SHA-256 of a file, hex, read COPY_BLOCK_SIZE bytes at a time."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StoredUpload(File):
+    """A finished upload, read by the import functions like a TemporaryUploadedFile."""
+
+    def __init__(self, session):
+        self.path = file_path(session)
+        super().__init__(open(self.path, 'rb'), name=session.filename)
+
+    def temporary_file_path(self):
+        return str(self.path)
+
+
+def finish(session):
+    """
+    Check that an upload is complete and intact; returns it as a StoredUpload.
+
+    A checksum mismatch discards what was received (it cannot tell which
+    chunk is wrong) and raises UploadError with offset 0.
+    """
+    if session.received != session.size:
+        raise UploadError(f'Upload incomplete: {session.received} of {session.size} bytes', 409, session.received)
+    if file_checksum(file_path(session)) != session.checksum:
+        UploadSession.objects.filter(id=session.id).update(received=0, updated_at=timezone.now())
+        with open(file_path(session), 'r+b') as file:
+            file.truncate(0)
+        raise UploadError('Checksum mismatch: the upload must be sent again', 400, 0)
+    return StoredUpload(session)
+
+
+def discard(session):
+    """Delete an upload and its file."""
+    try:
+        os.remove(file_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
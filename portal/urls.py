@@ -31,10 +31,19 @@ urlpatterns = [
     
     # Excel import
     path('tab/<int:tab_id>/import-excel/', views.import_excel, name='import_excel'),
+    path('department/<int:department_id>/import-workbook/', views.import_workbook, name='import_workbook'),
     
     # REST API endpoints (TabulatorJS)
     path('api/tab/<int:tab_id>/records/', views.api_fetch_records, name='api_fetch_records'),
     path('api/tab/<int:tab_id>/records/create/', views.api_create_record, name='api_create_record'),
     path('api/record/<int:record_id>/', views.api_update_record, name='api_update_record'),
     path('api/record/<int:record_id>/delete/', views.api_delete_record, name='api_delete_record'),
+    path('api/record/<int:record_id>/history/', views.api_record_history, name='api_record_history'),
+    path('api/tab/<int:tab_id>/records/bulk-delete/', views.api_bulk_delete_records, name='api_bulk_delete_records'),
+    path('api/tab/<int:tab_id>/columns/', views.api_tab_columns, name='api_tab_columns'),
+    path('api/tab/<int:tab_id>/uploads/', views.api_create_upload, name='api_create_upload'),
+    path('api/uploads/<uuid:upload_id>/', views.api_upload, name='api_upload'),
+    path('api/uploads/<uuid:upload_id>/finalize/', views.api_finalize_upload, name='api_finalize_upload'),
+    path('api/tab/<int:tab_id>/events/', views.api_tab_events, name='api_tab_events'),
+    path('api/department/<int:department_id>/query/', views.api_department_query, name='api_department_query'),
 ]
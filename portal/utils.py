@@ -1,9 +1,230 @@
 """
 Utility functions for the portal application.
 """
-import pandas as pd
+import codecs
+import csv
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
 from io import BytesIO
-from .models import Record
+from django.db import connections, router
+from django.utils import timezone
+from .models import Record, RecordEvent, RecordHistory, Tab
+from .jsonsql import json_filter
+from .positional import add_keys, key_transform, stored_form
+from . import events, history, sharding, workbook
+
+# Rows written per bulk INSERT/UPDATE statement
+IMPORT_BATCH_SIZE = 1000
+
+# Record IDs per DELETE ... WHERE id IN (...) statement
+DELETE_BATCH_SIZE = 500
+
+# Bulk deletes up to this size list their ids in the live-feed event;
+# larger ones tell open grids to reload instead
+DELETE_EVENT_MAX_IDS = 1000
+
+# Records removed per DELETE statement when purging a deleted tab, and the
+# seconds between statements that leave the write lock to other requests
+PURGE_BATCH_SIZE = 2000
+PURGE_PAUSE = 0.01
+
+# Uploads read as delimited text with the csv module instead of pandas
+CSV_EXTENSIONS = ('.csv', '.tsv', '.txt')
+
+# Bytes read up front to detect a delimited file's encoding and dialect,
+# and rows read up front to infer each column's type
+CSV_SNIFF_BYTES = 16 * 1024
+CSV_SAMPLE_ROWS = 1000
+
+# Numbers as they appear in CSV exports; "007" stays text, like an ID
+_CSV_INTEGER = re.compile(r'-?(?:0|[1-9][0-9]*)')
+_CSV_DECIMAL = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?')
+
+
+def _read_excel_rows(file):
+    """
+    Read an uploaded Excel file's first sheet and yield one JSON-ready dict per row.
+    
+    Adds the S.No (serial number) column, maps NaN to None, keeps numbers
+    as-is and converts every other value to a string
+    (see portal.workbook.dataframe_rows).
+    """
+    # pandas (and numpy) take longer to import than the rest of the app;
+    # load them only when a file is actually being imported
+    import pandas as pd
+    
+    # Read Excel file into DataFrame. Files already on disk (large and
+    # chunked uploads) are read in place; BytesIO converts other uploaded
+    # files to in-memory bytes for pandas
+    if hasattr(file, 'temporary_file_path'):
+        df = pd.read_excel(file.temporary_file_path())
+    else:
+        df = pd.read_excel(BytesIO(file.read()))
+    
+    yield from workbook.dataframe_rows(df)
+
+
+def is_csv_file(name):
+    """Whether an upload is read as delimited text (see CSV_EXTENSIONS)."""
+    return name.lower().endswith(CSV_EXTENSIONS)
+
+
+def _csv_encoding(head):
+    """UTF-8 (skipping a BOM) if the file's first bytes decode as UTF-8, else Windows-1252."""
+    try:
+        # Not final: the sample may end in the middle of a character
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+    except UnicodeDecodeError:
+        return 'cp1252'
+    return 'utf-8-sig'
+
+
+def _csv_dialect(sample, name):
+    """Sniff the delimiter and quoting from the first lines of a file."""
+    # Whole lines only: a cut-off last line can mislead the sniffer
+    sample = sample[:sample.rfind('\n') + 1] or sample
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',\t;|')
+    except csv.Error:
+        return csv.excel_tab if name.lower().endswith('.tsv') else csv.excel
+
+
+def _csv_header(row):
+    """
+    Column names for a header row, as pandas names them for Excel files.
+    
+    Blank names become "Unnamed: <index>" and repeats get ".1", ".2", ...
+    so a CSV export and its workbook import to the same keys.
+    """
+    names = []
+    for index, name in enumerate(row):
+        name = name.strip() or f'Unnamed: {index}'
+        unique, repeat = name, 0
+        while unique in names:
+            repeat += 1
+            unique = f'{name}.{repeat}'
+        names.append(unique)
+    return names
+
+
+def _csv_int(text):
+    return int(text) if _CSV_INTEGER.fullmatch(text) else text
+
+
+def _csv_float(text):
+    return float(text) if _CSV_DECIMAL.fullmatch(text) else text
+
+
+def _csv_converters(sample, width):
+    """
+    Per column, the function that converts its text values.
+    
+    A column is int (or float) if every non-blank sampled value is one;
+    None leaves it as text. Values after the sample that do not convert
+    are kept as text.
+    """
+    converters = []
+    for column in range(width):
+        values = [row[column] for row in sample if column < len(row) and row[column] != '']
+        if values and all(_CSV_INTEGER.fullmatch(value) for value in values):
+            converters.append(_csv_int)
+        elif values and all(_CSV_DECIMAL.fullmatch(value) for value in values):
+            converters.append(_csv_float)
+        else:
+            converters.append(None)
+    return converters
+
+
+def _read_csv_rows(file):
+    """
+    Read an uploaded CSV/TSV file and yield one JSON-ready dict per row.
+    
+    Streams from the upload's own file object (a temporary file on disk
+    above FILE_UPLOAD_MAX_MEMORY_SIZE) with the csv module. The encoding
+    and dialect are sniffed from the first CSV_SNIFF_BYTES and the column
+    types inferred from the first CSV_SAMPLE_ROWS rows. Rows get the same
+    shape as _read_excel_rows(): S.No first, blanks as None.
+    """
+    raw = getattr(file, 'file', file)
+    raw.seek(0)
+    head = raw.read(CSV_SNIFF_BYTES)
+    raw.seek(0)
+    encoding = _csv_encoding(head)
+    dialect = _csv_dialect(head.decode(encoding, errors='replace'), file.name)
+    
+    text = io.TextIOWrapper(raw, encoding=encoding, errors='replace', newline='')
+    try:
+        reader = csv.reader(text, dialect)
+        header = _csv_header(next(reader, []))
+        if not header:
+            return
+        
+        sample = []
+        for row in reader:
+            if row:  # Skip blank lines
+                sample.append(row)
+            if len(sample) >= CSV_SAMPLE_ROWS:
+                break
+        converters = _csv_converters(sample, len(header))
+        columns = list(zip(header, converters))
+        
+        serial = 0
+        for rows in (sample, reader):
+            for row in rows:
+                if not row:
+                    continue
+                serial += 1
+                if len(row) > len(header):
+                    raise ValueError(f'Row {serial}: expected {len(header)} fields, saw {len(row)}')
+                data = {'S.No': serial}
+                for (name, convert), value in zip(columns, row):
+                    if value == '':
+                        data[name] = None
+                    else:
+                        data[name] = convert(value) if convert else value
+                # Short rows: the missing trailing fields are blank
+                for name, _ in columns[len(row):]:
+                    data[name] = None
+                yield data
+    finally:
+        # Leave the upload's file open for its owner
+        text.detach()
+
+
+def _read_rows(file):
+    """Rows of an uploaded file: delimited text for CSV_EXTENSIONS, a workbook otherwise."""
+    if is_csv_file(file.name):
+        return _read_csv_rows(file)
+    return _read_excel_rows(file)
+
+
+def _delete_chunk(tab_id, ids, user=None, when=None):
+    """Delete records by id, keeping their data in the history; returns the count."""
+    if history.is_enabled():
+        rows = Record.objects.filter(id__in=ids).values_list('id', 'data', 'created_at')
+        history.record_deletes(tab_id, rows, user, when)
+    deleted, _ = Record.objects.filter(id__in=ids).delete()
+    return deleted
+
+
+def _merge_key(value):
+    """
+    Normalize a key column value for matching.
+    
+    pandas reads an integer column that has blanks as floats, so 7 and 7.0
+    must match; everything else is compared by its string form.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
 
 
 def import_excel_data(file, tab, user):
@@ -23,10 +244,10 @@ def import_excel_data(file, tab, user):
     
     Process:
     1. Read Excel file into pandas DataFrame
-    2. Iterate through each row
-    3. Add S.No column (1-indexed serial numbering)
-    4. Handle NaN values and type conversions
-    5. Create Record with data JSONField
+    2. Add S.No column and convert each row (see _read_excel_rows)
+    3. Insert Records in batches of IMPORT_BATCH_SIZE
+    4. Update the tab/department record counters
+    5. Publish an 'import' event to the tab's live feed
     6. Return count of imported records
     
     Returns:
@@ -36,45 +257,432 @@ def import_excel_data(file, tab, user):
         Exception: If Excel read fails or record creation fails
     """
     try:
-        # Read Excel file into DataFrame
-        # BytesIO converts uploaded file to in-memory bytes for pandas
-        file_bytes = BytesIO(file.read())
-        df = pd.read_excel(file_bytes)
+        return _import_rows(_read_excel_rows(file), tab, user)
+    except Exception as e:
+        raise Exception(f"Failed to import Excel data: {str(e)}")
+
+
+def import_csv_data(file, tab, user):
+    """
+    Import a CSV/TSV file into Record objects.
+    
+    The counterpart of import_excel_data() for delimited text: rows are
+    streamed from the upload with the csv module (see _read_csv_rows)
+    rather than loaded into a pandas DataFrame, then inserted the same
+    way, in batches of IMPORT_BATCH_SIZE.
+    
+    Returns:
+        int: Number of records successfully imported
+    
+    Raises:
+        Exception: If the file cannot be parsed or record creation fails
+    """
+    try:
+        return _import_rows(_read_csv_rows(file), tab, user)
+    except Exception as e:
+        raise Exception(f"Failed to import CSV data: {str(e)}")
+
+
+def insert_records(rows, with_ids=False):
+    """
+    INSERT records with one executemany().
+    
+    rows are (tab id, data, created_at, created_by id, updated_at,
+    updated_by id) tuples, with the record id first if with_ids. data is
+    written in its stored form (stored_form) and the timestamps as given.
+    bulk_create() would build and prepare a model instance per row, which
+    costs more than parsing an import file, and would overwrite the
+    timestamps with the current time.
+    """
+    connection = connections[router.db_for_write(Record)]
+    names = ('tab', 'data', 'created_at', 'created_by', 'updated_at', 'updated_by')
+    if with_ids:
+        names = ('id',) + names
+    fields = [Record._meta.get_field(name) for name in names]
+    adapt_json = connection.ops.adapt_json_value
+    encoder = Record._meta.get_field('data').encoder
+    timestamp_field = Record._meta.get_field('created_at')
+    
+    # Rows of one import share their timestamps; prepare each once
+    stamps = {}
+    
+    def stamp(value):
+        if value not in stamps:
+            stamps[value] = timestamp_field.get_db_prep_save(value, connection)
+        return stamps[value]
+    
+    params = []
+    for row in rows:
+        *record_id, tab_id, data, created_at, created_by, updated_at, updated_by = row
+        params.append((
+            *record_id, tab_id, adapt_json(stored_form(data, tab_id), encoder),
+            stamp(created_at), created_by, stamp(updated_at), updated_by,
+        ))
+    
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(Record._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _import_rows(rows, tab, user):
+    """Append rows to a tab in batched INSERTs; steps 3-5 of import_excel_data()."""
+    # Track count of successfully created records
+    records_created = 0
+    batch = []
+    now = timezone.now()
+    user_id = user.pk if user is not None else None
+    
+    with sharding.atomic(tab.department_id):
+        for index, data in enumerate(rows):
+            if index == 0:
+                # Positional tabs store the sheet's columns by position
+                add_keys(tab, data)
+            # Stores row data as JSON, tracks creator and timestamps
+            batch.append((tab.id, data, now, user_id, now, None))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                insert_records(batch)
+                records_created += len(batch)
+                batch = []
+        if batch:
+            insert_records(batch)
+            records_created += len(batch)
         
-        # Track count of successfully created records
-        records_created = 0
+        tab.record_changed(records_created)
         
-        # Iterate through each row in the DataFrame
-        for index, row in df.iterrows():
-            # Initialize data dictionary for this row
-            data = {}
+        # One summary event: open grids reload rather than replaying every row
+        events.publish(tab.id, 'import', payload={'count': records_created})
+    
+    return records_created
+
+
+@contextmanager
+def _upload_path(file):
+    """
+    A filesystem path for an upload, for readers that open files by name.
+    
+    Large uploads already sit in a temporary file; smaller ones are
+    copied to one that is removed afterwards.
+    """
+    if hasattr(file, 'temporary_file_path'):
+        yield file.temporary_file_path()
+        return
+    suffix = os.path.splitext(file.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as copy:
+        for chunk in file.chunks():
+            copy.write(chunk)
+    try:
+        yield copy.name
+    finally:
+        os.remove(copy.name)
+
+
+def import_workbook_data(file, department, user, create_tabs=True):
+    """
+    Import every sheet of an Excel workbook into a department's tabs.
+    
+    Purpose:
+    - Import a multi-sheet workbook in one step instead of one sheet at a time
+    - Use every core for parsing, then write in one short transaction
+    
+    Parameters:
+        file: Django UploadedFile object from form submission
+        department: Department object whose tabs receive the sheets
+        user: User object (creator tracking)
+        create_tabs: Create a tab for each sheet with no tab of its name;
+            if False such sheets are an error
+    
+    Process:
+    1. Map each sheet to the department's tab of the same (stripped) name,
+       creating missing tabs
+    2. Parse the sheets in parallel worker processes (portal.workbook)
+    3. Once every sheet is parsed, append each sheet's rows to its tab
+       in batched INSERTs from this process (see import_excel_data), all
+       in one transaction, so the database's write lock is not held
+       while sheets are still being parsed
+    
+    Returns:
+        list: (tab, number of records imported) per sheet, in workbook order
+    
+    Raises:
+        Exception: If a sheet cannot be mapped or parsed, or the import fails
+    """
+    try:
+        with _upload_path(file) as path:
+            names = workbook.sheet_names(path)
+            tab_names = {name: name.strip() for name in names}
+            duplicates = [name for name, count in Counter(tab_names.values()).items() if count > 1]
+            if duplicates:
+                # "Sales" and "Sales " would both map to (or create) one tab
+                raise ValueError(f"Sheet names differ only in surrounding spaces: {', '.join(repr(name) for name in duplicates)}")
+            tabs = {
+                tab.name: tab
+                for tab in Tab.objects.filter(department=department, name__in=set(tab_names.values()))
+            }
+            missing = [name for name in names if tab_names[name] not in tabs]
+            if missing and not create_tabs:
+                raise ValueError(f"No tab named {', '.join(repr(name) for name in missing)} in {department.name}")
+            if any(not tab_names[name] for name in missing):
+                raise ValueError('Sheet names must not be blank')
+            
+            sheets = dict(workbook.read_sheets(path, names))
+            
+            counts = {}
+            with sharding.atomic(department.id):
+                for name in missing:
+                    tabs[tab_names[name]] = Tab.objects.create(
+                        department=department, name=tab_names[name], created_by=user,
+                    )
+                for name in names:
+                    counts[name] = _import_rows(sheets.pop(name), tabs[tab_names[name]], user)
+        
+        return [(tabs[tab_names[name]], counts[name]) for name in names]
+        
+    except Exception as e:
+        raise Exception(f"Failed to import workbook: {str(e)}")
+
+
+def merge_excel_data(file, tab, user, key_column, delete_missing=False):
+    """
+    Upsert Excel (or CSV/TSV) file data into a tab, matching rows on a key column.
+    
+    Purpose:
+    - Refresh a tab from an updated spreadsheet without duplicating rows
+    - Cost a handful of statements regardless of sheet size
+    
+    Parameters:
+        file: Django UploadedFile object from form submission
+        tab: Tab object (destination for imported data)
+        user: User object (creator/updater tracking)
+        key_column: Column whose value identifies a row (e.g. "Employee ID")
+        delete_missing: Delete existing records whose key is not in the file
+    
+    Process:
+    1. Load the tab's key -> record id map in one query
+    2. Read the file; rows whose key matches replace that record's data
+       (bulk_update), all other rows become new records (bulk_create)
+    3. Optionally delete unmatched existing records in chunked
+       DELETE ... WHERE id IN (...) statements
+    4. Record undo entries for updated and deleted records in batches
+       (portal.history)
+    5. Publish one 'import' event to the tab's live feed
+    
+    Existing records that share a key with an earlier record are treated
+    as unmatched, so delete_missing also clears out duplicates left by
+    earlier append-mode imports.
+    
+    Returns:
+        dict: {'created': int, 'updated': int, 'deleted': int}
+    
+    Raises:
+        Exception: If the key column is missing or the import fails
+    """
+    try:
+        with sharding.atomic(tab.department_id):
+            # Key value -> record id, read straight from the JSON column
+            existing = {}
+            existing_ids = []
+            key_rows = (
+                Record.objects.filter(tab=tab)
+                .annotate(key_value=key_transform(key_column, tab.row_keys))
+                .order_by('id')
+                .values_list('key_value', 'id')
+            )
+            for key_value, record_id in key_rows.iterator(chunk_size=IMPORT_BATCH_SIZE):
+                existing.setdefault(_merge_key(key_value), record_id)
+                existing_ids.append(record_id)
+            existing.pop(None, None)
+            
+            matched_ids = set()
+            to_create = []
+            to_update = []
+            new_data = {}  # record id -> plain data, for the history
+            counts = {'created': 0, 'updated': 0, 'deleted': 0}
+            now = timezone.now()
             
-            # Add S.No field: Serial number starting from 1
-            # This matches Excel row numbering (excluding header)
-            data['S.No'] = index + 1
+            def flush_updates():
+                if history.is_enabled():
+                    old_data = dict(
+                        Record.objects.filter(id__in=list(new_data)).values_list('id', 'data')
+                    )
+                    history.record_changes(tab.id, (
+                        (record_id, old_data.get(record_id), data) for record_id, data in new_data.items()
+                    ), user, now)
+                Record.objects.bulk_update(to_update, ['data', 'updated_by', 'updated_at'])
+                counts['updated'] += len(to_update)
+                to_update.clear()
+                new_data.clear()
             
-            # Convert each column value to appropriate type
-            for col, value in row.items():
-                if pd.isna(value):
-                    # Handle missing/null values
-                    data[col] = None
-                elif isinstance(value, (int, float)):
-                    # Keep numeric values as-is
-                    data[col] = value
+            for index, data in enumerate(_read_rows(file)):
+                if key_column not in data:
+                    raise ValueError(f"Key column '{key_column}' not found in file")
+                if index == 0:
+                    add_keys(tab, data)
+                
+                record_id = existing.get(_merge_key(data[key_column]))
+                if record_id is not None and record_id not in matched_ids:
+                    matched_ids.add(record_id)
+                    # bulk_update skips auto_now and the field's save-time
+                    # packing, so stamp updated_at and pack the data here
+                    to_update.append(Record(
+                        id=record_id, data=stored_form(data, tab.id),
+                        updated_by=user, updated_at=now,
+                    ))
+                    new_data[record_id] = data
                 else:
-                    # Convert all other types to string
-                    data[col] = str(value)
+                    to_create.append(Record(tab=tab, data=data, created_by=user))
+                
+                if len(to_update) >= IMPORT_BATCH_SIZE:
+                    flush_updates()
+                if len(to_create) >= IMPORT_BATCH_SIZE:
+                    Record.objects.bulk_create(to_create)
+                    counts['created'] += len(to_create)
+                    to_create = []
             
-            # Create Record object with JSONField data
-            # Stores row data as JSON, tracks creator and timestamps
-            record = Record.objects.create(
-                tab=tab,
-                data=data,
-                created_by=user
-            )
-            records_created += 1
+            if to_update:
+                flush_updates()
+            if to_create:
+                Record.objects.bulk_create(to_create)
+                counts['created'] += len(to_create)
+            
+            if delete_missing:
+                stale_ids = [
+                    record_id for record_id in existing_ids
+                    if record_id not in matched_ids
+                ]
+                for start in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+                    chunk = stale_ids[start:start + DELETE_BATCH_SIZE]
+                    counts['deleted'] += _delete_chunk(tab.id, chunk, user, now)
+            
+            tab.record_changed(counts['created'] - counts['deleted'])
+            events.publish(tab.id, 'import', payload={
+                'count': counts['created'] + counts['updated'],
+                **counts,
+            })
         
-        return records_created
+        return counts
         
     except Exception as e:
         raise Exception(f"Failed to import Excel data: {str(e)}")
+
+
+def delete_records(tab, ids=None, where=None, user=None):
+    """
+    Delete many of a tab's records at once.
+    
+    Parameters:
+        tab: Tab object whose records are deleted
+        ids: List of record ids; ids from other tabs are ignored
+        where: JSON key predicates (see portal.jsonsql.json_filter)
+        user: User object (history tracking)
+    
+    Exactly one of ids and where is given. The matching ids are read
+    first, then removed in chunked DELETE ... WHERE id IN (...) statements,
+    all in one transaction, so the delete either happens completely or
+    not at all. One 'delete' event is published for the whole batch.
+    
+    Returns:
+        int: Number of records deleted
+    
+    Raises:
+        ValueError: If the where predicates are invalid
+    """
+    records = Record.objects.filter(tab=tab).order_by()
+    if where is not None:
+        records = records.filter(json_filter(where, row_keys=tab.row_keys))
+    
+    with sharding.atomic(tab.department_id):
+        if ids is not None:
+            ids = list(dict.fromkeys(ids))
+            target_ids = []
+            for start in range(0, len(ids), DELETE_BATCH_SIZE):
+                chunk = ids[start:start + DELETE_BATCH_SIZE]
+                target_ids.extend(records.filter(id__in=chunk).values_list('id', flat=True))
+        else:
+            target_ids = list(records.values_list('id', flat=True))
+        
+        deleted = 0
+        now = timezone.now()
+        for start in range(0, len(target_ids), DELETE_BATCH_SIZE):
+            chunk = target_ids[start:start + DELETE_BATCH_SIZE]
+            deleted += _delete_chunk(tab.id, chunk, user, now)
+        
+        if deleted:
+            tab.record_changed(-deleted)
+            events.publish(tab.id, 'delete', payload={
+                'ids': target_ids if deleted <= DELETE_EVENT_MAX_IDS else None,
+                'count': deleted,
+            })
+    
+    return deleted
+
+
+def purge_tab(tab_id, batch_size=PURGE_BATCH_SIZE, pause=PURGE_PAUSE):
+    """
+    Delete a tab marked as deleting, together with its records.
+    
+    Django's cascade would load every record id into Python and delete
+    them in one long transaction. Instead the records go in raw
+    DELETE statements of batch_size rows, each committed on its own, so
+    other writers get the database between chunks. The emptied tab is
+    then deleted through the ORM, which cascades to its compression
+    dictionaries. The tab's history and live feed go the same way as its
+    records, from the tab's department's database (portal.sharding).
+    
+    Safe to run again after an interruption: `manage.py purge_deleted_tabs`
+    finishes tabs left behind by a restart.
+    
+    Returns:
+        int: Number of records deleted
+    """
+    with sharding.use(sharding.department_of_tab(tab_id)):
+        deleted = _delete_tab_rows(Record, tab_id, batch_size, pause)
+        _delete_tab_rows(RecordHistory, tab_id, batch_size, pause)
+        _delete_tab_rows(RecordEvent, tab_id, batch_size, pause)
+    Tab.all_objects.filter(id=tab_id, deleting=True).delete()
+    return deleted
+
+
+def _delete_tab_rows(model, tab_id, batch_size, pause):
+    """Delete a tab's rows of model in separately committed chunks; returns the count."""
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.get_field('tab').column)
+    if connection.vendor == 'mysql':
+        # MySQL has no LIMIT in IN (...) subqueries, but DELETE takes one
+        sql = f'DELETE FROM {table} WHERE {column} = %s LIMIT %s'
+    else:
+        sql = f'DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {column} = %s LIMIT %s)'
+    
+    deleted = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [tab_id, batch_size])
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            break
+        time.sleep(pause)
+    return deleted
+
+
+def _purge_in_background(tab_id):
+    try:
+        purge_tab(tab_id)
+    finally:
+        # This thread's own database connections
+        connections.close_all()
+
+
+def start_tab_purge(tab_id):
+    """Run purge_tab() on a background thread so the request returns at once."""
+    thread = threading.Thread(
+        target=_purge_in_background, args=(tab_id,),
+        name=f'purge-tab-{tab_id}', daemon=True,
+    )
+    thread.start()
+    return thread
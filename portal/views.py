@@ -2,16 +2,33 @@
 Views for authentication, dashboard, and data management.
 """
 import json
+import re
+import zlib
+from itertools import islice
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.http import require_http_methods
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
 from django.db.models import Q
-from .models import User, Department, Tab, Record
+from .models import User, Department, Tab, Record, RecordHistory, UploadSession
 from .forms import SignUpForm, LoginForm, RecordForm
-from .utils import import_excel_data
+from .utils import (
+    import_csv_data, import_excel_data, import_workbook_data, is_csv_file, merge_excel_data,
+    delete_records, start_tab_purge,
+)
+from . import columns
+from .async_utils import aget_object_or_404, async_login_required, async_require_http_methods
+from . import events, history, sharding, uploads
+from .throttle import throttle
+from .jsonsql import JSONProject, json_filter
 
 
 def landing(request):
@@ -69,7 +86,8 @@ def logout_view(request):
 @login_required
 def dashboard(request):
     """Role-based dashboard showing departments and tabs."""
-    departments = Department.objects.all()
+    # Counters are denormalized on Tab/Department, so one prefetch covers the page
+    departments = Department.objects.prefetch_related('tabs')
     
     context = {
         'departments': departments,
@@ -208,7 +226,16 @@ def delete_tab(request, tab_id):
     
     try:
         tab_name = tab.name
-        tab.delete()
+        with transaction.atomic():
+            # Take the tab's records out of the department rollup
+            tab.record_changed(-tab.record_count)
+            # Hidden everywhere at once (Tab.objects skips it), with its name
+            # freed for a new tab; the records are purged in the background
+            Tab.all_objects.filter(id=tab.id).update(
+                deleting=True,
+                name=f'[deleting {tab.id}] {tab_name}'[:Tab._meta.get_field('name').max_length],
+            )
+            transaction.on_commit(lambda: start_tab_purge(tab.id))
         
         return JsonResponse({
             'success': True,
@@ -287,6 +314,8 @@ def add_record(request, tab_id):
                 data=data,
                 created_by=request.user
             )
+            tab.record_changed(1)
+            events.publish(tab.id, 'create', record.id, events.record_row(record))
             messages.success(request, 'Record added successfully!')
             return redirect('view_tab', tab_id=tab_id)
         else:
@@ -316,9 +345,13 @@ def edit_record(request, record_id):
     if request.method == 'POST':
         try:
             data = json.loads(request.POST.get('data', '{}'))
+            old_data = record.data
             record.data = data
             record.updated_by = request.user
             record.save()
+            history.record_changes(record.tab_id, [(record.id, old_data, data)], request.user)
+            record.tab.record_changed()
+            events.publish(record.tab_id, 'update', record.id, events.record_row(record))
             return redirect('view_tab', tab_id=record.tab.id)
         except json.JSONDecodeError:
             context = {'record': record, 'tab': record.tab, 'error': 'Invalid JSON format'}
@@ -345,15 +378,38 @@ def delete_record(request, record_id):
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
     try:
+        deleted_id = record.id
+        history.record_deletes(tab.id, [(record.id, record.data, record.created_at)], request.user)
         record.delete()
+        tab.record_changed(-1)
+        events.publish(tab.id, 'delete', deleted_id, {'id': deleted_id})
         return JsonResponse({'success': True, 'message': 'Record deleted successfully'})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+IMPORT_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.tsv', '.txt')
+
+
+def _import_file(file, tab, user, mode='append', key_column='', delete_missing=False):
+    """
+    Append or merge an uploaded file into a tab, reading it by its extension.
+    
+    Returns {'created': int, 'updated': int, 'deleted': int}.
+    """
+    if mode == 'merge':
+        return merge_excel_data(file, tab, user, key_column, delete_missing)
+    if is_csv_file(file.name):
+        count = import_csv_data(file, tab, user)
+    else:
+        count = import_excel_data(file, tab, user)
+    return {'created': count, 'updated': 0, 'deleted': 0}
+
+
 @login_required
+@throttle('import', methods=('POST',))
 def import_excel(request, tab_id):
-    """Import Excel data into a tab."""
+    """Import Excel or CSV/TSV data into a tab."""
     tab = get_object_or_404(Tab, id=tab_id)
     
     # Check permission
@@ -366,14 +422,31 @@ def import_excel(request, tab_id):
         
         file = request.FILES['file']
         
-        if not file.name.endswith(('.xlsx', '.xls')):
-            return render(request, 'import_excel.html', {'tab': tab, 'error': 'Please upload an Excel file'})
+        if not file.name.lower().endswith(IMPORT_EXTENSIONS):
+            return render(request, 'import_excel.html', {'tab': tab, 'error': 'Please upload an Excel or CSV file'})
+        
+        # Merge mode: upsert rows matched on a key column instead of appending
+        mode = request.POST.get('mode', 'append')
+        key_column = request.POST.get('key_column', '').strip()
+        delete_missing = request.POST.get('delete_missing') == 'on'
+        
+        if mode == 'merge' and not key_column:
+            return render(request, 'import_excel.html', {'tab': tab, 'error': 'Key column is required for merge imports'})
+        if delete_missing and not request.user.has_permission('delete', tab.department, tab):
+            return render(request, 'import_excel.html', {'tab': tab, 'error': 'You do not have permission to delete records from this tab.'})
         
         try:
-            count = import_excel_data(file, tab, request.user)
+            counts = _import_file(file, tab, request.user, mode, key_column, delete_missing)
+            if mode == 'merge':
+                success = (
+                    f"Merged on '{key_column}': {counts['updated']} updated, "
+                    f"{counts['created']} added, {counts['deleted']} deleted"
+                )
+            else:
+                success = f"Successfully imported {counts['created']} records"
             return render(request, 'import_excel.html', {
                 'tab': tab,
-                'success': f'Successfully imported {count} records'
+                'success': success
             })
         except Exception as e:
             return render(request, 'import_excel.html', {'tab': tab, 'error': f'Import failed: {str(e)}'})
@@ -381,6 +454,39 @@ def import_excel(request, tab_id):
     return render(request, 'import_excel.html', {'tab': tab})
 
 
+@login_required
+@throttle('import', methods=('POST',))
+def import_workbook(request, department_id):
+    """Import every sheet of a workbook into the department's tab of the same name."""
+    department = get_object_or_404(Department, id=department_id)
+    
+    if not request.user.has_permission('add', department):
+        return HttpResponseForbidden('You do not have permission to add records to this department.')
+    
+    context = {'department': department, 'can_manage_tabs': request.user.can_manage_tabs()}
+    if request.method == 'POST':
+        if 'file' not in request.FILES:
+            return render(request, 'import_workbook.html', {**context, 'error': 'No file selected'})
+        
+        file = request.FILES['file']
+        if not file.name.lower().endswith(('.xlsx', '.xls')):
+            return render(request, 'import_workbook.html', {**context, 'error': 'Please upload an Excel file'})
+        
+        try:
+            # Only tab managers may create tabs for sheets without one
+            results = import_workbook_data(file, department, request.user, request.user.can_manage_tabs())
+            total = sum(count for _, count in results)
+            return render(request, 'import_workbook.html', {
+                **context,
+                'success': f'Successfully imported {total} records from {len(results)} sheets',
+                'results': results,
+            })
+        except Exception as e:
+            return render(request, 'import_workbook.html', {**context, 'error': f'Import failed: {str(e)}'})
+    
+    return render(request, 'import_workbook.html', context)
+
+
 @login_required
 @require_http_methods(["POST"])
 def update_cell(request, record_id):
@@ -399,13 +505,22 @@ def update_cell(request, record_id):
         if not column:
             return JsonResponse({'error': 'Column name required'}, status=400)
         
-        # Update the record data
-        if not isinstance(record.data, dict):
-            record.data = {}
-        
-        record.data[column] = value
-        record.updated_by = request.user
-        record.save()
+        with sharding.atomic(record.tab.department_id):
+            # Re-read in the write transaction, with the tab's current key
+            # dictionary (portal.positional)
+            record.refresh_from_db(fields=['data'])
+            
+            # Update the record data
+            if not isinstance(record.data, dict):
+                record.data = {}
+            
+            old_data = dict(record.data)
+            record.data[column] = value
+            record.updated_by = request.user
+            record.save()
+        history.record_changes(record.tab_id, [(record.id, old_data, record.data)], request.user)
+        record.tab.record_changed()
+        events.publish(record.tab_id, 'update', record.id, events.record_row(record))
         
         return JsonResponse({
             'success': True,
@@ -421,21 +536,247 @@ def update_cell(request, record_id):
 # ============================================================================
 # REST API ENDPOINTS FOR TABULATOR.JS
 # ============================================================================
+#
+# The API views are async so that, when served through config.asgi, one
+# process can hold many concurrent grid clients without pinning a worker
+# thread per request. Under WSGI (runserver) Django runs them in an event
+# loop per request, so they keep working unchanged; the streaming views
+# (records, department query, events) hand WSGI a sync iterator, since
+# Django would read an async one whole before sending anything.
 
-@login_required
-@require_http_methods(["GET"])
-@login_required
-def api_fetch_records(request, tab_id):
+# Rows fetched per database round trip while streaming a tab
+RECORD_STREAM_CHUNK_SIZE = 2000
+
+# zlib level for gzip-encoded record streams (favours speed over ratio)
+RECORD_STREAM_GZIP_LEVEL = 5
+
+
+def _parse_fields(request):
+    """
+    Read the ?fields= projection from a request.
+    
+    Accepts a comma-separated list and/or repeated parameters
+    (?fields=Name,Email or ?fields=Name&fields=Email). Returns the field
+    names in request order without duplicates, or None for all fields.
+    """
+    fields = []
+    for value in request.GET.getlist('fields'):
+        for field in value.split(','):
+            field = field.strip()
+            if field and field != 'id' and field not in fields:
+                fields.append(field)
+    return fields or None
+
+
+def _pick(data, fields):
+    """Python counterpart of JSONProject, for rows that are read whole."""
+    if not isinstance(data, dict):
+        data = {}
+    return {field: data.get(field) for field in fields}
+
+
+def _prepare_rows(records, fields, positional, columns):
+    """
+    Set up a record queryset for streaming; returns it and a function
+    giving a fetched record's row: its columns' values, then its data.
+    
+    With fields, the keys are extracted by the database (JSONProject) and
+    only those values are read and decoded. Rows of positional tabs
+    (portal.positional) are already compact, so they are read whole and
+    projected in Python.
+    """
+    if fields and not positional:
+        records = records.only(*columns).annotate(projected=JSONProject('data', fields))
+        data = lambda record: record.projected
+    elif fields:
+        records = records.only(*columns, 'data')
+        data = lambda record: _pick(record.data, fields)
+    else:
+        records = records.only(*columns, 'data')
+        data = lambda record: record.data
+    return records, lambda record: tuple(getattr(record, column) for column in columns) + (data(record),)
+
+
+async def _arecord_rows(records, fields=None, positional=False, columns=('id',)):
+    """Yield a row (see _prepare_rows) for each record, fetched in chunks."""
+    records, row = _prepare_rows(records, fields, positional, columns)
+    async for record in records.aiterator(chunk_size=RECORD_STREAM_CHUNK_SIZE):
+        yield row(record)
+
+
+def _record_rows(records, fields=None, positional=False, columns=('id',)):
+    """Sync version of _arecord_rows, for WSGI."""
+    records, row = _prepare_rows(records, fields, positional, columns)
+    for record in records.iterator(chunk_size=RECORD_STREAM_CHUNK_SIZE):
+        yield row(record)
+
+
+def _history_rows(tab, when, fields=None):
+    """Yield (id, data) for each record of a tab as it was at a moment (portal.history)."""
+    for record_id, record_data in history.tab_at(tab, when):
+        yield record_id, _pick(record_data, fields) if fields else record_data
+
+
+async def _ahistory_rows(tab, when, fields=None):
+    """Async version of _history_rows, reading from a worker thread in chunks."""
+    rows = _history_rows(tab, when, fields)
+    take = lambda: list(islice(rows, RECORD_STREAM_CHUNK_SIZE))
+    while True:
+        # Always the same worker thread, which owns the generator's cursor
+        chunk = await sync_to_async(take)()
+        if not chunk:
+            break
+        for row in chunk:
+            yield row
+
+
+def _parse_moment(value):
+    """Parse an ?at= timestamp (ISO 8601); naive values are in the site's time zone."""
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError('at must be an ISO 8601 date and time')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _records_body(can_edit, can_delete, fields=None):
+    """
+    The pieces of an api_fetch_records body, for _stream_body: (opening,
+    function serializing a row, function giving the closing).
+    
+    The body is emitted as {"data": [...], "columns": [...], ...}: rows go
+    out chunk by chunk and the column list, collected along the way, is
+    written once the last row has been sent. Memory stays flat no matter
+    how many records the tab holds.
+    """
+    columns = set(['id'])  # Always include ID column first
+    
+    def row(record_id, record_data):
+        row = {'id': record_id}
+        if isinstance(record_data, dict):
+            columns.update(record_data.keys())
+            row.update(record_data)  # Merge JSON field data into row
+        else:
+            row['data'] = record_data
+        return json.dumps(row, cls=DjangoJSONEncoder)
+    
+    def closing():
+        # A projection keeps the caller's column order
+        column_list = ['id'] + fields if fields else sorted(columns)
+        return (
+            '], "columns": ' + json.dumps(column_list)
+            + ', "can_edit": ' + json.dumps(can_edit)
+            + ', "can_delete": ' + json.dumps(can_delete) + '}'
+        )
+    
+    return '{"data": [', row, closing
+
+
+def _records_body_columnar(can_edit, can_delete, fields=None):
+    """
+    The pieces of the compact columnar format (?format=columnar), like
+    _records_body.
+    
+    Each row is a positional array and column names are sent once:
+    {"format": "columnar", "rows": [[1, "John", ...], ...],
+     "columns": ["id", "Name", ...], ...}
+    
+    Positions are assigned as new keys are met, so an early row can be
+    shorter than the final column list; missing trailing values mean the
+    key is absent, interior gaps are sent as null. The column list comes
+    last because it is only complete after the final row.
+    """
+    positions = {'id': 0}
+    for field in fields or ():
+        positions[field] = len(positions)
+    
+    def row(record_id, record_data):
+        if not isinstance(record_data, dict):
+            record_data = {'data': record_data}
+        values = [None] * len(positions)
+        values[0] = record_id
+        for key, value in record_data.items():
+            position = positions.get(key)
+            if position is None:
+                position = positions[key] = len(positions)
+                values.append(None)
+            values[position] = value
+        return json.dumps(values, cls=DjangoJSONEncoder)
+    
+    def closing():
+        return (
+            '], "columns": ' + json.dumps(list(positions))
+            + ', "can_edit": ' + json.dumps(can_edit)
+            + ', "can_delete": ' + json.dumps(can_delete) + '}'
+        )
+    
+    return '{"format": "columnar", "rows": [', row, closing
+
+
+async def _astream_body(body, rows):
+    """Async generator writing a JSON body (see _records_body) as its rows are read."""
+    opening, row, closing = body
+    yield opening
+    separator = ''
+    async for values in rows:
+        yield separator + row(*values)
+        separator = ', '
+    yield closing()
+
+
+def _stream_body(body, rows):
+    """Sync version of _astream_body, for WSGI."""
+    opening, row, closing = body
+    yield opening
+    separator = ''
+    for values in rows:
+        yield separator + row(*values)
+        separator = ', '
+    yield closing()
+
+
+async def _agzip_stream(chunks):
+    """gzip-encode a streamed text body chunk by chunk."""
+    compressor = zlib.compressobj(RECORD_STREAM_GZIP_LEVEL, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _gzip_stream(chunks):
+    """Sync version of _agzip_stream, for WSGI."""
+    compressor = zlib.compressobj(RECORD_STREAM_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+@async_login_required
+@async_require_http_methods(["GET"])
+@throttle('fetch')
+async def api_fetch_records(request, tab_id):
     """
     REST API endpoint: Fetch all records in a tab with dynamic column detection.
     
     Method: GET
     URL: /api/tab/{tab_id}/records/
+    Query: fields=Name,Email (optional) - return only these keys
+           format=columnar (optional) - positional rows, see below
+           at=2024-05-01T09:00 (optional) - the records as they were at
+               that moment, rebuilt from their history (portal.history)
     
     Purpose:
     - Retrieve all records from a specific tab in JSON format
     - Dynamically extract column names from record JSONField data
     - Include permission information for frontend UI control
+    - Stream the response so large tabs are never built in memory
+    - Project the requested fields inside the database (JSON path
+      extraction in the SELECT), so narrow views of wide tabs stay cheap
     
     Returns:
     {
@@ -453,46 +794,67 @@ def api_fetch_records(request, tab_id):
         "can_delete": true
     }
     
+    Columnar Returns (format=columnar):
+    {
+        "format": "columnar",
+        "rows": [[1, 1, "John", "IT"], ...],
+        "columns": ["id", "S.No", "Name", "Department"],
+        "can_edit": true,
+        "can_delete": true
+    }
+    
+    The body is gzip-encoded when the client sends Accept-Encoding: gzip.
+    
     Authorization: User must have VIEW permission on the tab's department
     """
-    tab = get_object_or_404(Tab, id=tab_id)
+    tab = await aget_object_or_404(Tab.objects.select_related('department'), id=tab_id)
     
     # Check permission: User must have view access to this tab
     if not request.user.has_permission('view', tab.department, tab):
         return JsonResponse({'error': 'Permission denied'}, status=403)
     
-    records = tab.records.all()
-    
-    # Extract all unique column names from all records' JSONField data
-    # This enables dynamic column generation in the frontend grid
-    columns = set(['id'])  # Always include ID column first
-    for record in records:
-        if isinstance(record.data, dict):
-            columns.update(record.data.keys())
-    columns = sorted(list(columns))
+    if request.GET.get('format') == 'columnar':
+        serializer = _records_body_columnar
+    else:
+        serializer = _records_body
     
-    # Build data array: Convert each record with its ID and JSON data
-    data = []
-    for record in records:
-        row = {'id': record.id}
-        if isinstance(record.data, dict):
-            row.update(record.data)  # Merge JSON field data into row
-        else:
-            row['data'] = record.data
-        data.append(row)
+    # Async servers get async iterators; WSGI needs sync ones, or Django
+    # would read the whole body into memory before sending it
+    asynchronous = isinstance(request, ASGIRequest)
+    fields = _parse_fields(request)
+    if request.GET.get('at'):
+        try:
+            moment = _parse_moment(request.GET['at'])
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        rows = (_ahistory_rows if asynchronous else _history_rows)(tab, moment, fields)
+    else:
+        rows = (_arecord_rows if asynchronous else _record_rows)(
+            Record.objects.filter(tab=tab), fields, tab.row_keys is not None
+        )
     
     # Return data with permission flags for UI control (edit/delete buttons)
-    return JsonResponse({
-        'data': data,
-        'columns': columns,
-        'can_edit': request.user.has_permission('edit', tab.department, tab),
-        'can_delete': request.user.has_permission('delete', tab.department, tab),
-    })
+    body = serializer(
+        request.user.has_permission('edit', tab.department, tab),
+        request.user.has_permission('delete', tab.department, tab),
+        fields,
+    )
+    stream = (_astream_body if asynchronous else _stream_body)(body, rows)
+    
+    gzip_accepted = 'gzip' in request.headers.get('Accept-Encoding', '')
+    if gzip_accepted:
+        stream = (_agzip_stream if asynchronous else _gzip_stream)(stream)
+    
+    response = StreamingHttpResponse(stream, content_type='application/json')
+    response['Vary'] = 'Accept-Encoding'
+    if gzip_accepted:
+        response['Content-Encoding'] = 'gzip'
+    return response
 
 
-@login_required
-@require_http_methods(["POST"])
-def api_create_record(request, tab_id):
+@async_login_required
+@async_require_http_methods(["POST"])
+async def api_create_record(request, tab_id):
     """
     REST API endpoint: Create a new record in a tab.
     
@@ -525,7 +887,7 @@ def api_create_record(request, tab_id):
     
     Authorization: User must have ADD permission on the tab's department
     """
-    tab = get_object_or_404(Tab, id=tab_id)
+    tab = await aget_object_or_404(Tab.objects.select_related('department'), id=tab_id)
     
     # Check permission: User must have add/create access
     if not request.user.has_permission('add', tab.department, tab):
@@ -540,11 +902,13 @@ def api_create_record(request, tab_id):
             del data['id']
         
         # Create new record with JSON data
-        record = Record.objects.create(
+        record = await Record.objects.acreate(
             tab=tab,
             data=data,
             created_by=request.user
         )
+        await tab.arecord_changed(1)
+        await events.apublish(tab.id, 'create', record.id, events.record_row(record))
         
         # Return success response with created record ID
         return JsonResponse({
@@ -558,9 +922,40 @@ def api_create_record(request, tab_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-@login_required
-@require_http_methods(["PATCH", "PUT"])
-def api_update_record(request, record_id):
+async def _aget_record(record_id):
+    """
+    A record with its tab and department, or 404.
+    
+    The tab is read on its own rather than joined: with PORTAL_SHARDING
+    it lives in the catalog, away from the record (portal.sharding).
+    """
+    record = await aget_object_or_404(Record.objects.all(), id=record_id)
+    record.tab = await Tab.objects.select_related('department').aget(id=record.tab_id)
+    return record
+
+
+@sync_to_async
+def _merge_record_data(record, data, user):
+    """
+    Merge data into a record's data and save it; returns the data before.
+    
+    The record is re-read in the write transaction, so its positional
+    values are named by the tab's current key dictionary (portal.positional).
+    """
+    with sharding.atomic(record.tab.department_id):
+        record.refresh_from_db(fields=['data'])
+        if not isinstance(record.data, dict):
+            record.data = {}
+        old_data = dict(record.data)
+        record.data.update(data)
+        record.updated_by = user
+        record.save()
+    return old_data
+
+
+@async_login_required
+@async_require_http_methods(["PATCH", "PUT"])
+async def api_update_record(request, record_id):
     """
     REST API endpoint: Update a record field(s).
     
@@ -592,7 +987,7 @@ def api_update_record(request, record_id):
     
     Authorization: User must have EDIT permission on the record's tab department
     """
-    record = get_object_or_404(Record, id=record_id)
+    record = await _aget_record(record_id)
     
     # Check permission: User must have edit access to this tab
     if not request.user.has_permission('edit', record.tab.department, record.tab):
@@ -603,12 +998,10 @@ def api_update_record(request, record_id):
         data = json.loads(request.body)
         
         # Merge new data with existing record data (PATCH semantics)
-        if not isinstance(record.data, dict):
-            record.data = {}
-        
-        record.data.update(data)
-        record.updated_by = request.user
-        record.save()
+        old_data = await _merge_record_data(record, data, request.user)
+        await history.arecord_changes(record.tab_id, [(record.id, old_data, record.data)], request.user)
+        await record.tab.arecord_changed()
+        await events.apublish(record.tab_id, 'update', record.id, events.record_row(record))
         
         # Return success response with updated record
         return JsonResponse({
@@ -622,9 +1015,9 @@ def api_update_record(request, record_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-@login_required
-@require_http_methods(["DELETE"])
-def api_delete_record(request, record_id):
+@async_login_required
+@async_require_http_methods(["DELETE"])
+async def api_delete_record(request, record_id):
     """
     REST API endpoint: Delete a record.
     
@@ -645,7 +1038,7 @@ def api_delete_record(request, record_id):
     
     Authorization: User must have DELETE permission on the record's tab department
     """
-    record = get_object_or_404(Record, id=record_id)
+    record = await _aget_record(record_id)
     
     # Check permission: User must have delete access to this tab
     if not request.user.has_permission('delete', record.tab.department, record.tab):
@@ -654,7 +1047,12 @@ def api_delete_record(request, record_id):
     try:
         # Store ID before deletion for response
         record_id = record.id
-        record.delete()
+        await history.arecord_deletes(
+            record.tab_id, [(record.id, record.data, record.created_at)], request.user
+        )
+        await record.adelete()
+        await record.tab.arecord_changed(-1)
+        await events.apublish(record.tab_id, 'delete', record_id, {'id': record_id})
         
         # Return success response with deleted record ID
         return JsonResponse({
@@ -664,3 +1062,563 @@ def api_delete_record(request, record_id):
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+
+@async_login_required
+@async_require_http_methods(["GET"])
+async def api_record_history(request, record_id):
+    """
+    REST API endpoint: A record's change history, or its data at a moment.
+    
+    Method: GET
+    URL: /api/record/{record_id}/history/
+    Query: at=2024-05-01T09:00 (optional) - return the data as it was then
+           limit=100 (optional) - newest entries to list
+    
+    Purpose:
+    - Show who changed what and when, including deleted records
+    - Rebuild past versions from the compact undo entries (portal.history)
+    
+    Returns:
+    {
+        "id": 153,
+        "history": [
+            {
+                "kind": "update",
+                "changed_at": "2024-05-01T09:12:00Z",
+                "changed_by": "jdoe",
+                "previous": {"Age": 28},
+                "added": []
+            }
+        ]
+    }
+    
+    At Returns (at=...):
+    {
+        "id": 153,
+        "at": "2024-05-01T09:00:00Z",
+        "data": {"Name": "John Doe", "Age": 28} or null if it did not exist
+    }
+    
+    Authorization: User must have VIEW permission on the record's tab department
+    """
+    tab_id = await Record.objects.filter(id=record_id).values_list('tab_id', flat=True).afirst()
+    if tab_id is None:
+        # Deleted records keep their history
+        tab_id = await RecordHistory.objects.filter(record_id=record_id).values_list('tab_id', flat=True).afirst()
+    tab = await aget_object_or_404(Tab.objects.select_related('department'), id=tab_id or 0)
+    
+    if not request.user.has_permission('view', tab.department, tab):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    if request.GET.get('at'):
+        try:
+            moment = _parse_moment(request.GET['at'])
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        data = await sync_to_async(history.record_at)(record_id, moment)
+        return JsonResponse({'id': record_id, 'at': moment, 'data': data})
+    
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 100)), 1000))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    entries = [
+        entry async for entry in RecordHistory.objects.filter(record_id=record_id).order_by('-id')[:limit]
+    ]
+    # Users are looked up apart from the entries, which may be in a department database
+    usernames = {
+        user_id: username async for user_id, username in User.objects.filter(
+            id__in={entry.changed_by_id for entry in entries},
+        ).values_list('id', 'username')
+    }
+    return JsonResponse({
+        'id': record_id,
+        'history': [
+            {
+                'kind': entry.kind,
+                'changed_at': entry.changed_at,
+                'changed_by': usernames.get(entry.changed_by_id),
+                'previous': entry.previous,
+                'added': entry.added,
+            }
+            for entry in entries
+        ],
+    })
+
+
+@async_login_required
+@async_require_http_methods(["POST"])
+@throttle('bulk')
+async def api_bulk_delete_records(request, tab_id):
+    """
+    REST API endpoint: Delete many records of a tab in one request.
+    
+    Method: POST
+    URL: /api/tab/{tab_id}/records/bulk-delete/
+    Body: exactly one of
+        {"ids": [153, 154, 160]} - delete these records
+        {"where": {"Status": "Archived"}} - delete every record matching
+            the JSON key predicates (see portal.jsonsql.json_filter)
+    
+    Purpose:
+    - Remove thousands of rows without one request (and one permission
+      check) per record
+    - Delete in chunked statements inside a single transaction
+    
+    Returns:
+    {
+        "success": true,
+        "deleted": 3
+    }
+    
+    Authorization: User must have DELETE permission on the tab's department
+    """
+    tab = await aget_object_or_404(Tab.objects.select_related('department'), id=tab_id)
+    
+    # Checked once for the whole batch
+    if not request.user.has_permission('delete', tab.department, tab):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    try:
+        body = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(body, dict) or len(body.keys() & {'ids', 'where'}) != 1:
+        return JsonResponse({'error': 'Body must have exactly one of "ids" and "where"'}, status=400)
+    
+    ids = body.get('ids')
+    if ids is not None and not (
+        isinstance(ids, list)
+        and all(isinstance(i, int) and not isinstance(i, bool) for i in ids)
+    ):
+        return JsonResponse({'error': 'ids must be a list of record IDs'}, status=400)
+    
+    try:
+        deleted = await sync_to_async(delete_records)(
+            tab, ids=ids, where=body.get('where'), user=request.user
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'success': True, 'deleted': deleted})
+
+
+@async_login_required
+@async_require_http_methods(["POST"])
+@throttle('bulk')
+async def api_tab_columns(request, tab_id):
+    """
+    REST API endpoint: Rename, drop, fill or cast a column across a tab.
+    
+    Method: POST
+    URL: /api/tab/{tab_id}/columns/
+    Body: one operation on one column
+        {"operation": "rename", "column": "Name", "to": "Full Name"}
+        {"operation": "drop", "column": "Notes"}
+        {"operation": "fill", "column": "Status", "value": "Active"}
+            - sets the value where the column is missing or null
+        {"operation": "cast", "column": "Age", "to": "number"}
+            - "number" or "text"; values that don't convert are kept
+    
+    Purpose:
+    - Change a tab's columns without editing every record
+    - Run as set-based UPDATE statements in chunks (see portal.columns)
+    
+    Returns:
+    {
+        "success": true,
+        "count": 1250
+    }
+    
+    Authorization: Director/Scientist only, like renaming a tab; drop
+    deletes data, so it also needs DELETE permission on the department
+    """
+    if not request.user.can_manage_tabs():
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    tab = await aget_object_or_404(Tab.objects.select_related('department'), id=tab_id)
+    
+    try:
+        body = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(body, dict) or body.get('operation') not in columns.OPERATIONS:
+        return JsonResponse(
+            {'error': f'operation must be one of {", ".join(columns.OPERATIONS)}'}, status=400
+        )
+    
+    operation = body['operation']
+    column = body.get('column')
+    if operation == 'drop' and not request.user.has_permission('delete', tab.department, tab):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    if operation == 'rename':
+        run = lambda: columns.rename_column(tab, column, body.get('to'), request.user)
+    elif operation == 'drop':
+        run = lambda: columns.drop_column(tab, column, request.user)
+    elif operation == 'fill':
+        if 'value' not in body:
+            return JsonResponse({'error': 'fill needs a value'}, status=400)
+        run = lambda: columns.fill_column(tab, column, body['value'], request.user)
+    else:
+        run = lambda: columns.cast_column(tab, column, body.get('to'), request.user)
+    
+    try:
+        count = await sync_to_async(run)()
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'success': True, 'count': count})
+
+
+_SHA256 = re.compile(r'[0-9a-fA-F]{64}')
+
+
+def _upload_status(session):
+    return {
+        'id': str(session.id),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.received,
+        'chunk_size': uploads.chunk_size(),
+    }
+
+
+def _upload_error(error):
+    body = {'error': str(error)}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return JsonResponse(body, status=error.status)
+
+
+@async_login_required
+@async_require_http_methods(["POST"])
+@throttle('upload')
+async def api_create_upload(request, tab_id):
+    """
+    REST API endpoint: Start a resumable chunked upload of a file to import.
+    
+    Method: POST
+    URL: /api/tab/{tab_id}/uploads/
+    Body: {"filename": "survey.xlsx", "size": 73400320, "sha256": "<64 hex digits>"}
+    
+    Purpose:
+    - Import files larger than one request allows (DATA_UPLOAD_MAX_MEMORY_SIZE)
+    - Let a client resume a transfer cut off midway (see portal.uploads)
+    
+    Then, in order:
+    - PUT /api/uploads/{id}/?offset=N with up to chunk_size raw bytes,
+      starting at offset 0; an optional X-Chunk-SHA256 header verifies
+      the chunk. A 409 answer carries the offset to continue from, as
+      does GET /api/uploads/{id}/.
+    - POST /api/uploads/{id}/finalize/ to verify and import the file
+    
+    Returns (201):
+    {
+        "id": "0b6f...",
+        "filename": "survey.xlsx",
+        "size": 73400320,
+        "offset": 0,
+        "chunk_size": 4194304
+    }
+    
+    A user has at most PORTAL_UPLOADS['user_sessions'] uploads in
+    progress, declaring at most user_bytes in all; past that: 429.
+    
+    Authorization: User must have ADD permission on the tab's department
+    """
+    tab = await aget_object_or_404(Tab.objects.select_related('department'), id=tab_id)
+    if not request.user.has_permission('add', tab.department, tab):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    try:
+        body = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+    
+    filename = body.get('filename')
+    size = body.get('size')
+    checksum = body.get('sha256')
+    if not isinstance(filename, str) or not filename.lower().endswith(IMPORT_EXTENSIONS):
+        return JsonResponse({'error': 'filename must be an Excel or CSV file name'}, status=400)
+    if not isinstance(size, int) or isinstance(size, bool) or not 0 < size <= uploads.max_size():
+        return JsonResponse({'error': f'size must be between 1 and {uploads.max_size()} bytes'}, status=400)
+    if not isinstance(checksum, str) or not _SHA256.fullmatch(checksum):
+        return JsonResponse({'error': 'sha256 must be the file\'s SHA-256 in hex'}, status=400)
+    
+    try:
+        session = await sync_to_async(uploads.create_session)(
+            tab, request.user, filename[-255:], size, checksum
+        )
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(_upload_status(session), status=201)
+
+
+@async_login_required
+@async_require_http_methods(["GET", "PUT", "DELETE"])
+@throttle('upload', methods=('PUT',))
+async def api_upload(request, upload_id):
+    """
+    REST API endpoint: A chunked upload's progress, its next chunk, or its cancellation.
+    
+    Methods:
+    - GET: the upload's status; offset is where the next chunk starts
+    - PUT ?offset=N: store the request body (raw bytes) at offset N,
+      which must equal the current offset; X-Chunk-SHA256 optional
+    - DELETE: cancel the upload and remove its partial file
+    URL: /api/uploads/{upload_id}/
+    
+    Returns: the status as for api_create_upload, or {"success": true}
+    for DELETE. Errors carry "offset" when the client should resume there.
+    
+    Authorization: Only the user who started the upload
+    """
+    session = await aget_object_or_404(UploadSession.objects.all(), id=upload_id, user=request.user)
+    
+    if request.method == 'GET':
+        return JsonResponse(_upload_status(session))
+    if request.method == 'DELETE':
+        await sync_to_async(uploads.discard)(session)
+        return JsonResponse({'success': True})
+    
+    try:
+        offset = int(request.GET.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or '')
+    except ValueError:
+        return JsonResponse({'error': 'offset and Content-Length are required'}, status=400)
+    
+    try:
+        # Read from the request stream: request.body would load the chunk
+        # into memory and is capped at DATA_UPLOAD_MAX_MEMORY_SIZE
+        await sync_to_async(uploads.write_chunk)(
+            session, offset, request, length, request.headers.get('X-Chunk-SHA256')
+        )
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(_upload_status(session))
+
+
+@async_login_required
+@async_require_http_methods(["POST"])
+@throttle('import')
+async def api_finalize_upload(request, upload_id):
+    """
+    REST API endpoint: Verify a finished chunked upload and import it.
+    
+    Method: POST
+    URL: /api/uploads/{upload_id}/finalize/
+    Body (optional): import options as on the import page
+        {"mode": "append"}
+        {"mode": "merge", "key_column": "Employee ID", "delete_missing": false}
+    
+    The whole file's SHA-256 must match the one given at the start; on a
+    mismatch the received data is discarded (400, "offset": 0). The file
+    is imported from disk, without reading it into memory first. A
+    successful import removes the upload; a failed one keeps it, so it
+    can be finalized again with other options.
+    
+    Returns:
+    {
+        "success": true,
+        "created": 120000,
+        "updated": 0,
+        "deleted": 0
+    }
+    
+    Authorization: The user who started the upload, with ADD permission
+    (and DELETE for delete_missing) on the tab's department
+    """
+    session = await aget_object_or_404(
+        UploadSession.objects.select_related('tab__department'), id=upload_id, user=request.user
+    )
+    tab = session.tab
+    if not request.user.has_permission('add', tab.department, tab):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    try:
+        body = json.loads(request.body or b'{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({'error': 'Body must be a JSON object'}, status=400)
+    
+    mode = body.get('mode', 'append')
+    key_column = str(body.get('key_column') or '').strip()
+    delete_missing = body.get('delete_missing') is True
+    if mode not in ('append', 'merge'):
+        return JsonResponse({'error': 'mode must be "append" or "merge"'}, status=400)
+    if mode == 'merge' and not key_column:
+        return JsonResponse({'error': 'key_column is required for merge imports'}, status=400)
+    if delete_missing and not request.user.has_permission('delete', tab.department, tab):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    def run():
+        file = uploads.finish(session)
+        try:
+            counts = _import_file(file, tab, request.user, mode, key_column, delete_missing)
+        finally:
+            file.close()
+        uploads.discard(session)
+        return counts
+    
+    try:
+        counts = await sync_to_async(run)()
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({'success': True, **counts})
+
+
+@async_login_required
+@async_require_http_methods(["GET"])
+async def api_tab_events(request, tab_id):
+    """
+    REST API endpoint: Live change feed for a tab (Server-Sent Events).
+    
+    Method: GET
+    URL: /api/tab/{tab_id}/events/
+    Headers: Last-Event-ID (optional, sent automatically by EventSource)
+    
+    Purpose:
+    - Push record create/update/delete events to open grids as they commit
+    - Push an "import" event when an Excel import finishes
+    - Resume after a dropped connection from Last-Event-ID
+    - Send "reset" when the client has fallen out of the retained log
+    
+    Event Example:
+    id: 42
+    event: update
+    data: {"id": 153, "Name": "Jane Doe", "Age": 29}
+    
+    Authorization: User must have VIEW permission on the tab's department
+    """
+    tab = await aget_object_or_404(Tab.objects.select_related('department'), id=tab_id)
+    
+    # Check permission: User must have view access to this tab
+    if not request.user.has_permission('view', tab.department, tab):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    # Async servers get the non-blocking stream; WSGI needs a sync iterator
+    if isinstance(request, ASGIRequest):
+        stream = events.astream(tab.id, last_event_id)
+    else:
+        stream = events.stream(tab.id, last_event_id)
+    
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _query_results_body(tab_names):
+    """
+    The pieces of a department query body, for _stream_body: results
+    tagged with their tab, from rows of (id, tab_id, data).
+    
+    Emits {"results": [{"id": ..., "tab_id": ..., "data": {...}}, ...],
+    "tabs": {"<tab_id>": "<tab name>", ...}, "count": N}.
+    """
+    count = 0
+    
+    def row(record_id, tab_id, data):
+        nonlocal count
+        count += 1
+        return json.dumps({'id': record_id, 'tab_id': tab_id, 'data': data}, cls=DjangoJSONEncoder)
+    
+    def closing():
+        return (
+            '], "tabs": ' + json.dumps({str(tab_id): name for tab_id, name in tab_names.items()})
+            + ', "count": ' + json.dumps(count) + '}'
+        )
+    
+    return '{"results": [', row, closing
+
+
+@async_login_required
+@async_require_http_methods(["GET"])
+@throttle('fetch')
+async def api_department_query(request, department_id):
+    """
+    REST API endpoint: Query records across every tab of a department.
+    
+    Method: GET
+    URL: /api/department/{department_id}/query/
+    Query:
+        where={"Name__icontains": "alice"} (required) - JSON key/value
+            predicates, all of which must match (see portal.jsonsql.json_filter)
+        fields=Name,Email (optional) - return only these keys
+    
+    Purpose:
+    - Find matching records in all tabs with one query over Record
+      filtered to the department's tabs, instead of downloading each tab
+    - Only search tabs the user is allowed to view
+    - Stream results, each tagged with the tab it belongs to
+    
+    Returns:
+    {
+        "results": [
+            {"id": 12, "tab_id": 3, "data": {"Name": "Alice Johnson", ...}}
+        ],
+        "tabs": {"3": "Paid Interns"},
+        "count": 1
+    }
+    
+    Authorization: Results only come from tabs the user has VIEW permission on
+    """
+    department = await aget_object_or_404(Department.objects.all(), id=department_id)
+    
+    try:
+        where = json.loads(request.GET.get('where', ''))
+        predicate = json_filter(where)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'where must be a JSON object'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # Per-tab permission check; only viewable tabs are searched
+    tab_names = {}
+    object_tab_ids = []
+    tabs_predicate = Q()
+    async for tab in Tab.objects.filter(department=department):
+        if request.user.has_permission('view', department, tab):
+            tab_names[tab.id] = tab.name
+            if tab.row_keys is None:
+                object_tab_ids.append(tab.id)
+            else:
+                # Positional tabs match keys by position too (portal.positional)
+                tabs_predicate |= Q(tab_id=tab.id) & json_filter(where, row_keys=tab.row_keys)
+    
+    if not tab_names:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    # Rows of positional tabs are projected in Python (_prepare_rows)
+    positional = len(object_tab_ids) < len(tab_names)
+    if object_tab_ids:
+        tabs_predicate |= Q(tab_id__in=object_tab_ids) & predicate
+    records = Record.objects.filter(tabs_predicate)
+    fields = _parse_fields(request)
+    # As in api_fetch_records: sync iterators under WSGI
+    if isinstance(request, ASGIRequest):
+        stream = _astream_body(
+            _query_results_body(tab_names), _arecord_rows(records, fields, positional, ('id', 'tab_id')),
+        )
+    else:
+        stream = _stream_body(
+            _query_results_body(tab_names), _record_rows(records, fields, positional, ('id', 'tab_id')),
+        )
+    return StreamingHttpResponse(stream, content_type='application/json')
@@ -0,0 +1,85 @@
+"""
+Parsing of Excel workbooks for the imports in portal.utils.
+
+import_workbook_data() parses a workbook's sheets in parallel with
+read_sheets(), one sheet per worker process. This module imports nothing
+from Django, so workers started with the spawn method (the default on
+Windows and macOS) can load it without the project's settings.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def dataframe_rows(df):
+    """
+    Yield one JSON-ready dict per row of a sheet's DataFrame.
+    
+    Adds the S.No (serial number) column, maps NaN to None, keeps numbers
+    as-is and converts every other value to a string.
+    """
+    import pandas as pd
+    
+    # Iterate through each row in the DataFrame
+    for index, row in df.iterrows():
+        # Initialize data dictionary for this row
+        data = {}
+        
+        # Add S.No field: Serial number starting from 1
+        # This matches Excel row numbering (excluding header)
+        data['S.No'] = index + 1
+        
+        # Convert each column value to appropriate type
+        for col, value in row.items():
+            if pd.isna(value):
+                # Handle missing/null values
+                data[col] = None
+            elif isinstance(value, (int, float)):
+                # Keep numeric values as-is
+                data[col] = value
+            else:
+                # Convert all other types to string
+                data[col] = str(value)
+        
+        yield data
+
+
+def sheet_names(path):
+    """Names of a workbook's sheets, in workbook order."""
+    import pandas as pd
+    
+    with pd.ExcelFile(path) as book:
+        return list(book.sheet_names)
+
+
+def read_sheet(path, name):
+    """All rows of one sheet as dicts (see dataframe_rows); runs in a worker process."""
+    import pandas as pd
+    
+    return list(dataframe_rows(pd.read_excel(path, sheet_name=name)))
+
+
+def read_sheets(path, names, workers=None):
+    """
+    Parse sheets in parallel; yield (name, rows) as each sheet finishes.
+    
+    Uses up to workers processes (default: one per CPU), and none for a
+    single sheet. Workers are always spawned, never forked: the caller
+    is a server thread whose open database connections and background
+    threads a forked child would inherit.
+    """
+    workers = min(len(names), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        for name in names:
+            yield name, read_sheet(path, name)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(read_sheet, path, name): name for name in names}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # The caller stopped early (an error, or the generator was closed)
+            for future in futures:
+                future.cancel()